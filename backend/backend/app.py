@@ -6,13 +6,17 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import timedelta
 
 from config import config
+from commands import register_commands
 from extensions import db, ma, jwt, mail, cors, init_extensions
 from utils.errors import register_error_handlers, APIError, ValidationError, UnauthorizedError, NotFoundError
+from utils.compression import init_compression
+from utils.json_provider import init_json
 
 # Import blueprints
 from routes.auth import auth_bp
 from routes.projects import projects_bp
 from routes.tasks import tasks_bp
+from routes.health import health_bp
 
 def create_app(config_name=None):
     """Application factory function"""
@@ -24,25 +28,26 @@ def create_app(config_name=None):
     # Load configuration
     app.config.from_object(config[config_name])
     
+    # Use the configured JSON encoder
+    init_json(app)
+    
     # Initialize extensions
     init_extensions(app)
     
+    # Compress large responses
+    init_compression(app)
+    
     # Register error handlers
     register_error_handlers(app)
     
+    # Register CLI commands
+    register_commands(app)
+    
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(projects_bp, url_prefix='/api/projects')
     app.register_blueprint(tasks_bp, url_prefix='/api/tasks')
-    
-    # Health check endpoint
-    @app.route('/api/health')
-    def health_check():
-        return jsonify({
-            'status': 'ok',
-            'environment': config_name,
-            'database': 'connected' if db.session.bind is not None else 'disconnected'
-        })
+    app.register_blueprint(health_bp, url_prefix='/api/health')
     
     # Root endpoint
     @app.route('/')
@@ -55,10 +60,11 @@ def create_app(config_name=None):
     
     return app
 
-# Create the application instance
-app = create_app()
-
 if __name__ == "__main__":
+    # Create the application instance here rather than on import: password
+    # hashing workers are spawned processes, which import this module again
+    app = create_app()
+    
     # Create database tables if they don't exist
     with app.app_context():
         db.create_all()
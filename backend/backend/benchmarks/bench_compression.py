@@ -0,0 +1,39 @@
+"""
+Measure response compression on typical task list bodies.
+
+    python -m benchmarks.bench_compression --sizes 20 100 1000
+"""
+import argparse
+
+from benchmarks.common import make_app, seed, timeit
+from models import Task
+from serializers import task_row_serializer
+from utils.compression import get_encoders, compress
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = make_app()
+    encoders = get_encoders(app)
+    with app.app_context():
+        seed(projects=10, tasks=max(args.sizes))
+
+        print(f'{"tasks":>6} {"encoding":<8} {"bytes":>10} {"ratio":>7} {"cpu":>10}')
+        for size in args.sizes:
+            rows = task_row_serializer.select(Task.query.order_by(Task.id)).limit(size).all()
+            body = app.json.response({'tasks': task_row_serializer.dump(rows)}).get_data()
+            print(f'{size:>6} {"identity":<8} {len(body):>10} {1:>7.2f}')
+
+            for name, factory in encoders.items():
+                compressed = compress(factory(), body)
+                elapsed = timeit(lambda: compress(factory(), body), args.repeat)
+                print(f'{size:>6} {name:<8} {len(compressed):>10} '
+                      f'{len(body) / len(compressed):>7.2f} {elapsed * 1000:>8.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Compare the JSON providers on list responses.
+
+"flask" is Flask's default provider fed marshmallow output, i.e. datetimes
+already formatted by hand; the other providers get the row serializers'
+output and encode datetimes themselves.
+
+    python -m benchmarks.bench_json --tasks 100 1000 --projects 20
+"""
+import argparse
+
+from flask.json.provider import DefaultJSONProvider
+
+from benchmarks.common import make_app, seed, timeit
+from models import Project, Task
+from serializers import projects_schema, tasks_schema, project_row_serializer, task_row_serializer
+from utils.json_provider import OrjsonProvider, StdJSONProvider, orjson
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--projects', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = make_app()
+    providers = {'flask': DefaultJSONProvider(app), 'json': StdJSONProvider(app)}
+    if orjson is not None:
+        providers['orjson'] = OrjsonProvider(app)
+
+    with app.app_context():
+        seed(projects=args.projects, tasks=max(args.tasks))
+
+        cases = []
+        for size in args.tasks:
+            query = Task.query.order_by(Task.id).limit(size)
+            rows = task_row_serializer.select(Task.query.order_by(Task.id)).limit(size).all()
+            cases.append((f'{size} tasks', {'tasks': tasks_schema.dump(query.all())},
+                          {'tasks': task_row_serializer.dump(rows)}))
+
+        query = Project.query.order_by(Project.id)
+        rows = project_row_serializer.select(query).all()
+        cases.append((f'{args.projects} projects (nested)', {'projects': projects_schema.dump(query.all())},
+                      {'projects': project_row_serializer.dump(rows)}))
+
+        print(f'{"case":<26}' + ''.join(f'{name:>12}' for name in providers))
+        for name, formatted, native in cases:
+            expected = providers['flask'].response(formatted).get_data()
+            times = []
+            for provider_name, provider in providers.items():
+                payload = formatted if provider_name == 'flask' else native
+                assert provider.response(payload).get_data() == expected, provider_name
+                times.append(timeit(lambda: provider.response(payload), args.repeat))
+            print(f'{name:<26}' + ''.join(f'{elapsed * 1000:>10.2f}ms' for elapsed in times))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Compare the FTS5 task search with the LIKE fallback.
+
+Seeds the tasks (indexing them through the triggers), times a full index
+rebuild, then runs the /api/tasks/search query for a first page of results.
+The seed vocabulary is tiny, so single words match most tasks and show the
+worst case of ranking every match; the "Task <n>" queries match a handful.
+
+    python -m benchmarks.bench_search --tasks 1000000
+"""
+import argparse
+import time
+
+from benchmarks.common import make_app, seed, timeit
+from models import Task, db
+from serializers import task_row_serializer
+from utils.search import like_tasks, match_tasks, rebuild_search_index
+
+QUERIES = ('webhook', 'invoice deploy', 'onb', 'Task 4242', 'release Task 999')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=1000000)
+    parser.add_argument('--projects', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        started = time.perf_counter()
+        seed(projects=args.projects, tasks=args.tasks)
+        print(f'seeded {args.tasks} tasks in {time.perf_counter() - started:.1f}s')
+
+        started = time.perf_counter()
+        rebuild_search_index()
+        db.session.commit()
+        print(f'rebuilt the index in {time.perf_counter() - started:.1f}s\n')
+
+        query = task_row_serializer.select(Task.query.filter(Task.project_id.in_(range(1, args.projects + 1))))
+        print(f'{"query":<20}{"matches":>10}{"fts5":>12}{"like":>12}')
+        for text in QUERIES:
+            words = text.split()
+            matches = match_tasks(Task.query, words).count()
+            times = [
+                timeit(lambda: search(query, words).limit(args.limit + 1).all(), args.repeat)
+                for search in (match_tasks, like_tasks)
+            ]
+            print(f'{text:<20}{matches:>10}' + ''.join(f'{elapsed * 1000:>10.1f}ms' for elapsed in times))
+
+
+if __name__ == '__main__':
+    main()
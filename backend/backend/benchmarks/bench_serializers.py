@@ -0,0 +1,47 @@
+"""
+Compare marshmallow against the row serializers for list endpoints.
+
+    python -m benchmarks.bench_serializers --tasks 5000 --projects 100
+"""
+import argparse
+
+from benchmarks.common import make_app, seed, timeit
+from models import Project, Task
+from serializers import (
+    projects_schema, tasks_schema,
+    project_row_serializer, task_row_serializer
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=5000)
+    parser.add_argument('--projects', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        seed(projects=args.projects, tasks=args.tasks)
+        task_query = Task.query.order_by(Task.id)
+        project_query = Project.query.order_by(Project.id)
+
+        cases = [
+            (f'{args.tasks} tasks',
+             lambda: tasks_schema.dump(task_query.all()),
+             lambda: task_row_serializer.dump(task_row_serializer.select(task_query).all())),
+            (f'{args.projects} projects (nested)',
+             lambda: projects_schema.dump(project_query.all()),
+             lambda: project_row_serializer.dump(project_row_serializer.select(project_query).all())),
+        ]
+
+        print(f'{"case":<28} {"marshmallow":>12} {"rows":>12} {"speedup":>8}')
+        for name, slow, fast in cases:
+            slow_time = timeit(slow, args.repeat)
+            fast_time = timeit(fast, args.repeat)
+            print(f'{name:<28} {slow_time * 1000:>10.1f}ms {fast_time * 1000:>10.1f}ms '
+                  f'{slow_time / fast_time:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Compare SQLite's default settings with the SQLITE_PRAGMAS profile under
+concurrent reads and writes.
+
+Seeds a database file per profile, then runs worker processes against it
+for a fixed time, like the workers of an application server: readers load
+a page of a project's tasks, writers change a task's status and commit.
+Reports the operations per second of each and the operations that failed
+with "database is locked".
+
+    python -m benchmarks.bench_sqlite --readers 4 --writers 2 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.exc import OperationalError
+
+from benchmarks.common import STATUSES, make_app, seed
+from config import Config
+from models import Task, db
+from utils.sqlite import set_sqlite_pragmas
+
+PROFILES = {'default': {}, 'tuned': Config.SQLITE_PRAGMAS}
+
+
+def work(url, pragmas, role, projects, tasks, seconds, worker):
+    engine = create_engine(url)
+    set_sqlite_pragmas(engine, pragmas)
+    rng = random.Random(worker)
+    table = Task.__table__
+    done = errors = 0
+
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            with engine.begin() as connection:
+                if role == 'read':
+                    connection.execute(
+                        select(table).where(table.c.project_id == rng.randint(1, projects))
+                        .order_by(table.c.created_at.desc()).limit(20)
+                    ).all()
+                else:
+                    connection.execute(
+                        update(table).where(table.c.id == rng.randint(1, tasks))
+                        .values(status=rng.choice(STATUSES))
+                    )
+            done += 1
+        except OperationalError:
+            errors += 1
+    engine.dispose()
+    return role, done, errors
+
+
+def run(profile, args, directory):
+    path = os.path.join(directory, f'{profile}.db')
+    url = f'sqlite:///{path}'
+    app = make_app(SQLALCHEMY_DATABASE_URI=url, SQLITE_PRAGMAS=PROFILES[profile])
+    with app.app_context():
+        seed(projects=args.projects, tasks=args.tasks)
+        db.engine.dispose()
+
+    jobs = [('read', i) for i in range(args.readers)] + [('write', i) for i in range(args.writers)]
+    # Spawned, so that no worker inherits the seeding connections
+    with multiprocessing.get_context('spawn').Pool(len(jobs)) as pool:
+        results = pool.starmap(work, [
+            (url, PROFILES[profile], role, args.projects, args.tasks, args.seconds, worker)
+            for worker, (role, _) in enumerate(jobs)
+        ])
+
+    totals = {'read': [0, 0], 'write': [0, 0]}
+    for role, done, errors in results:
+        totals[role][0] += done
+        totals[role][1] += errors
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--projects', type=int, default=50)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    print(f'{"profile":<10}{"reads/s":>12}{"writes/s":>12}{"locked":>10}')
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in PROFILES:
+            totals = run(profile, args, directory)
+            print(f'{profile:<10}{totals["read"][0] / args.seconds:>12.0f}'
+                  f'{totals["write"][0] / args.seconds:>12.0f}{totals["read"][1] + totals["write"][1]:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Shared setup for the benchmark scripts.
+
+Run a benchmark from the backend directory, e.g.::
+
+    python -m benchmarks.bench_serializers --tasks 5000
+"""
+import random
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+import models  # noqa: F401 - registers the tables before create_all()
+from config import config
+from extensions import db, init_extensions
+from models import Project, ProjectUser, Task, User
+
+STATUSES = ('todo', 'in_progress', 'review', 'done')
+PRIORITIES = ('low', 'medium', 'high')
+TASK_CHUNK = 50000
+
+
+def make_app(**overrides):
+    """Create an app on an in-memory database, without blueprints."""
+    app = Flask(__name__)
+    app.config.from_object(config['testing'])
+    app.config.update(overrides)
+    init_extensions(app)
+    return app
+
+
+def seed(projects=10, tasks=1000, users=20, seed=42):
+    """Insert users, projects with all users as members, and tasks."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+
+    db.session.execute(User.__table__.insert(), [
+        {'name': f'User {i}', 'email': f'user{i}@example.com', 'password_hash': 'x',
+         'role': 'user', 'is_active': True, 'created_at': start, 'updated_at': start}
+        for i in range(1, users + 1)
+    ])
+    db.session.execute(Project.__table__.insert(), [
+        {'name': f'Project {i}', 'description': f'Description of project {i}',
+         'status': 'active', 'manager_id': 1 + i % users, 'created_at': start, 'updated_at': start}
+        for i in range(1, projects + 1)
+    ])
+    db.session.execute(ProjectUser.__table__.insert(), [
+        {'project_id': p, 'user_id': u, 'role': 'admin' if u == 1 else 'member',
+         'created_at': start, 'updated_at': start}
+        for p in range(1, projects + 1) for u in range(1, users + 1)
+    ])
+    # In chunks, so that a million tasks fit in memory
+    for first in range(1, tasks + 1, TASK_CHUNK):
+        db.session.execute(Task.__table__.insert(), [
+            {'title': f'Task {i}: ' + ' '.join(rng.choice(WORDS) for _ in range(5)),
+             'description': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(10, 80))),
+             'status': rng.choice(STATUSES), 'priority': rng.choice(PRIORITIES),
+             'due_date': start + timedelta(days=rng.randint(0, 365)) if rng.random() < 0.6 else None,
+             'project_id': rng.randint(1, projects),
+             'assignee_id': rng.randint(1, users) if rng.random() < 0.8 else None,
+             'created_at': start + timedelta(seconds=i), 'updated_at': start + timedelta(seconds=i)}
+            for i in range(first, min(first + TASK_CHUNK, tasks + 1))
+        ])
+    db.session.commit()
+
+
+def timeit(fn, repeat=5):
+    """Return the best wall-clock time of ``repeat`` runs, in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+WORDS = (
+    'api', 'backlog', 'board', 'bug', 'client', 'deploy', 'design', 'docs', 'email',
+    'export', 'feature', 'fix', 'import', 'login', 'mobile', 'payment', 'release',
+    'report', 'review', 'search', 'server', 'settings', 'sprint', 'test', 'update',
+    'upload', 'user', 'webhook', 'migration', 'dashboard', 'invoice', 'onboarding',
+)
@@ -0,0 +1,60 @@
+"""
+Flask CLI commands for the Task Management API.
+
+Run them with ``flask <command>``, e.g. from cron for periodic maintenance.
+"""
+import click
+
+from extensions import db
+
+
+def register_commands(app):
+    """Register the CLI commands with the given app."""
+
+    @app.cli.command('prune-tokens')
+    def prune_tokens():
+        """Delete expired token revocations."""
+        from utils.revocation import prune_expired_tokens
+
+        deleted = prune_expired_tokens()
+        db.session.commit()
+        click.echo(f'Pruned {deleted} expired token(s)')
+
+    @app.cli.command('prune-tombstones')
+    def prune_tombstones():
+        """Delete task tombstones past the sync retention window."""
+        from utils.sync import prune_tombstones
+
+        deleted = prune_tombstones()
+        db.session.commit()
+        click.echo(f'Pruned {deleted} task tombstone(s)')
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """Create the task search index if needed and reindex every task."""
+        from utils.search import rebuild_search_index
+
+        if not rebuild_search_index():
+            click.echo('Task search uses LIKE on this database, there is no index to rebuild')
+            return
+        db.session.commit()
+        click.echo('Rebuilt the task search index')
+
+    @app.cli.command('rebuild-task-counters')
+    @click.option('--check', is_flag=True, help='Only report counters that are wrong.')
+    def rebuild_task_counters(check):
+        """Recount the task counters from the tasks and report any drift."""
+        from utils.counters import rebuild_task_counters
+
+        drifted = rebuild_task_counters()
+        for (scope, scope_id), (stored, actual) in sorted(drifted.items()):
+            click.echo(f'{scope} {scope_id}: open/done {stored[0]}/{stored[1]}, actually {actual[0]}/{actual[1]}')
+
+        if check:
+            db.session.rollback()
+            if drifted:
+                raise click.ClickException(f'{len(drifted)} task counter(s) are wrong')
+            click.echo('Task counters are correct')
+            return
+        db.session.commit()
+        click.echo(f'Rebuilt the task counters, {len(drifted)} were wrong')
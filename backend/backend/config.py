@@ -14,12 +14,25 @@ class Config:
     
     # Database
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///app.db'
+    
+    # Applied to every SQLite connection, see utils/sqlite.py. Set
+    # SQLITE_TUNING=false for SQLite's defaults.
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64 * 1024)),
+        'foreign_keys': 'ON',
+    } if os.environ.get('SQLITE_TUNING', 'true').lower() in ['true', 'on', '1'] else {}
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
     # JWT
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-in-production'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    JWT_REVOCATION_SYNC_INTERVAL = int(os.environ.get('JWT_REVOCATION_SYNC_INTERVAL', 5))
+    JWT_BLOCKLIST_PRUNE_INTERVAL = int(os.environ.get('JWT_BLOCKLIST_PRUNE_INTERVAL', 3600))
     
     # CORS
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*').split(',')
@@ -32,8 +45,72 @@ class Config:
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
     
+    # Assignment notifications, sent by background workers
+    NOTIFICATIONS_ENABLED = os.environ.get('NOTIFICATIONS_ENABLED', 'true').lower() in ['true', 'on', '1']
+    NOTIFICATION_WORKERS = int(os.environ.get('NOTIFICATION_WORKERS', 2))
+    NOTIFICATION_QUEUE_SIZE = int(os.environ.get('NOTIFICATION_QUEUE_SIZE', 1000))
+    NOTIFICATION_BATCH_SIZE = int(os.environ.get('NOTIFICATION_BATCH_SIZE', 50))
+    NOTIFICATION_RETRIES = int(os.environ.get('NOTIFICATION_RETRIES', 3))
+    NOTIFICATION_RETRY_BACKOFF = float(os.environ.get('NOTIFICATION_RETRY_BACKOFF', 1.0))
+    NOTIFICATION_IDLE_TIMEOUT = int(os.environ.get('NOTIFICATION_IDLE_TIMEOUT', 30))
+    
+    # JSON encoder: auto (orjson if installed), orjson or json
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto')
+    
+    # Response compression (brotli needs the optional `brotli` package)
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() in ['true', 'on', '1']
+    COMPRESS_ALGORITHMS = ['br', 'gzip']
+    COMPRESS_MIMETYPES = ['application/json']
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_BR_LEVEL = int(os.environ.get('COMPRESS_BR_LEVEL', 4))
+    
     # Pagination
     ITEMS_PER_PAGE = 20
+    MAX_ITEMS_PER_PAGE = 100
+    
+    # Project event streams (SSE)
+    EVENTS_BUFFER_SIZE = int(os.environ.get('EVENTS_BUFFER_SIZE', 1000))
+    EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', 100))
+    EVENTS_HEARTBEAT = int(os.environ.get('EVENTS_HEARTBEAT', 15))
+    
+    # Rate limits as "<count>/<second|minute|hour|day>": sign-ins per client
+    # address and per email, writes per user. "memory" keeps them per
+    # process; a redis:// URL shares them across workers.
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'true').lower() in ['true', 'on', '1']
+    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', 'memory')
+    RATELIMIT_MAX_KEYS = int(os.environ.get('RATELIMIT_MAX_KEYS', 100000))
+    RATELIMIT_AUTH = os.environ.get('RATELIMIT_AUTH', '20/minute')
+    RATELIMIT_LOGIN = os.environ.get('RATELIMIT_LOGIN', '5/minute')
+    RATELIMIT_WRITES = os.environ.get('RATELIMIT_WRITES', '120/minute')
+    
+    # Password hashing: werkzeug method with its cost parameters, e.g.
+    # "scrypt:32768:8:1" or "pbkdf2:sha256:600000", run in a process pool
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', 64))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+    
+    # Incremental sync: how long deleted tasks are reported to sync clients
+    TASK_TOMBSTONE_RETENTION = timedelta(days=int(os.environ.get('TASK_TOMBSTONE_RETENTION_DAYS', 30)))
+    
+    # Bulk endpoints
+    BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', 1000))
+    
+    # User cache for JWT lookups: user_id -> user row, per process
+    USER_CACHE_ENABLED = os.environ.get('USER_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 10))
+    
+    # Membership cache: (user_id, project_id) -> role, per process
+    MEMBERSHIP_CACHE_ENABLED = os.environ.get('MEMBERSHIP_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    MEMBERSHIP_CACHE_SIZE = int(os.environ.get('MEMBERSHIP_CACHE_SIZE', 10000))
+    MEMBERSHIP_CACHE_TTL = int(os.environ.get('MEMBERSHIP_CACHE_TTL', 30))
+    
+    # Project statistics cache: project_id -> task counts, per process
+    STATS_CACHE_ENABLED = os.environ.get('STATS_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    STATS_CACHE_SIZE = int(os.environ.get('STATS_CACHE_SIZE', 1000))
+    STATS_CACHE_TTL = int(os.environ.get('STATS_CACHE_TTL', 10))
 
 
 class DevelopmentConfig(Config):
@@ -49,12 +126,27 @@ class TestingConfig(Config):
     WTF_CSRF_ENABLED = False
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(seconds=15)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(seconds=30)
+    NOTIFICATIONS_ENABLED = False
+    PASSWORD_HASH_WORKERS = 0
+    RATELIMIT_ENABLED = False
 
 
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    
+    # Connections per worker process: pool_size kept open, up to max_overflow
+    # more under load. Connections are tested before use and replaced after
+    # pool_recycle seconds, so ones dropped by the server or a proxy are not
+    # handed to requests.
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DATABASE_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DATABASE_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DATABASE_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.environ.get('DATABASE_POOL_PRE_PING', 'true').lower() in ['true', 'on', '1'],
+    }
     SECRET_KEY = os.environ.get('SECRET_KEY')
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY')
     
@@ -0,0 +1,146 @@
+import re
+import socketserver
+import threading
+from contextlib import contextmanager
+
+import pytest
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, text
+
+import models  # noqa: F401 - registers the tables before create_all()
+from commands import register_commands
+from config import config
+from extensions import db, init_extensions
+from routes.auth import auth_bp
+from routes.health import health_bp
+from routes.projects import projects_bp
+from routes.tasks import tasks_bp
+from utils.compression import init_compression
+from utils.json_provider import init_json
+from utils.errors import register_error_handlers
+
+# "SCAN tasks" is a full table scan; "SCAN tasks USING INDEX ..." is not
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+( AS \w+)?$')
+
+
+@pytest.fixture
+def app():
+    """Testing app wired up like app.create_app()."""
+    # The app/ package shadows app.py on import, so build the app here
+    app = Flask(__name__)
+    app.config.from_object(config['testing'])
+
+    init_json(app)
+    init_extensions(app)
+    init_compression(app)
+    register_error_handlers(app)
+    register_commands(app)
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(projects_bp, url_prefix='/api/projects')
+    app.register_blueprint(tasks_bp, url_prefix='/api/tasks')
+    app.register_blueprint(health_bp, url_prefix='/api/health')
+
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(app):
+    """Return the Authorization header for a user."""
+    def _auth_headers(user):
+        return {'Authorization': f'Bearer {create_access_token(identity=user)}'}
+    return _auth_headers
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib, without TLS or AUTH."""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost SMTP stub')
+        envelope = {}
+        for line in self.rfile:
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                envelope = {'from': command[10:], 'to': []}
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                envelope['to'].append(command[8:])
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = b''.join(iter(self.rfile.readline, b'.\r\n'))
+                if self.server.fail_next:
+                    self.server.fail_next -= 1
+                    self.reply('451 Try again later')
+                else:
+                    self.server.messages.append({**envelope, 'data': data.decode()})
+                    self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPStubHandler)
+        self.messages = []
+        self.connections = 0
+        # Answer this many messages with a temporary failure
+        self.fail_next = 0
+
+
+@pytest.fixture
+def smtp_server():
+    """A local SMTP server that records the messages it receives."""
+    server = SMTPStub()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def count_queries(app):
+    """Return a context manager collecting the SQL statements run inside it."""
+    @contextmanager
+    def _count_queries():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+    return _count_queries
+
+
+@pytest.fixture
+def full_table_scans(app):
+    """Return the EXPLAIN QUERY PLAN steps of an ORM query that read a whole table."""
+    def _full_table_scans(query):
+        sql = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+        plan = [row[3] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+        return [step for step in plan if FULL_SCAN.match(step)]
+    return _full_table_scans
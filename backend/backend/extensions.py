@@ -10,6 +10,15 @@ from flask_migrate import Migrate
 from flask_mail import Mail
 from flask_cors import CORS
 
+from utils.cache import TTLCache
+from utils.events import EventBroker
+from utils.notifications import NotificationDispatcher
+from utils.passwords import PasswordHasher
+from utils.pool import PoolMetrics
+from utils.ratelimit import RateLimiter
+from utils.revocation import RevocationFilter
+from utils.sqlite import set_sqlite_pragmas
+
 db = SQLAlchemy()
 ma = Marshmallow()
 jwt = JWTManager()
@@ -17,6 +26,33 @@ migrate = Migrate()
 mail = Mail()
 cors = CORS()
 
+# Process-wide (user_id, project_id) -> role cache, see utils/permissions.py
+membership_cache = TTLCache()
+
+# Per-process cache of user rows for JWT user lookups, see utils/user_cache.py
+user_cache = TTLCache()
+
+# Per-process cache of project task statistics, see utils/stats.py
+stats_cache = TTLCache()
+
+# Per-process set of revoked token jtis, see utils/revocation.py
+revoked_tokens = RevocationFilter()
+
+# Process pool for password hashing, see utils/passwords.py
+hasher = PasswordHasher()
+
+# Per-blueprint request limits, see utils/ratelimit.py
+limiter = RateLimiter()
+
+# Background sender of assignment emails, see utils/notifications.py
+notifier = NotificationDispatcher()
+
+# Per-process pub/sub of project changes for SSE streams, see utils/events.py
+events = EventBroker()
+
+# Per-process database connection pool counters, see utils/pool.py
+pool_metrics = PoolMetrics()
+
 def init_extensions(app):
     """Initialize Flask extensions with the given app."""
     # Initialize SQLAlchemy
@@ -34,15 +70,71 @@ def init_extensions(app):
     # Initialize Mail
     mail.init_app(app)
     
+    # Configure assignment notifications
+    notifier.configure(app)
+    
+    # Configure password hashing
+    hasher.configure(
+        method=app.config.get('PASSWORD_HASH_METHOD', 'scrypt'),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+        queue_size=app.config.get('PASSWORD_HASH_QUEUE_SIZE', 64),
+        timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 10)
+    )
+    
+    # Configure rate limiting
+    limiter.configure(
+        enabled=app.config.get('RATELIMIT_ENABLED', True),
+        storage_url=app.config.get('RATELIMIT_STORAGE_URL', 'memory'),
+        max_keys=app.config.get('RATELIMIT_MAX_KEYS', 100000)
+    )
+    
+    # Configure the membership cache
+    membership_cache.configure(
+        maxsize=app.config.get('MEMBERSHIP_CACHE_SIZE', 10000),
+        ttl=app.config.get('MEMBERSHIP_CACHE_TTL', 30),
+        enabled=app.config.get('MEMBERSHIP_CACHE_ENABLED', True)
+    )
+    
+    # Configure the user cache
+    user_cache.configure(
+        maxsize=app.config.get('USER_CACHE_SIZE', 10000),
+        ttl=app.config.get('USER_CACHE_TTL', 10),
+        enabled=app.config.get('USER_CACHE_ENABLED', True)
+    )
+    
+    # Configure the project statistics cache
+    stats_cache.configure(
+        maxsize=app.config.get('STATS_CACHE_SIZE', 1000),
+        ttl=app.config.get('STATS_CACHE_TTL', 10),
+        enabled=app.config.get('STATS_CACHE_ENABLED', True)
+    )
+    
+    # Configure the token revocation filter
+    revoked_tokens.configure(
+        sync_interval=app.config.get('JWT_REVOCATION_SYNC_INTERVAL', 5),
+        prune_interval=app.config.get('JWT_BLOCKLIST_PRUNE_INTERVAL', 3600)
+    )
+    
+    # Configure the project event streams
+    events.configure(
+        buffer_size=app.config.get('EVENTS_BUFFER_SIZE', 1000),
+        queue_size=app.config.get('EVENTS_QUEUE_SIZE', 100),
+        heartbeat=app.config.get('EVENTS_HEARTBEAT', 15)
+    )
+    
     # Initialize CORS
     cors.init_app(app, resources={
         r"/api/*": {
-            "origins": app.config.get('CORS_ORIGINS', [])
+            "origins": app.config.get('CORS_ORIGINS', []),
+            "expose_headers": ["ETag"]
         }
     })
     
-    # Create database tables if they don't exist
+    # Tune SQLite connections and watch the pool before the first connection
+    # is opened, then create database tables if they don't exist
     with app.app_context():
+        set_sqlite_pragmas(db.engine, app.config.get('SQLITE_PRAGMAS', {}))
+        pool_metrics.watch(db.engine)
         db.create_all()
 
 def register_blueprints(app, blueprints):
@@ -80,17 +172,15 @@ def register_blueprints(app, blueprints):
 # JWT Configuration
 @jwt.user_identity_loader
 def user_identity_lookup(user):
-    return user.id
+    # Routes pass either a User or, like /refresh, a bare id
+    return getattr(user, 'id', user)
 
 @jwt.user_lookup_loader
 def user_lookup_callback(_jwt_header, jwt_data):
-    from models import User
+    from utils.user_cache import load_user
     identity = jwt_data["sub"]
-    return User.query.get(identity)
+    return load_user(identity)
 
 @jwt.token_in_blocklist_loader
 def check_if_token_revoked(jwt_header, jwt_payload):
-    from models import TokenBlocklist
-    jti = jwt_payload["jti"]
-    token = TokenBlocklist.query.filter_by(jti=jti).first()
-    return token is not None
+    return revoked_tokens.is_revoked(jwt_payload["jti"])
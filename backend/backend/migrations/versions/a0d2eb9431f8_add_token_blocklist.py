@@ -0,0 +1,42 @@
+"""Add token blocklist
+
+Revision ID: a0d2eb9431f8
+Revises: c3e51cd4ff42
+Create Date: 2026-10-18 20:05:41.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a0d2eb9431f8'
+down_revision = 'c3e51cd4ff42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('token_blocklist',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('jti', sa.String(length=36), nullable=False),
+    sa.Column('token_type', sa.String(length=10), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('jti'),
+    if_not_exists=True
+    )
+    op.create_index('ix_token_blocklist_created_at', 'token_blocklist',
+                    ['created_at'], unique=False, if_not_exists=True)
+    op.create_index('ix_token_blocklist_expires_at', 'token_blocklist',
+                    ['expires_at'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_token_blocklist_expires_at', table_name='token_blocklist', if_exists=True)
+    op.drop_index('ix_token_blocklist_created_at', table_name='token_blocklist', if_exists=True)
+    op.drop_table('token_blocklist', if_exists=True)
@@ -0,0 +1,55 @@
+"""Add task counters
+
+Revision ID: b91e3f7a25c4
+Revises: f2a8d6c41b07
+Create Date: 2026-10-18 23:25:47.602391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b91e3f7a25c4'
+down_revision = 'f2a8d6c41b07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('task_counters',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('scope', sa.String(length=10), nullable=False),
+    sa.Column('scope_id', sa.Integer(), nullable=False),
+    sa.Column('open_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('done_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('scope', 'scope_id', name='uq_task_counters_scope_scope_id'),
+    if_not_exists=True
+    )
+    # Count the existing tasks. The table may already exist, e.g. made by
+    # create_all() and written to by the app, so recount from scratch like
+    # `flask rebuild-task-counters` instead of inserting over existing rows.
+    op.execute("DELETE FROM task_counters")
+    op.execute("""
+        INSERT INTO task_counters (scope, scope_id, open_count, done_count, created_at, updated_at)
+        SELECT 'project', project_id,
+               SUM(CASE WHEN status = 'done' THEN 0 ELSE 1 END),
+               SUM(CASE WHEN status = 'done' THEN 1 ELSE 0 END),
+               CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+        FROM tasks GROUP BY project_id
+    """)
+    op.execute("""
+        INSERT INTO task_counters (scope, scope_id, open_count, done_count, created_at, updated_at)
+        SELECT 'user', assignee_id,
+               SUM(CASE WHEN status = 'done' THEN 0 ELSE 1 END),
+               SUM(CASE WHEN status = 'done' THEN 1 ELSE 0 END),
+               CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+        FROM tasks WHERE assignee_id IS NOT NULL GROUP BY assignee_id
+    """)
+
+
+def downgrade():
+    op.drop_table('task_counters', if_exists=True)
@@ -0,0 +1,35 @@
+"""Add task and membership indexes
+
+Revision ID: c3e51cd4ff42
+Revises: 63332e525054
+Create Date: 2026-10-18 19:30:12.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e51cd4ff42'
+down_revision = '63332e525054'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # init_extensions() runs db.create_all(), so the indexes may already exist
+    op.create_index('ix_tasks_project_id_status_created_at', 'tasks',
+                    ['project_id', 'status', 'created_at'], unique=False, if_not_exists=True)
+    op.create_index('ix_tasks_assignee_id_status', 'tasks',
+                    ['assignee_id', 'status'], unique=False, if_not_exists=True)
+    op.create_index('ix_tasks_due_date', 'tasks',
+                    ['due_date'], unique=False, if_not_exists=True)
+    op.create_index('ix_project_users_user_id_project_id_role', 'project_users',
+                    ['user_id', 'project_id', 'role'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_project_users_user_id_project_id_role', table_name='project_users', if_exists=True)
+    op.drop_index('ix_tasks_due_date', table_name='tasks', if_exists=True)
+    op.drop_index('ix_tasks_assignee_id_status', table_name='tasks', if_exists=True)
+    op.drop_index('ix_tasks_project_id_status_created_at', table_name='tasks', if_exists=True)
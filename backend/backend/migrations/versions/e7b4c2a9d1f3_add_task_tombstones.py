@@ -0,0 +1,41 @@
+"""Add task tombstones and sync index
+
+Revision ID: e7b4c2a9d1f3
+Revises: a0d2eb9431f8
+Create Date: 2026-10-18 21:12:09.540118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b4c2a9d1f3'
+down_revision = 'a0d2eb9431f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('task_tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('task_id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_task_tombstones_project_id_created_at', 'task_tombstones',
+                    ['project_id', 'created_at'], unique=False, if_not_exists=True)
+    op.create_index('ix_task_tombstones_created_at', 'task_tombstones',
+                    ['created_at'], unique=False, if_not_exists=True)
+    op.create_index('ix_tasks_project_id_updated_at', 'tasks',
+                    ['project_id', 'updated_at'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_tasks_project_id_updated_at', table_name='tasks', if_exists=True)
+    op.drop_index('ix_task_tombstones_created_at', table_name='task_tombstones', if_exists=True)
+    op.drop_index('ix_task_tombstones_project_id_created_at', table_name='task_tombstones', if_exists=True)
+    op.drop_table('task_tombstones', if_exists=True)
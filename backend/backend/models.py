@@ -1,4 +1,5 @@
 from datetime import datetime
+from sqlalchemy import DDL, event
 from extensions import db
 
 class BaseModel(db.Model):
@@ -16,9 +17,11 @@ class ProjectUser(BaseModel):
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     role = db.Column(db.String(50), nullable=False, default='member')
     
-    # Unique constraint to prevent duplicate memberships
+    # Unique constraint to prevent duplicate memberships, plus a covering
+    # index for the per-user membership and role checks
     __table_args__ = (
         db.UniqueConstraint('project_id', 'user_id', name='_project_user_uc'),
+        db.Index('ix_project_users_user_id_project_id_role', 'user_id', 'project_id', 'role'),
     )
 
 class User(BaseModel):
@@ -60,8 +63,8 @@ class User(BaseModel):
             'email': self.email,
             'role': self.role,
             'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
 
 class Project(BaseModel):
@@ -84,14 +87,16 @@ class Project(BaseModel):
         "Task", 
         back_populates="project", 
         cascade="all, delete-orphan",
-        lazy='dynamic'
+        order_by="Task.id",
+        lazy='select'
     )
     
     members = db.relationship(
         "ProjectUser", 
         backref="project_ref", 
         cascade="all, delete-orphan",
-        lazy='dynamic'
+        order_by="ProjectUser.id",
+        lazy='select'
     )
     
     def to_dict(self):
@@ -99,11 +104,11 @@ class Project(BaseModel):
             'id': self.id,
             'name': self.name,
             'description': self.description,
-            'due_date': self.due_date.isoformat() if self.due_date else None,
+            'due_date': self.due_date,
             'status': self.status,
             'manager_id': self.manager_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
 
 class Task(BaseModel):
@@ -125,6 +130,15 @@ class Task(BaseModel):
     project_id = db.Column(db.Integer, db.ForeignKey("projects.id"), nullable=False)
     assignee_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
     
+    # Indexes for the hot query shapes: project boards, "my tasks", due dates
+    # and incremental sync
+    __table_args__ = (
+        db.Index('ix_tasks_project_id_status_created_at', 'project_id', 'status', 'created_at'),
+        db.Index('ix_tasks_assignee_id_status', 'assignee_id', 'status'),
+        db.Index('ix_tasks_due_date', 'due_date'),
+        db.Index('ix_tasks_project_id_updated_at', 'project_id', 'updated_at'),
+    )
+    
     # Relationships
     project = db.relationship("Project", back_populates="tasks")
     assignee = db.relationship("User", back_populates="assigned_tasks", foreign_keys=[assignee_id])
@@ -136,9 +150,76 @@ class Task(BaseModel):
             'description': self.description,
             'status': self.status,
             'priority': self.priority,
-            'due_date': self.due_date.isoformat() if self.due_date else None,
+            'due_date': self.due_date,
             'project_id': self.project_id,
             'assignee_id': self.assignee_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
+
+# Full-text index of task titles and descriptions for GET /api/tasks/search.
+# SQLite only: an external-content FTS5 table that reads the text back from
+# tasks, kept in sync by triggers so that bulk Core statements update it too.
+TASK_SEARCH_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+        title, description, content='tasks', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO tasks_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+)
+
+for statement in TASK_SEARCH_DDL:
+    event.listen(Task.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Task.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS tasks_fts').execute_if(dialect='sqlite'))
+
+class TaskCounter(BaseModel):
+    __tablename__ = "task_counters"
+    
+    # Open and done tasks per project (scope 'project') and per assignee
+    # (scope 'user'), maintained by utils/counters.py
+    scope = db.Column(db.String(10), nullable=False)
+    scope_id = db.Column(db.Integer, nullable=False)
+    open_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    done_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'scope_id', name='uq_task_counters_scope_scope_id'),
+    )
+
+class TokenBlocklist(BaseModel):
+    __tablename__ = "token_blocklist"
+    
+    jti = db.Column(db.String(36), unique=True, nullable=False)
+    token_type = db.Column(db.String(10), nullable=False, default='access')
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    # Incremental sync reads by created_at, pruning deletes by expires_at
+    __table_args__ = (
+        db.Index('ix_token_blocklist_created_at', 'created_at'),
+        db.Index('ix_token_blocklist_expires_at', 'expires_at'),
+    )
+
+class TaskTombstone(BaseModel):
+    __tablename__ = "task_tombstones"
+    
+    # No foreign keys: the task, and possibly its project, are gone
+    task_id = db.Column(db.Integer, nullable=False)
+    project_id = db.Column(db.Integer, nullable=False)
+    
+    # Sync reads per project by created_at, pruning deletes by created_at
+    __table_args__ = (
+        db.Index('ix_task_tombstones_project_id_created_at', 'project_id', 'created_at'),
+        db.Index('ix_task_tombstones_created_at', 'created_at'),
+    )
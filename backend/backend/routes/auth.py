@@ -4,18 +4,25 @@ from flask_jwt_extended import (
     create_refresh_token,
     jwt_required,
     get_jwt_identity,
-    get_jwt
+    get_jwt,
+    current_user
 )
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import timedelta
+from datetime import datetime
 
-from models import User, db
+from extensions import hasher, limiter, revoked_tokens
+from models import User, TokenBlocklist, db
 from serializers import user_schema
 from utils.errors import ValidationError, UnauthorizedError
+from utils.ratelimit import client_ip, login_email
+from utils.revocation import prune_expired_tokens
 
 # Create blueprint
 auth_bp = Blueprint('auth', __name__)
 
+# Shed password guessing before any query or hashing
+limiter.limit(auth_bp, 'RATELIMIT_AUTH', client_ip, endpoints={'auth.register', 'auth.login', 'auth.change_password'})
+limiter.limit(auth_bp, 'RATELIMIT_LOGIN', login_email, endpoints={'auth.login'})
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """Register a new user"""
@@ -30,12 +37,15 @@ def register():
     if User.query.filter_by(email=data['email']).first():
         raise ValidationError('Email already registered')
     
+    # Hash in the pool, outside the try so a busy pool is reported as such
+    password_hash = hasher.hash(data['password'])
+    
     try:
         # Create new user
         user = User(
             name=data['name'],
             email=data['email'],
-            password_hash=generate_password_hash(data['password']),
+            password_hash=password_hash,
             role=data.get('role', 'user')
         )
         
@@ -70,14 +80,14 @@ def login():
     # Find user
     user = User.query.filter_by(email=data['email']).first()
     
-    # Check credentials
-    if not user or not check_password_hash(user.password_hash, data['password']):
+    # Check credentials, upgrading hashes made with old cost parameters
+    if not user or not hasher.check_and_upgrade(user, data['password']):
         raise UnauthorizedError('Invalid email or password')
     
     # Generate tokens
     access_token = create_access_token(
         identity=user.id,
-        expires_delta=timedelta(minutes=current_app.config['JWT_ACCESS_TOKEN_EXPIRES'])
+        expires_delta=current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
     )
     refresh_token = create_refresh_token(identity=user.id)
     
@@ -100,33 +110,51 @@ def refresh():
     access_token = create_access_token(identity=current_user_id)
     return jsonify({'access_token': access_token})
 
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required(verify_type=False)
+def logout():
+    """Revoke the access or refresh token used for this request"""
+    token = get_jwt()
+    expires_at = datetime.utcfromtimestamp(token['exp'])
+    
+    db.session.add(TokenBlocklist(
+        jti=token['jti'],
+        token_type=token['type'],
+        user_id=get_jwt_identity(),
+        expires_at=expires_at
+    ))
+    
+    # Piggyback the periodic cleanup of expired revocations on this write
+    if revoked_tokens.prune_due():
+        prune_expired_tokens()
+    
+    db.session.commit()
+    revoked_tokens.revoke(token['jti'], expires_at)
+    
+    return jsonify({'message': 'Successfully logged out'})
+
 @auth_bp.route('/me', methods=['GET'])
 @jwt_required()
 def get_current_user():
     """Get current user's profile"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get_or_404(current_user_id)
-    return jsonify(user_schema.dump(user))
+    return jsonify(user_schema.dump(current_user))
 
 @auth_bp.route('/change-password', methods=['POST'])
 @jwt_required()
 def change_password():
     """Change user's password"""
-    current_user_id = get_jwt_identity()
     data = request.get_json()
     
     # Validate input
     if not data or not data.get('current_password') or not data.get('new_password'):
         raise ValidationError('Current and new password are required')
     
-    user = User.query.get_or_404(current_user_id)
-    
     # Verify current password
-    if not check_password_hash(user.password_hash, data['current_password']):
+    if not hasher.check(current_user.password_hash, data['current_password']):
         raise UnauthorizedError('Current password is incorrect')
     
-    # Update password
-    user.password_hash = generate_password_hash(data['new_password'])
+    # Update password (the cached user row is invalidated on flush)
+    current_user.password_hash = hasher.hash(data['new_password'])
     db.session.commit()
     
     return jsonify({'message': 'Password updated successfully'})
@@ -0,0 +1,37 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required, current_user
+
+from extensions import (
+    db, events, hasher, limiter, membership_cache, notifier, pool_metrics, stats_cache, user_cache
+)
+from utils.errors import ForbiddenError
+
+# Create blueprint
+health_bp = Blueprint('health', __name__)
+
+@health_bp.route('', methods=['GET'])
+def health_check():
+    """Liveness probe, public so load balancers can call it"""
+    return jsonify({'status': 'ok'})
+
+@health_bp.route('/metrics', methods=['GET'])
+@jwt_required()
+def health_metrics():
+    """Per-process metrics, for admins only as they tell about load and setup"""
+    if current_user.role != 'admin':
+        raise ForbiddenError('Only admins can read the metrics')
+
+    return jsonify({
+        'status': 'ok',
+        'database': 'connected' if db.session.bind is not None else 'disconnected',
+        'database_pool': pool_metrics.stats(),
+        'caches': {
+            'membership': membership_cache.stats(),
+            'user': user_cache.stats(),
+            'stats': stats_cache.stats()
+        },
+        'passwords': hasher.stats(),
+        'rate_limits': limiter.stats(),
+        'notifications': notifier.stats(),
+        'events': events.stats()
+    })
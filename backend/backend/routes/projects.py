@@ -1,20 +1,37 @@
+from datetime import datetime
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import SQLAlchemyError
 
-from models import Project, ProjectUser, User, db
+from extensions import events, limiter
+from models import Project, ProjectUser, Task, User, db
 from serializers import (
-    project_schema, projects_schema, 
-    project_user_schema, project_users_schema
+    ProjectSchema, project_schema, projects_schema, 
+    project_user_schema, project_users_schema,
+    project_row_serializer, project_load_options
 )
+from utils.counters import count_project_deletion
 from utils.errors import (
     ValidationError, UnauthorizedError, 
     ForbiddenError, NotFoundError
 )
+from utils.pagination import keyset_paginate
+from utils.params import get_expand, get_fields
+from utils.etag import make_etag, version_columns, conditional_response
+from utils.permissions import (
+    get_project_role, get_project_roles, require_project_role, invalidate_membership
+)
+from utils.ratelimit import token_subject
+from utils.stats import load_project_stats
 
 # Create blueprint
 projects_bp = Blueprint('projects', __name__)
 
+# Writes per user, checked before the views touch the database
+limiter.limit(projects_bp, 'RATELIMIT_WRITES', token_subject, methods={'POST', 'PUT', 'PATCH', 'DELETE'})
+
 @projects_bp.route('', methods=['POST'])
 @jwt_required()
 def create_project():
@@ -45,6 +62,7 @@ def create_project():
         )
         db.session.add(project_user)
         db.session.commit()
+        invalidate_membership(project.id, current_user_id)
         
         return jsonify({
             'message': 'Project created successfully',
@@ -59,54 +77,84 @@ def create_project():
 @projects_bp.route('', methods=['GET'])
 @jwt_required()
 def get_projects():
-    """Get all projects for current user"""
+    """Get a page of projects for current user"""
     current_user_id = get_jwt_identity()
     
+    # Nested tasks and members are opt-in on the list view
+    expand = get_expand(('tasks', 'members'))
+    fields = get_fields(project_row_serializer.fields)
+    
     # Get projects where user is a member
-    projects = Project.query.join(ProjectUser).filter(
+    query = Project.query.join(ProjectUser).filter(
         ProjectUser.user_id == current_user_id
-    ).all()
+    )
+    rows, page = keyset_paginate(project_row_serializer.select(query, fields), Project)
     
     return jsonify({
-        'projects': projects_schema.dump(projects)
+        'projects': project_row_serializer.dump(rows, expand, fields),
+        **page
+    })
+
+@projects_bp.route('/stats', methods=['GET'])
+@jwt_required()
+def get_projects_stats():
+    """Get task statistics for the user's projects, or those in ?ids="""
+    project_ids = sorted(get_project_roles())
+    
+    ids = request.args.get('ids')
+    if ids:
+        try:
+            requested = {int(project_id) for project_id in ids.split(',') if project_id.strip()}
+        except ValueError:
+            raise ValidationError('ids must be a comma-separated list of project ids')
+        if not requested <= set(project_ids):
+            raise ForbiddenError('You do not have access to this project')
+        project_ids = sorted(requested)
+    
+    stats = load_project_stats(project_ids)
+    return jsonify({
+        'projects': [{'project_id': project_id, **stats[project_id]} for project_id in project_ids]
     })
 
+@projects_bp.route('/<int:project_id>/stats', methods=['GET'])
+@jwt_required()
+@require_project_role()
+def get_project_stats(project_id):
+    """Get task counts by status and priority, and overdue tasks"""
+    return jsonify({'project_id': project_id, **load_project_stats([project_id])[project_id]})
+
 @projects_bp.route('/<int:project_id>', methods=['GET'])
 @jwt_required()
+@require_project_role()
 def get_project(project_id):
     """Get project details"""
-    current_user_id = get_jwt_identity()
-    
-    # Check if user has access to the project
-    project_user = ProjectUser.query.filter_by(
-        project_id=project_id,
-        user_id=current_user_id
-    ).first()
-    
-    if not project_user:
-        raise ForbiddenError('You do not have access to this project')
-    
-    project = Project.query.get_or_404(project_id)
-    return jsonify(project_schema.dump(project))
+    fields = get_fields(project_row_serializer.fields)
+    
+    # Answer polls with 304 while neither the project nor its tasks and
+    # members changed, without loading any of them
+    version = db.session.execute(select(
+        *version_columns(Project, Project.id == project_id),
+        *version_columns(Task, Task.project_id == project_id),
+        *version_columns(ProjectUser, ProjectUser.project_id == project_id)
+    )).one()
+    etag = make_etag(get_jwt_identity(), *version, request.query_string)
+    
+    def build_body():
+        # Load only the requested columns, and nested collections in batches
+        project = Project.query.options(*project_load_options(fields)).get_or_404(project_id)
+        schema = ProjectSchema(only=fields) if fields else project_schema
+        return schema.dump(project)
+    
+    return conditional_response(etag, build_body)
 
 @projects_bp.route('/<int:project_id>', methods=['PUT', 'PATCH'])
 @jwt_required()
+@require_project_role('admin', message='Only project admins can update the project')
 def update_project(project_id):
     """Update project details"""
-    current_user_id = get_jwt_identity()
     data = request.get_json()
     
-    # Check if user is project admin
-    project_user = ProjectUser.query.filter_by(
-        project_id=project_id,
-        user_id=current_user_id,
-        role='admin'
-    ).first()
-    
-    if not project_user:
-        raise ForbiddenError('Only project admins can update the project')
-    
-    project = Project.query.get_or_404(project_id)
+    project = Project.query.options(*project_load_options()).get_or_404(project_id)
     
     # Update fields
     if 'name' in data:
@@ -117,6 +165,13 @@ def update_project(project_id):
         project.status = data['status']
     
     db.session.commit()
+    events.publish(project_id, 'project.updated', {
+        'id': project.id,
+        'name': project.name,
+        'description': project.description,
+        'status': project.status,
+        'updated_at': project.updated_at
+    })
     
     return jsonify({
         'message': 'Project updated successfully',
@@ -125,42 +180,25 @@ def update_project(project_id):
 
 @projects_bp.route('/<int:project_id>', methods=['DELETE'])
 @jwt_required()
+@require_project_role('admin', message='Only project admins can delete the project')
 def delete_project(project_id):
     """Delete a project"""
-    current_user_id = get_jwt_identity()
-    
-    # Check if user is project admin
-    project_user = ProjectUser.query.filter_by(
-        project_id=project_id,
-        user_id=current_user_id,
-        role='admin'
-    ).first()
-    
-    if not project_user:
-        raise ForbiddenError('Only project admins can delete the project')
-    
     project = Project.query.get_or_404(project_id)
     
+    count_project_deletion(project_id)
     db.session.delete(project)
     db.session.commit()
+    invalidate_membership(project_id)
+    events.publish(project_id, 'project.deleted', {'id': project_id})
+    events.disconnect(project_id)
     
     return jsonify({'message': 'Project deleted successfully'})
 
 @projects_bp.route('/<int:project_id>/members', methods=['GET'])
 @jwt_required()
+@require_project_role()
 def get_project_members(project_id):
     """Get all members of a project"""
-    current_user_id = get_jwt_identity()
-    
-    # Check if user has access to the project
-    project_user = ProjectUser.query.filter_by(
-        project_id=project_id,
-        user_id=current_user_id
-    ).first()
-    
-    if not project_user:
-        raise ForbiddenError('You do not have access to this project')
-    
     # Get all project members
     members = ProjectUser.query.filter_by(project_id=project_id).all()
     
@@ -168,23 +206,29 @@ def get_project_members(project_id):
         'members': project_users_schema.dump(members)
     })
 
+@projects_bp.route('/<int:project_id>/events', methods=['GET'])
+# Browsers' EventSource cannot send headers, so the token may be in ?jwt=
+@jwt_required(locations=['headers', 'query_string'])
+@require_project_role()
+def get_project_events(project_id):
+    """Stream the project's changes as Server-Sent Events"""
+    subscription = events.subscribe(
+        project_id, get_jwt_identity(), request.headers.get('Last-Event-ID')
+    )
+    
+    response = current_app.response_class(events.stream(subscription), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep proxies such as nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @projects_bp.route('/<int:project_id>/members', methods=['POST'])
 @jwt_required()
+@require_project_role('admin', message='Only project admins can add members')
 def add_project_member(project_id):
     """Add a member to the project"""
-    current_user_id = get_jwt_identity()
     data = request.get_json()
     
-    # Check if user is project admin
-    project_admin = ProjectUser.query.filter_by(
-        project_id=project_id,
-        user_id=current_user_id,
-        role='admin'
-    ).first()
-    
-    if not project_admin:
-        raise ForbiddenError('Only project admins can add members')
-    
     # Validate input
     if not data or not data.get('user_id') or not data.get('role'):
         raise ValidationError('User ID and role are required')
@@ -213,6 +257,8 @@ def add_project_member(project_id):
         
         db.session.add(project_user)
         db.session.commit()
+        invalidate_membership(project_id, data['user_id'])
+        events.publish(project_id, 'member.added', {'user_id': project_user.user_id, 'role': project_user.role})
         
         return jsonify({
             'message': 'Member added successfully',
@@ -224,6 +270,152 @@ def add_project_member(project_id):
         current_app.logger.error(f'Database error: {str(e)}')
         raise ValidationError('Failed to add member to project')
 
+def insert_ignoring_duplicates(model):
+    """INSERT that skips rows violating a unique constraint"""
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    return dialect.insert(model).on_conflict_do_nothing()
+
+def parse_member(item, with_role=True):
+    """Validate one member of a bulk membership change"""
+    if not with_role:
+        item = {'user_id': item}
+    elif not isinstance(item, dict) or not item.get('role'):
+        raise ValidationError('User ID and role are required')
+    
+    if not isinstance(item.get('user_id'), int):
+        raise ValidationError('User ID must be an integer')
+    return item['user_id'], item.get('role')
+
+@projects_bp.route('/<int:project_id>/members/bulk', methods=['POST'])
+@jwt_required()
+@require_project_role('admin', message='Only project admins can manage members')
+def update_project_members(project_id):
+    """Add, remove and change the role of many members in one transaction"""
+    data = request.get_json()
+    operations = {
+        action: data.get(action) or [] if isinstance(data, dict) else None
+        for action in ('add', 'update', 'remove')
+    }
+    if not all(isinstance(items, list) for items in operations.values()) or not any(operations.values()):
+        raise ValidationError('A non-empty list of members to add, update or remove is required')
+    
+    max_items = current_app.config.get('BULK_MAX_ITEMS', 1000)
+    if sum(map(len, operations.values())) > max_items:
+        raise ValidationError(f'At most {max_items} members are allowed per request')
+    
+    # Validate every item; a user may only appear once per request
+    results = {action: [None] * len(items) for action, items in operations.items()}
+    changes = {action: {} for action in operations}
+    seen = set()
+    for action, items in operations.items():
+        for index, item in enumerate(items):
+            try:
+                user_id, role = parse_member(item, with_role=action != 'remove')
+                if user_id in seen:
+                    raise ValidationError('User appears more than once in this request')
+            except ValidationError as e:
+                results[action][index] = {'index': index, 'error': e.message}
+                continue
+            seen.add(user_id)
+            changes[action][index] = (user_id, role)
+    
+    # Check that new members exist and that updated or removed users are
+    # members, with one query each
+    new_user_ids = {user_id for user_id, _ in changes['add'].values()}
+    existing_users = set(db.session.scalars(
+        select(User.id).where(User.id.in_(new_user_ids))
+    )) if new_user_ids else set()
+    
+    member_ids = {user_id for action in ('update', 'remove') for user_id, _ in changes[action].values()}
+    existing_members = set(db.session.scalars(
+        select(ProjectUser.user_id).where(
+            ProjectUser.project_id == project_id,
+            ProjectUser.user_id.in_(member_ids)
+        )
+    )) if member_ids else set()
+    
+    for action, known, message in (
+        ('add', existing_users, 'User not found'),
+        ('update', existing_members, 'User is not a member of this project'),
+        ('remove', existing_members, 'User is not a member of this project'),
+    ):
+        for index, (user_id, _) in list(changes[action].items()):
+            if user_id not in known:
+                results[action][index] = {'index': index, 'error': message}
+                del changes[action][index]
+    
+    added, updated, removed = (
+        {user_id: role for user_id, role in changes[action].values()}
+        for action in ('add', 'update', 'remove')
+    )
+    try:
+        # Existing members are skipped by the _project_user_uc constraint
+        if added:
+            inserted = set(db.session.scalars(
+                insert_ignoring_duplicates(ProjectUser).returning(ProjectUser.user_id),
+                [{'project_id': project_id, 'user_id': user_id, 'role': role} for user_id, role in added.items()]
+            ))
+            for index, (user_id, _) in list(changes['add'].items()):
+                if user_id not in inserted:
+                    results['add'][index] = {'index': index, 'error': 'User is already a member of this project'}
+                    del changes['add'][index]
+        
+        if updated:
+            db.session.execute(
+                update(ProjectUser).where(
+                    ProjectUser.project_id == project_id,
+                    ProjectUser.user_id.in_(updated)
+                ).values(role=case(updated, value=ProjectUser.user_id), updated_at=datetime.utcnow()),
+                execution_options={'synchronize_session': False}
+            )
+        
+        if removed:
+            db.session.execute(
+                delete(ProjectUser).where(
+                    ProjectUser.project_id == project_id,
+                    ProjectUser.user_id.in_(removed)
+                ),
+                execution_options={'synchronize_session': False}
+            )
+        
+        # Prevent leaving the project without an admin
+        admin_count = db.session.scalar(
+            select(func.count(ProjectUser.id)).where(
+                ProjectUser.project_id == project_id,
+                ProjectUser.role == 'admin'
+            )
+        )
+        if not admin_count:
+            db.session.rollback()
+            raise ForbiddenError('Cannot remove the only admin. Promote another admin first.')
+        
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f'Database error: {str(e)}')
+        raise ValidationError('Failed to update project members')
+    
+    for user_id in seen:
+        invalidate_membership(project_id, user_id)
+    
+    event_types = {'add': 'member.added', 'update': 'member.updated', 'remove': 'member.removed'}
+    for action, indexes in changes.items():
+        for index, (user_id, role) in indexes.items():
+            results[action][index] = {'index': index, 'user_id': user_id}
+            events.publish(project_id, event_types[action], {'user_id': user_id, 'role': role})
+            if action == 'remove':
+                events.disconnect(project_id, user_id)
+    
+    failed = sum(len(items) - len(changes[action]) for action, items in operations.items())
+    return jsonify({
+        'message': 'Project members updated successfully',
+        'added': len(changes['add']),
+        'updated': len(changes['update']),
+        'removed': len(changes['remove']),
+        'failed': failed,
+        'results': results
+    }), 207 if failed else 200
+
 @projects_bp.route('/<int:project_id>/members/<int:user_id>', methods=['DELETE'])
 @jwt_required()
 def remove_project_member(project_id, user_id):
@@ -231,11 +423,7 @@ def remove_project_member(project_id, user_id):
     current_user_id = get_jwt_identity()
     
     # Check if user is project admin
-    project_admin = ProjectUser.query.filter_by(
-        project_id=project_id,
-        user_id=current_user_id,
-        role='admin'
-    ).first()
+    project_admin = get_project_role(project_id) == 'admin'
     
     # Allow users to remove themselves
     if not project_admin and current_user_id != user_id:
@@ -262,5 +450,8 @@ def remove_project_member(project_id, user_id):
     
     db.session.delete(project_user)
     db.session.commit()
+    invalidate_membership(project_id, user_id)
+    events.publish(project_id, 'member.removed', {'user_id': user_id})
+    events.disconnect(project_id, user_id)
     
     return jsonify({'message': 'Member removed successfully'})
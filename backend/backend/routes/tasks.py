@@ -1,23 +1,55 @@
 from datetime import datetime
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import insert, or_, tuple_, update
 from sqlalchemy.exc import SQLAlchemyError
 
-from models import Task, Project, ProjectUser, User, db
-from serializers import task_schema, tasks_schema
+from extensions import events, limiter, notifier
+from models import Task, TaskTombstone, Project, ProjectUser, User, db
+from serializers import (
+    TaskSchema, task_schema, tasks_schema,
+    task_row_serializer, task_load_options
+)
 from utils.errors import (
-    ValidationError, UnauthorizedError, 
+    APIError, ValidationError, UnauthorizedError, 
     ForbiddenError, NotFoundError
 )
+from utils.pagination import get_page_limit, get_page_offset, keyset_paginate
+from utils.params import get_fields
+from utils.counters import TaskCounterChanges, count_task_change, read_task_counts, task_state
+from utils.etag import make_etag, query_version, conditional_response
+from utils.permissions import get_project_role, get_project_roles, get_member_role, get_member_roles
+from utils.ratelimit import token_subject
+from utils.search import filter_by_search, parse_search_words
+from utils.sync import decode_sync_token, encode_sync_token, next_round_start, record_deleted_tasks
 
 # Create blueprint
 tasks_bp = Blueprint('tasks', __name__)
 
+# Writes per user, checked before the views touch the database
+limiter.limit(tasks_bp, 'RATELIMIT_WRITES', token_subject, methods={'POST', 'PUT', 'PATCH', 'DELETE'})
+
+def get_member_task(task_id, roles=(), message='Task not found or access denied', options=(), for_update=False):
+    """
+    Get a task the current user can access, optionally requiring a role.
+    ``for_update`` locks the row until the transaction ends, so that a write
+    counts from the state it really replaces.
+    """
+    task = db.session.get(
+        Task, task_id, options=options,
+        with_for_update=True if for_update else None, populate_existing=for_update
+    )
+    role = get_project_role(task.project_id) if task else None
+    
+    if role is None or (roles and role not in roles):
+        raise NotFoundError(message)
+    
+    return task
+
 @tasks_bp.route('', methods=['POST'])
 @jwt_required()
 def create_task():
     """Create a new task"""
-    current_user_id = get_jwt_identity()
     data = request.get_json()
     
     # Validate input
@@ -26,24 +58,13 @@ def create_task():
         raise ValidationError('Title and project ID are required')
     
     # Check if user has access to the project
-    project_user = ProjectUser.query.filter_by(
-        project_id=data['project_id'],
-        user_id=current_user_id
-    ).first()
-    
-    if not project_user:
+    if not get_project_role(data['project_id']):
         raise ForbiddenError('You do not have access to this project')
     
     # Check if assignee exists and is a project member
     assignee_id = data.get('assignee_id')
-    if assignee_id:
-        assignee_member = ProjectUser.query.filter_by(
-            project_id=data['project_id'],
-            user_id=assignee_id
-        ).first()
-        
-        if not assignee_member:
-            raise ValidationError('Assignee must be a project member')
+    if assignee_id and not get_member_role(data['project_id'], assignee_id):
+        raise ValidationError('Assignee must be a project member')
     
     try:
         # Create task
@@ -58,13 +79,17 @@ def create_task():
         )
         
         db.session.add(task)
+        count_task_change(after=task_state(task))
         db.session.commit()
         
-        # TODO: Send notification to assignee if assigned
+        notifier.notify_assignments([(task.id, task.assignee_id)], actor_id=get_jwt_identity())
+        
+        task_data = task_schema.dump(task)
+        events.publish(task.project_id, 'task.created', task_data)
         
         return jsonify({
             'message': 'Task created successfully',
-            'task': task_schema.dump(task)
+            'task': task_data
         }), 201
         
     except ValueError as e:
@@ -74,16 +99,219 @@ def create_task():
         current_app.logger.error(f'Database error: {str(e)}')
         raise ValidationError('Failed to create task')
 
+def publish_tasks(event_type, task_ids):
+    """Publish tasks changed in bulk in the shape the single-task routes publish"""
+    query = Task.query.filter(Task.id.in_(task_ids)).order_by(Task.id)
+    for task in task_row_serializer.dump(task_row_serializer.select(query).all()):
+        events.publish(task['project_id'], event_type, task)
+
+def get_bulk_items(data, key):
+    """Get the list of items of a bulk request, within BULK_MAX_ITEMS"""
+    items = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ValidationError(f'A non-empty list of {key} is required')
+    
+    max_items = current_app.config.get('BULK_MAX_ITEMS', 1000)
+    if len(items) > max_items:
+        raise ValidationError(f'At most {max_items} {key} are allowed per request')
+    
+    return items
+
+def check_task_label(field, value):
+    """Check a status or priority: a non-empty string that fits its column"""
+    max_length = getattr(Task, field).type.length
+    if not isinstance(value, str) or not value.strip() or len(value) > max_length:
+        raise ValidationError(f'{field.capitalize()} must be a non-empty string of at most {max_length} characters')
+    return value
+
+def parse_bulk_changes(changes):
+    """Validate the changes of a bulk update and return them"""
+    allowed = {'status', 'priority', 'assignee_id'}
+    if not isinstance(changes, dict) or not changes or not set(changes) <= allowed:
+        raise ValidationError(f"Changes must set one or more of: {', '.join(sorted(allowed))}")
+    
+    for field in ('status', 'priority'):
+        if field in changes:
+            check_task_label(field, changes[field])
+    
+    assignee_id = changes.get('assignee_id')
+    if assignee_id is not None and (isinstance(assignee_id, bool) or not isinstance(assignee_id, int)):
+        raise ValidationError('Assignee ID must be an integer or null')
+    
+    return dict(changes)
+
+def parse_bulk_task(item, project_roles):
+    """Validate one item of a bulk create and return its column values"""
+    if not isinstance(item, dict) or not all(item.get(field) for field in ('title', 'project_id')):
+        raise ValidationError('Title and project ID are required')
+    
+    try:
+        project_id = int(item['project_id'])
+        assignee_id = int(item['assignee_id']) if item.get('assignee_id') else None
+    except (TypeError, ValueError):
+        raise ValidationError('Project and assignee IDs must be integers')
+    
+    if project_id not in project_roles:
+        raise ForbiddenError('You do not have access to this project')
+    
+    try:
+        due_date = datetime.fromisoformat(item['due_date']) if item.get('due_date') else None
+    except (TypeError, ValueError):
+        raise ValidationError('Invalid date format. Use ISO format (YYYY-MM-DD)')
+    
+    return {
+        'title': item['title'],
+        'description': item.get('description'),
+        'status': check_task_label('status', item.get('status', 'todo')),
+        'priority': check_task_label('priority', item.get('priority', 'medium')),
+        'due_date': due_date,
+        'project_id': project_id,
+        'assignee_id': assignee_id
+    }
+
+@tasks_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def create_tasks():
+    """Create many tasks in one transaction"""
+    items = get_bulk_items(request.get_json(), 'tasks')
+    
+    # Validate every item, checking project access and assignee membership
+    # once per distinct project and user
+    project_roles = get_project_roles()
+    results = [None] * len(items)
+    values = {}
+    for index, item in enumerate(items):
+        try:
+            values[index] = parse_bulk_task(item, project_roles)
+        except APIError as e:
+            results[index] = {'index': index, 'error': e.message}
+    
+    member_roles = get_member_roles({
+        (task['project_id'], task['assignee_id'])
+        for task in values.values() if task['assignee_id']
+    })
+    for index, task in list(values.items()):
+        if task['assignee_id'] and not member_roles[task['project_id'], task['assignee_id']]:
+            results[index] = {'index': index, 'error': 'Assignee must be a project member'}
+            del values[index]
+    
+    # Insert the valid tasks with a single executemany
+    if values:
+        try:
+            # render_nulls keeps rows with and without optional values in
+            # the same batch. RETURNING rows come back in no set order, so
+            # have them sorted like the items they belong to.
+            ids = db.session.scalars(
+                insert(Task).returning(Task.id, sort_by_parameter_order=True),
+                list(values.values()),
+                execution_options={'render_nulls': True}
+            ).all()
+            
+            counters = TaskCounterChanges()
+            for task in values.values():
+                counters.add(task['project_id'], task['assignee_id'], task['status'])
+            counters.apply()
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            current_app.logger.error(f'Database error: {str(e)}')
+            raise ValidationError('Failed to create tasks')
+        
+        for index, task_id in zip(values, ids):
+            results[index] = {'index': index, 'id': task_id}
+        publish_tasks('task.created', ids)
+        
+        notifier.notify_assignments(
+            [(task_id, values[index]['assignee_id']) for index, task_id in zip(values, ids)],
+            actor_id=get_jwt_identity()
+        )
+    
+    failed = len(items) - len(values)
+    return jsonify({
+        'message': f'{len(values)} tasks created, {failed} failed',
+        'created': len(values),
+        'failed': failed,
+        'results': results
+    }), 207 if failed else 201
+
+@tasks_bp.route('/bulk', methods=['PATCH'])
+@jwt_required()
+def update_tasks():
+    """Apply the same status, priority or assignee change to many tasks"""
+    data = request.get_json()
+    ids = get_bulk_items(data, 'ids')
+    changes = parse_bulk_changes(data.get('changes'))
+    if not all(isinstance(task_id, int) for task_id in ids):
+        raise ValidationError('Task IDs must be integers')
+    ids = list(dict.fromkeys(ids))
+    
+    # Find and lock the tasks the user can access with a single query
+    rows = Task.query.join(ProjectUser, ProjectUser.project_id == Task.project_id).filter(
+        Task.id.in_(ids),
+        ProjectUser.user_id == get_jwt_identity()
+    ).with_entities(Task.id, Task.project_id, Task.assignee_id, Task.status).with_for_update(of=Task).all()
+    previous_states = {task_id: (project_id, assignee_id, status) for task_id, project_id, assignee_id, status in rows}
+    project_ids = {task_id: state[0] for task_id, state in previous_states.items()}
+    errors = {task_id: 'Task not found or access denied' for task_id in ids if task_id not in project_ids}
+    
+    assignee_id = changes.get('assignee_id')
+    if assignee_id:
+        member_roles = get_member_roles({(project_id, assignee_id) for project_id in project_ids.values()})
+        for task_id, project_id in project_ids.items():
+            if not member_roles[project_id, assignee_id]:
+                errors[task_id] = 'Assignee must be a project member'
+    
+    # Update the rest with one set-based UPDATE
+    updated_ids = [task_id for task_id in ids if task_id not in errors]
+    if updated_ids:
+        changes['updated_at'] = datetime.utcnow()
+        try:
+            db.session.execute(
+                update(Task).where(Task.id.in_(updated_ids)).values(**changes),
+                execution_options={'synchronize_session': False}
+            )
+            
+            counters = TaskCounterChanges()
+            for task_id in updated_ids:
+                project_id, previous_assignee_id, status = previous_states[task_id]
+                counters.remove(project_id, previous_assignee_id, status)
+                counters.add(project_id, changes.get('assignee_id', previous_assignee_id), changes.get('status', status))
+            counters.apply()
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            current_app.logger.error(f'Database error: {str(e)}')
+            raise ValidationError('Failed to update tasks')
+        
+        publish_tasks('task.updated', updated_ids)
+        
+        if assignee_id:
+            notifier.notify_assignments(
+                [(task_id, assignee_id) for task_id in updated_ids if previous_states[task_id][1] != assignee_id],
+                actor_id=get_jwt_identity()
+            )
+    
+    return jsonify({
+        'message': f'{len(updated_ids)} tasks updated, {len(errors)} failed',
+        'updated': len(updated_ids),
+        'failed': len(errors),
+        'results': [
+            {'id': task_id, 'error': errors[task_id]} if task_id in errors else {'id': task_id}
+            for task_id in ids
+        ]
+    }), 207 if errors else 200
+
 @tasks_bp.route('', methods=['GET'])
 @jwt_required()
 def get_tasks():
-    """Get tasks with optional filtering"""
+    """Get a page of tasks with optional filtering"""
     current_user_id = get_jwt_identity()
     
     # Get query parameters
     project_id = request.args.get('project_id')
     status = request.args.get('status')
     assignee_id = request.args.get('assignee_id')
+    fields = get_fields(task_row_serializer.fields)
     
     # Start with base query for tasks in projects the user is a member of
     query = Task.query.join(Project).join(ProjectUser).filter(
@@ -98,54 +326,136 @@ def get_tasks():
     if assignee_id:
         query = query.filter(Task.assignee_id == assignee_id)
     
-    # Execute query
-    tasks = query.order_by(Task.created_at.desc()).all()
+    # Answer polls with 304 while none of the matching tasks changed
+    etag = make_etag(current_user_id, request.query_string, query_version(query, Task))
+    
+    def build_body():
+        # Execute query one page at a time, newest first, selecting only the
+        # serialized columns
+        rows, page = keyset_paginate(task_row_serializer.select(query, fields), Task)
+        return {
+            'tasks': task_row_serializer.dump(rows, fields),
+            **page
+        }
+    
+    return conditional_response(etag, build_body)
+
+@tasks_bp.route('/counts', methods=['GET'])
+@jwt_required()
+def get_task_counts():
+    """Get open, done and overdue counts of the user's tasks and projects"""
+    project_ids = sorted(get_project_roles())
+    projects, assigned = read_task_counts(project_ids, get_jwt_identity())
     
     return jsonify({
-        'tasks': tasks_schema.dump(tasks)
+        'assigned': assigned,
+        'projects': [{'project_id': project_id, **projects[project_id]} for project_id in project_ids]
     })
 
-@tasks_bp.route('/<int:task_id>', methods=['GET'])
+@tasks_bp.route('/search', methods=['GET'])
 @jwt_required()
-def get_task(task_id):
-    """Get task details"""
+def search_tasks():
+    """Search the titles and descriptions of the user's tasks"""
+    words = parse_search_words(request.args.get('q'))
+    limit = get_page_limit()
+    offset = get_page_offset()
+    
+    # Filter on the (cached) project ids rather than joining the memberships
+    # of every match before ranking
+    query = Task.query.filter(Task.project_id.in_(get_project_roles()))
+    
+    # Ranked results have no stable sort key, so page by offset
+    rows = filter_by_search(task_row_serializer.select(query), words).offset(offset).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    return jsonify({
+        'tasks': task_row_serializer.dump(rows),
+        'limit': limit,
+        'offset': offset,
+        'next_offset': offset + limit if has_more else None,
+        'has_more': has_more
+    })
+
+@tasks_bp.route('/changes', methods=['GET'])
+@jwt_required()
+def get_task_changes():
+    """Get the tasks changed and deleted since a sync token"""
     current_user_id = get_jwt_identity()
+    since, started_at, after = decode_sync_token(request.args.get('since'))
+    limit = get_page_limit()
     
-    # Get the task with project and member check
-    task = Task.query.join(Project).join(ProjectUser).filter(
-        Task.id == task_id,
+    # A round's first page fixes the time the next round starts from
+    if started_at is None:
+        started_at = datetime.utcnow()
+    
+    query = Task.query.join(Project).join(ProjectUser).filter(
         ProjectUser.user_id == current_user_id
-    ).first()
+    )
+    if since is not None:
+        # Projects joined since the token send all their tasks, however old
+        query = query.filter(or_(Task.updated_at >= since, ProjectUser.created_at >= since))
+    if after is not None:
+        query = query.filter(tuple_(Task.updated_at, Task.id) > tuple_(*after))
+    
+    # Fetch one extra row to know whether another page exists
+    rows = task_row_serializer.select(query).order_by(
+        Task.updated_at, Task.id
+    ).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    # Deletions are sent once per round, with its first page
+    deleted = []
+    if since is not None and after is None:
+        deleted = db.session.query(
+            TaskTombstone.task_id, TaskTombstone.project_id, TaskTombstone.created_at
+        ).join(ProjectUser, ProjectUser.project_id == TaskTombstone.project_id).filter(
+            ProjectUser.user_id == current_user_id,
+            TaskTombstone.created_at >= since
+        ).order_by(TaskTombstone.created_at).all()
+    
+    if has_more:
+        next_token = encode_sync_token(since, started_at, (rows[-1].updated_at, rows[-1].id))
+    else:
+        next_token = encode_sync_token(next_round_start(started_at), None)
+    
+    return jsonify({
+        'tasks': task_row_serializer.dump(rows),
+        'deleted': [
+            {'id': task_id, 'project_id': project_id, 'deleted_at': deleted_at}
+            for task_id, project_id, deleted_at in deleted
+        ],
+        # Tasks of projects missing here are gone for this user
+        'projects': sorted(get_project_roles()),
+        'next_token': next_token,
+        'has_more': has_more,
+        'limit': limit
+    })
+
+@tasks_bp.route('/<int:task_id>', methods=['GET'])
+@jwt_required()
+def get_task(task_id):
+    """Get task details"""
+    fields = get_fields(task_row_serializer.fields)
     
-    if not task:
-        raise NotFoundError('Task not found or access denied')
+    # Get the task with project and member check, loading only the
+    # requested columns
+    task = get_member_task(task_id, options=task_load_options(fields))
     
-    return jsonify(task_schema.dump(task))
+    schema = TaskSchema(only=fields) if fields else task_schema
+    etag = make_etag(get_jwt_identity(), task.id, task.updated_at, request.query_string)
+    return conditional_response(etag, lambda: schema.dump(task))
 
 @tasks_bp.route('/<int:task_id>', methods=['PUT', 'PATCH'])
 @jwt_required()
 def update_task(task_id):
     """Update task details"""
-    current_user_id = get_jwt_identity()
     data = request.get_json()
     
     # Get the task with project and member check
-    task = Task.query.join(Project).join(ProjectUser).filter(
-        Task.id == task_id,
-        ProjectUser.user_id == current_user_id
-    ).first()
-    
-    if not task:
-        raise NotFoundError('Task not found or access denied')
-    
-    # Check if user can update the task
-    project_user = ProjectUser.query.filter_by(
-        project_id=task.project_id,
-        user_id=current_user_id
-    ).first()
-    
-    if not project_user:
-        raise ForbiddenError('You do not have access to this task')
+    task = get_member_task(task_id, for_update=True)
+    previous_state = task_state(task)
     
     # Update fields
     if 'title' in data:
@@ -160,48 +470,49 @@ def update_task(task_id):
         task.due_date = datetime.fromisoformat(data['due_date']) if data['due_date'] else None
     
     # Handle assignee change
+    previous_assignee_id = task.assignee_id
     if 'assignee_id' in data:
         new_assignee_id = data['assignee_id']
         
         # Check if new assignee is a project member
-        if new_assignee_id:
-            assignee_member = ProjectUser.query.filter_by(
-                project_id=task.project_id,
-                user_id=new_assignee_id
-            ).first()
-            
-            if not assignee_member:
-                raise ValidationError('Assignee must be a project member')
+        if new_assignee_id and not get_member_role(task.project_id, new_assignee_id):
+            raise ValidationError('Assignee must be a project member')
         
         task.assignee_id = new_assignee_id
-        # TODO: Send notification to new assignee
     
     task.updated_at = datetime.utcnow()
+    count_task_change(previous_state, task_state(task))
     db.session.commit()
     
+    if task.assignee_id != previous_assignee_id:
+        notifier.notify_assignments([(task.id, task.assignee_id)], actor_id=get_jwt_identity())
+    
+    task_data = task_schema.dump(task)
+    events.publish(task.project_id, 'task.updated', task_data)
+    
     return jsonify({
         'message': 'Task updated successfully',
-        'task': task_schema.dump(task)
+        'task': task_data
     })
 
 @tasks_bp.route('/<int:task_id>', methods=['DELETE'])
 @jwt_required()
 def delete_task(task_id):
     """Delete a task"""
-    current_user_id = get_jwt_identity()
-    
-    # Get the task with project and member check
-    task = Task.query.join(Project).join(ProjectUser).filter(
-        Task.id == task_id,
-        ProjectUser.user_id == current_user_id,
-        ProjectUser.role.in_(['admin', 'manager'])  # Only admins and managers can delete
-    ).first()
-    
-    if not task:
-        raise NotFoundError('Task not found or insufficient permissions')
+    # Only admins and managers can delete
+    task = get_member_task(
+        task_id,
+        roles=('admin', 'manager'),
+        message='Task not found or insufficient permissions',
+        for_update=True
+    )
     
+    project_id = task.project_id
+    record_deleted_tasks(Task.id == task_id)
+    count_task_change(before=task_state(task))
     db.session.delete(task)
     db.session.commit()
+    events.publish(project_id, 'task.deleted', {'id': task_id, 'project_id': project_id})
     
     return jsonify({'message': 'Task deleted successfully'})
 
@@ -209,69 +520,61 @@ def delete_task(task_id):
 @jwt_required()
 def update_task_status(task_id):
     """Update task status"""
-    current_user_id = get_jwt_identity()
     data = request.get_json()
     
     if not data or 'status' not in data:
         raise ValidationError('Status is required')
     
     # Get the task with project and member check
-    task = Task.query.join(Project).join(ProjectUser).filter(
-        Task.id == task_id,
-        ProjectUser.user_id == current_user_id
-    ).first()
-    
-    if not task:
-        raise NotFoundError('Task not found or access denied')
+    task = get_member_task(task_id, for_update=True)
     
     # Update status
+    previous_state = task_state(task)
     task.status = data['status']
     task.updated_at = datetime.utcnow()
+    count_task_change(previous_state, task_state(task))
     db.session.commit()
     
+    task_data = task_schema.dump(task)
+    events.publish(task.project_id, 'task.updated', task_data)
+    
     return jsonify({
         'message': 'Task status updated successfully',
-        'task': task_schema.dump(task)
+        'task': task_data
     })
 
 @tasks_bp.route('/<int:task_id>/assign', methods=['PATCH'])
 @jwt_required()
 def assign_task(task_id):
     """Assign a task to a user"""
-    current_user_id = get_jwt_identity()
     data = request.get_json()
     
     if not data or 'assignee_id' not in data:
         raise ValidationError('Assignee ID is required')
     
     # Get the task with project and member check
-    task = Task.query.join(Project).join(ProjectUser).filter(
-        Task.id == task_id,
-        ProjectUser.user_id == current_user_id
-    ).first()
-    
-    if not task:
-        raise NotFoundError('Task not found or access denied')
+    task = get_member_task(task_id, for_update=True)
     
     # Check if new assignee is a project member
     assignee_id = data['assignee_id']
-    if assignee_id:
-        assignee_member = ProjectUser.query.filter_by(
-            project_id=task.project_id,
-            user_id=assignee_id
-        ).first()
-        
-        if not assignee_member:
-            raise ValidationError('Assignee must be a project member')
+    if assignee_id and not get_member_role(task.project_id, assignee_id):
+        raise ValidationError('Assignee must be a project member')
     
     # Update assignee
+    previous_assignee_id = task.assignee_id
+    previous_state = task_state(task)
     task.assignee_id = assignee_id
     task.updated_at = datetime.utcnow()
+    count_task_change(previous_state, task_state(task))
     db.session.commit()
     
-    # TODO: Send notification to new assignee
+    if task.assignee_id != previous_assignee_id:
+        notifier.notify_assignments([(task.id, task.assignee_id)], actor_id=get_jwt_identity())
+    
+    task_data = task_schema.dump(task)
+    events.publish(task.project_id, 'task.updated', task_data)
     
     return jsonify({
         'message': 'Task assigned successfully',
-        'task': task_schema.dump(task)
+        'task': task_data
     })
@@ -1,6 +1,8 @@
 from marshmallow import fields, validate
+from operator import itemgetter
+from sqlalchemy.orm import aliased, joinedload, load_only, selectinload
 from models import User, Project, Task, ProjectUser
-from extensions import ma
+from extensions import ma, db
 
 class UserSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
@@ -27,8 +29,8 @@ class TaskSchema(ma.SQLAlchemyAutoSchema):
 
 class ProjectSchema(ma.SQLAlchemyAutoSchema):
     manager = fields.Nested(UserSchema, only=('id', 'name', 'email'), allow_none=True)
-    tasks = fields.List(fields.Nested(TaskSchema, exclude=('project',)))
-    members = fields.List(fields.Nested(ProjectUserSchema, exclude=('project',)))
+    tasks = fields.List(fields.Nested(TaskSchema))
+    members = fields.List(fields.Nested(ProjectUserSchema))
     
     class Meta:
         model = Project
@@ -43,4 +45,217 @@ projects_schema = ProjectSchema(many=True)
 task_schema = TaskSchema()
 tasks_schema = TaskSchema(many=True)
 project_user_schema = ProjectUserSchema()
-project_users_schema = ProjectUserSchema(many=True)
\ No newline at end of file
+project_users_schema = ProjectUserSchema(many=True)
+
+
+# Getter factories for the row serializers. Each takes the column positions
+# of a result ({column key: index}) and returns a function of one row; tuple
+# indexing is much cheaper than attribute access on Row objects. Datetimes
+# are left for the JSON provider to encode.
+
+def _column(key):
+    return lambda positions: itemgetter(positions[key])
+
+
+def _nested(ref_key, **keys):
+    def factory(positions):
+        ref_index = positions[ref_key]
+        indexes = [(name, positions[key]) for name, key in keys.items()]
+        return lambda row: {name: row[index] for name, index in indexes} if row[ref_index] is not None else None
+    return factory
+
+
+def _unique_columns(columns):
+    return list({column.key: column for column in columns}.values())
+
+
+def _getters(fields, rows, names):
+    """Resolve the getters of the requested fields against a result's columns"""
+    positions = {key: index for index, key in enumerate(rows[0]._fields)} if rows else {}
+    return [(name, fields[name][1](positions)) for name in names] if rows else []
+
+
+class TaskRowSerializer:
+    """
+    Read-only fast path for task lists.
+    
+    Selects only the columns TaskSchema dumps, with the assignee joined in,
+    and builds the same dicts as ``tasks_schema.dump()`` straight from the
+    result rows, without loading ORM objects or running marshmallow fields.
+    Passing ``fields`` narrows both the SELECT list and the output.
+    """
+    assignee = aliased(User, name='assignee')
+    
+    # Output field -> (columns it needs, getter factory), in TaskSchema order
+    fields = {
+        'id': ((Task.id,), _column('id')),
+        'title': ((Task.title,), _column('title')),
+        'description': ((Task.description,), _column('description')),
+        'status': ((Task.status,), _column('status')),
+        'project_id': ((Task.project_id,), _column('project_id')),
+        'assignee_id': ((Task.assignee_id,), _column('assignee_id')),
+        'assignee': (
+            (assignee.id.label('assignee_ref_id'), assignee.name.label('assignee_name')),
+            _nested('assignee_ref_id', id='assignee_ref_id', name='assignee_name')
+        ),
+        'created_at': ((Task.created_at,), _column('created_at')),
+        'updated_at': ((Task.updated_at,), _column('updated_at')),
+    }
+    
+    # Keyset pagination reads these from the last row of a page
+    key_columns = (Task.id, Task.created_at)
+    
+    def select(self, query, fields=None):
+        """Narrow a Task query to the serialized columns"""
+        names = self.fields if fields is None else [name for name in self.fields if name in fields]
+        columns = [column for name in names for column in self.fields[name][0]]
+        query = query.with_entities(*_unique_columns([*self.key_columns, *columns]))
+        
+        if 'assignee' in names:
+            query = query.outerjoin(self.assignee, Task.assignee_id == self.assignee.id)
+        return query
+    
+    def select_for_projects(self, project_ids):
+        """Query the tasks of several projects in one go"""
+        return self.select(db.session.query(Task)).filter(
+            Task.project_id.in_(project_ids)
+        ).order_by(Task.id)
+    
+    def dump(self, rows, fields=None):
+        names = [name for name in self.fields if fields is None or name in fields]
+        getters = _getters(self.fields, rows, names)
+        return [{name: get(row) for name, get in getters} for row in rows]
+
+
+class ProjectRowSerializer:
+    """
+    Read-only fast path for project lists.
+    
+    Builds the same dicts as ``projects_schema.dump()``. The nested tasks
+    and members are only included when named in ``expand``, and are then
+    fetched for the whole page with one query each.
+    """
+    manager = aliased(User, name='manager')
+    
+    # Output field -> (columns it needs, getter factory), in ProjectSchema
+    # order. The nested collections are filled in by dump().
+    fields = {
+        'id': ((Project.id,), _column('id')),
+        'name': ((Project.name,), _column('name')),
+        'description': ((Project.description,), _column('description')),
+        'due_date': ((Project.due_date,), _column('due_date')),
+        'manager_id': ((Project.manager_id,), _column('manager_id')),
+        'manager': (
+            (manager.id.label('manager_ref_id'), manager.name.label('manager_name'),
+             manager.email.label('manager_email')),
+            _nested('manager_ref_id', id='manager_ref_id', name='manager_name', email='manager_email')
+        ),
+        'tasks': ((), lambda positions: None),
+        'members': ((), lambda positions: None),
+        'created_at': ((Project.created_at,), _column('created_at')),
+        'updated_at': ((Project.updated_at,), _column('updated_at')),
+    }
+    
+    # Keyset pagination reads these from the last row of a page
+    key_columns = (Project.id, Project.created_at)
+    
+    member_columns = (
+        ProjectUser.id, ProjectUser.project_id, ProjectUser.user_id, ProjectUser.role
+    )
+    
+    def select(self, query, fields=None):
+        """Narrow a Project query to the serialized columns"""
+        names = self.fields if fields is None else [name for name in self.fields if name in fields]
+        columns = [column for name in names for column in self.fields[name][0]]
+        query = query.with_entities(*_unique_columns([*self.key_columns, *columns]))
+        
+        if 'manager' in names:
+            query = query.outerjoin(self.manager, Project.manager_id == self.manager.id)
+        return query
+    
+    def dump(self, rows, expand=('tasks', 'members'), fields=None):
+        project_ids = [row.id for row in rows]
+        nested = {
+            'tasks': {project_id: [] for project_id in project_ids},
+            'members': {project_id: [] for project_id in project_ids}
+        }
+        names = [
+            name for name in self.fields
+            if (fields is None or name in fields) and (name not in nested or name in expand)
+        ]
+        getters = _getters(self.fields, rows, names)
+        
+        if project_ids and 'tasks' in names:
+            task_rows = task_row_serializer.select_for_projects(project_ids).all()
+            for task in task_row_serializer.dump(task_rows):
+                nested['tasks'][task['project_id']].append(task)
+        
+        if project_ids and 'members' in names:
+            member_query = db.session.query(*self.member_columns).filter(
+                ProjectUser.project_id.in_(project_ids)
+            ).order_by(ProjectUser.id)
+            for member_id, project_id, user_id, role in member_query:
+                nested['members'][project_id].append({
+                    'id': member_id,
+                    'project_id': project_id,
+                    'user_id': user_id,
+                    'role': role
+                })
+        
+        return [
+            {name: nested[name][row.id] if name in nested else get(row) for name, get in getters}
+            for row in rows
+        ]
+
+
+# Field name -> model attributes to load for the ORM (detail) endpoints
+TASK_LOAD_COLUMNS = {
+    name: [getattr(Task, name)] for name in TaskRowSerializer.fields if name != 'assignee'
+}
+TASK_LOAD_COLUMNS['assignee'] = [Task.assignee_id]
+
+PROJECT_LOAD_COLUMNS = {
+    name: [getattr(Project, name)] for name in ProjectRowSerializer.fields
+    if name not in ('manager', 'tasks', 'members')
+}
+PROJECT_LOAD_COLUMNS['manager'] = [Project.manager_id]
+
+
+def task_load_options(fields=None):
+    """Loader options fetching only what ``TaskSchema(only=fields)`` dumps"""
+    if fields is None:
+        return [joinedload(Task.assignee)]
+    
+    # project_id is always needed for the permission check, updated_at for the ETag
+    columns = [Task.project_id, Task.updated_at] + [
+        column for name in fields if name in TASK_LOAD_COLUMNS for column in TASK_LOAD_COLUMNS[name]
+    ]
+    options = [load_only(*columns)]
+    if 'assignee' in fields:
+        options.append(joinedload(Task.assignee).load_only(User.id, User.name))
+    return options
+
+
+def project_load_options(fields=None):
+    """Loader options fetching only what ``ProjectSchema(only=fields)`` dumps"""
+    if fields is None:
+        fields = ProjectRowSerializer.fields
+        options = []
+    else:
+        columns = [Project.id] + [
+            column for name in fields if name in PROJECT_LOAD_COLUMNS for column in PROJECT_LOAD_COLUMNS[name]
+        ]
+        options = [load_only(*columns)]
+    
+    if 'manager' in fields:
+        options.append(joinedload(Project.manager))
+    if 'tasks' in fields:
+        options.append(selectinload(Project.tasks).joinedload(Task.assignee))
+    if 'members' in fields:
+        options.append(selectinload(Project.members))
+    return options
+
+
+# Initialize row serializers
+task_row_serializer = TaskRowSerializer()
+project_row_serializer = ProjectRowSerializer()
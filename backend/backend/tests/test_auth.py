@@ -0,0 +1,257 @@
+import os
+import runpy
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from flask_jwt_extended import create_refresh_token, decode_token
+from sqlalchemy import update
+from werkzeug.security import generate_password_hash
+
+from extensions import hasher, limiter, revoked_tokens, user_cache
+from models import Project, ProjectUser, Task, TokenBlocklist, User, db
+from utils.cache import MISSING
+from utils.errors import ServiceUnavailableError
+from utils.user_cache import load_user
+
+
+def test_login_rehashes_with_new_parameters_in_the_pool(client):
+    hasher.configure(method='pbkdf2:sha256:1000', workers=1, queue_size=4)
+    user = User(name='Alice', email='alice@example.com',
+                password_hash=generate_password_hash('secret', 'pbkdf2:sha256:2000'))
+    db.session.add(user)
+    db.session.commit()
+
+    response = client.post('/api/auth/login', json={'email': 'alice@example.com', 'password': 'wrong'})
+    assert response.status_code == 401
+
+    response = client.post('/api/auth/login', json={'email': 'alice@example.com', 'password': 'secret'})
+    assert response.status_code == 200
+    db.session.refresh(user)
+    assert user.password_hash.startswith('pbkdf2:sha256:1000$')
+    assert hasher.stats()['rehashed'] == 1
+
+    # Logins are refused rather than queued once the pool is full
+    hasher.configure(method='pbkdf2:sha256:1000', workers=1, queue_size=0)
+    response = client.post('/api/auth/login', json={'email': 'alice@example.com', 'password': 'secret'})
+    assert response.status_code == 503
+    assert hasher.stats()['rejected'] == 1
+
+
+def test_timed_out_hashing_jobs_hold_their_slot_until_done(app):
+    hasher.configure(method='pbkdf2:sha256:1000', workers=1, queue_size=1)
+    # Start the worker so that the job below runs rather than waits
+    hasher.hash('warm up')
+    hasher.timeout = 0.1
+
+    with pytest.raises(ServiceUnavailableError):
+        hasher._run(time.sleep, 1)
+    stats = hasher.stats()
+    assert (stats['timed_out'], stats['pending'], stats['orphaned']) == (1, 1, 1)
+
+    # The orphaned job still occupies the pool, so more work is refused
+    with pytest.raises(ServiceUnavailableError):
+        hasher.hash('secret')
+    assert hasher.stats()['rejected'] == 1
+
+    deadline = time.monotonic() + 5
+    while hasher.stats()['pending'] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert (hasher.stats()['pending'], hasher.stats()['orphaned']) == (0, 0)
+    assert hasher.check(hasher.hash('secret'), 'secret')
+    hasher.shutdown()
+
+
+def test_rate_limits_shed_requests_before_hashing(app, client, auth_headers):
+    app.config.update(RATELIMIT_LOGIN='2/minute', RATELIMIT_WRITES='1/minute')
+    limiter.configure(enabled=True)
+    alice = User(name='Alice', email='alice@example.com', password_hash=generate_password_hash('secret'))
+    db.session.add(alice)
+    db.session.commit()
+
+    attempts = [
+        client.post('/api/auth/login', json={'email': email, 'password': 'guess'})
+        for email in ('alice@example.com', 'Alice@example.com', 'alice@example.com', 'bob@example.com')
+    ]
+    assert [response.status_code for response in attempts] == [401, 401, 429, 401]
+    assert int(attempts[2].headers['Retry-After']) == 30
+    # The rejected attempt never reached the database or the hasher
+    assert hasher.stats()['checked'] == 1
+
+    # Writes are counted per user, reads are not limited
+    headers = auth_headers(alice)
+    responses = [
+        client.post('/api/projects', headers=headers, json={'name': 'First'}),
+        client.post('/api/projects', headers=headers, json={'name': 'Second'}),
+        client.get('/api/projects', headers=headers),
+    ]
+    assert [response.status_code for response in responses] == [201, 429, 200]
+
+
+def test_logout_revokes_only_the_token_used(client, auth_headers):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    db.session.add(alice)
+    db.session.commit()
+    revoked, other = auth_headers(alice), auth_headers(alice)
+    revoked_refresh, other_refresh = create_refresh_token(identity=alice), create_refresh_token(identity=alice)
+
+    assert client.post('/api/auth/logout', headers=revoked).status_code == 200
+    assert client.get('/api/auth/me', headers=revoked).status_code == 401
+    assert client.get('/api/auth/me', headers=other).status_code == 200
+
+    # Refresh tokens are revoked by logging out with them
+    refresh_headers = {'Authorization': f'Bearer {revoked_refresh}'}
+    assert client.post('/api/auth/logout', headers=refresh_headers).status_code == 200
+    assert client.post('/api/auth/refresh', headers=refresh_headers).status_code == 401
+    response = client.post('/api/auth/refresh', headers={'Authorization': f'Bearer {other_refresh}'})
+    assert response.status_code == 200
+    assert client.get('/api/auth/me', headers={
+        'Authorization': f"Bearer {response.json['access_token']}"
+    }).status_code == 200
+
+    assert {row.token_type for row in TokenBlocklist.query} == {'access', 'refresh'}
+
+
+def test_revocations_by_other_workers_apply_after_the_sync_interval(client, auth_headers):
+    revoked_tokens.configure(sync_interval=0.2)
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    db.session.add(alice)
+    db.session.commit()
+    headers = auth_headers(alice)
+    assert client.get('/api/auth/me', headers=headers).status_code == 200
+
+    # Another worker revokes the token: only the table knows about it
+    token = decode_token(headers['Authorization'].split()[1])
+    db.session.add(TokenBlocklist(jti=token['jti'], token_type='access', user_id=alice.id,
+                                  expires_at=datetime.utcfromtimestamp(token['exp'])))
+    db.session.commit()
+    assert client.get('/api/auth/me', headers=headers).status_code == 200
+
+    time.sleep(0.25)
+    assert client.get('/api/auth/me', headers=headers).status_code == 401
+    assert len(revoked_tokens) == 1
+
+
+def test_pruning_deletes_only_expired_revocations(app, client, auth_headers):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    db.session.add(alice)
+    db.session.flush()
+    now = datetime.utcnow()
+    db.session.add_all([
+        TokenBlocklist(jti='expired', user_id=alice.id, expires_at=now - timedelta(minutes=1)),
+        TokenBlocklist(jti='live', user_id=alice.id, expires_at=now + timedelta(hours=1)),
+    ])
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['prune-tokens'])
+    assert result.output == 'Pruned 1 expired token(s)\n'
+    assert [row.jti for row in TokenBlocklist.query] == ['live']
+
+    # Logging out prunes too, at most once per JWT_BLOCKLIST_PRUNE_INTERVAL
+    db.session.add(TokenBlocklist(jti='expired', user_id=alice.id, expires_at=now - timedelta(minutes=1)))
+    db.session.commit()
+    headers = auth_headers(alice)
+    client.post('/api/auth/logout', headers=headers)
+    jti = decode_token(headers['Authorization'].split()[1])['jti']
+    assert sorted(row.jti for row in TokenBlocklist.query) == sorted(['live', jti])
+
+
+def test_cached_users_follow_password_role_and_deletion(client, auth_headers):
+    alice = User(name='Alice', email='alice@example.com', password_hash=generate_password_hash('old', 'pbkdf2:sha256:1000'))
+    db.session.add(alice)
+    db.session.commit()
+    user_id, headers = alice.id, auth_headers(alice)
+
+    def me():
+        # Start each request with an empty session, as a server would
+        db.session.remove()
+        return client.get('/api/auth/me', headers=headers)
+
+    assert me().status_code == 200
+    assert me().json['role'] == 'user'
+    assert user_cache.stats()['hits'] == 1
+
+    # The password is changed on the cached, merged instance
+    db.session.remove()
+    response = client.post('/api/auth/change-password', headers=headers, json={
+        'current_password': 'old', 'new_password': 'new'
+    })
+    assert response.status_code == 200
+    assert user_cache.get(user_id) is MISSING
+    assert me().status_code == 200
+    assert hasher.check(user_cache.get(user_id)['password_hash'], 'new')
+
+    db.session.get(User, user_id).role = 'admin'
+    db.session.commit()
+    assert user_cache.get(user_id) is MISSING
+    assert me().json['role'] == 'admin'
+
+    db.session.delete(db.session.get(User, user_id))
+    db.session.commit()
+    assert me().status_code == 401
+
+
+def test_cached_users_can_load_relationships(app):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    db.session.add(alice)
+    db.session.flush()
+    project = Project(name='Launch', manager_id=alice.id)
+    db.session.add(project)
+    db.session.flush()
+    db.session.add_all([
+        ProjectUser(project_id=project.id, user_id=alice.id, role='admin'),
+        Task(title='First', project_id=project.id, assignee_id=alice.id),
+    ])
+    db.session.commit()
+    user_id = alice.id
+
+    load_user(user_id)
+    db.session.remove()
+    user = load_user(user_id)
+
+    assert user_cache.stats()['hits'] == 1
+    assert user in db.session
+    assert [project.name for project in user.managed_projects] == ['Launch']
+    assert [task.title for task in user.assigned_tasks] == ['First']
+    assert [membership.role for membership in user.project_memberships] == ['admin']
+
+
+def test_user_cache_can_be_disabled(client, auth_headers):
+    user_cache.configure(enabled=False)
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    db.session.add(alice)
+    db.session.commit()
+    user_id, headers = alice.id, auth_headers(alice)
+
+    for role in ('user', 'admin'):
+        # Bypass the cache invalidation: every request must read the row
+        db.session.execute(update(User).where(User.id == user_id).values(role=role))
+        db.session.commit()
+        db.session.remove()
+        assert client.get('/api/auth/me', headers=headers).json['role'] == role
+
+    stats = user_cache.stats()
+    assert (stats['size'], stats['hits'], stats['misses']) == (0, 0, 0)
+
+
+def test_only_admins_read_the_metrics(client, auth_headers):
+    user = User(name='Alice', email='alice@example.com', password_hash='x')
+    admin = User(name='Root', email='root@example.com', password_hash='x', role='admin')
+    db.session.add_all([user, admin])
+    db.session.commit()
+
+    # The public health check tells nothing but liveness
+    assert client.get('/api/health').json == {'status': 'ok'}
+
+    assert client.get('/api/health/metrics').status_code == 401
+    assert client.get('/api/health/metrics', headers=auth_headers(user)).status_code == 403
+    response = client.get('/api/health/metrics', headers=auth_headers(admin))
+    assert response.status_code == 200
+    assert {'database_pool', 'caches', 'passwords', 'rate_limits', 'notifications', 'events'} <= response.json.keys()
+
+
+def test_hashing_workers_do_not_build_an_app(app):
+    # Spawned workers import the server's script as __mp_main__
+    namespace = runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'app.py'),
+                               run_name='__mp_main__')
+    assert 'create_app' in namespace and 'app' not in namespace
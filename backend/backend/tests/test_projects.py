@@ -0,0 +1,403 @@
+from datetime import datetime
+
+import pytest
+from flask import g
+from flask_jwt_extended import verify_jwt_in_request
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from extensions import events, membership_cache
+from models import Project, ProjectUser, Task, User, db
+from serializers import TaskSchema, projects_schema, project_row_serializer
+from utils.cache import MISSING
+from utils.permissions import get_project_role, get_project_roles, invalidate_membership
+from utils.pool import PoolMetrics
+from utils.sqlite import pragma_statements
+
+
+@pytest.mark.parametrize('build_query', [
+    # GET /api/projects
+    lambda: Project.query.join(ProjectUser).filter(ProjectUser.user_id == 1)
+        .order_by(Project.created_at.desc(), Project.id.desc()).limit(21),
+    # Membership and admin checks used by the project and task routes
+    lambda: ProjectUser.query.filter_by(project_id=1, user_id=2),
+    lambda: ProjectUser.query.filter_by(project_id=1, user_id=2, role='admin'),
+    lambda: ProjectUser.query.filter_by(project_id=1, role='admin'),
+    lambda: ProjectUser.query.filter_by(project_id=1),
+], ids=['list', 'membership', 'admin-check', 'admin-count', 'members'])
+def test_project_queries_use_indexes(full_table_scans, build_query):
+    assert full_table_scans(build_query()) == []
+
+
+def test_project_row_serializer_matches_project_schema(app):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    bob = User(name='Bob', email='bob@example.com', password_hash='x')
+    db.session.add_all([alice, bob])
+    db.session.flush()
+    launch = Project(name='Launch', description='Q3 launch', due_date=datetime(2024, 9, 30),
+                     manager_id=alice.id)
+    empty = Project(name='Empty', manager_id=bob.id)
+    db.session.add_all([launch, empty])
+    db.session.flush()
+    db.session.add_all([
+        ProjectUser(project_id=launch.id, user_id=alice.id, role='admin'),
+        ProjectUser(project_id=launch.id, user_id=bob.id, role='member'),
+        Task(title='Assigned', project_id=launch.id, assignee_id=bob.id),
+        Task(title='Unassigned', description='Later', project_id=launch.id),
+    ])
+    db.session.commit()
+
+    query = Project.query.order_by(Project.id)
+    expected = projects_schema.dump(query.all())
+    actual = project_row_serializer.dump(project_row_serializer.select(query).all())
+
+    assert app.json.dumps(actual) == app.json.dumps(expected)
+
+
+def test_project_list_expands_nested_collections_in_constant_queries(client, auth_headers, count_queries):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    db.session.add(alice)
+    db.session.commit()
+    alice_id, headers = alice.id, auth_headers(alice)
+
+    def add_projects(count):
+        for i in range(count):
+            user = User(name=f'User {i}', email=f'user{Project.query.count()}-{i}@example.com', password_hash='x')
+            project = Project(name='Project', manager_id=alice_id)
+            db.session.add_all([user, project])
+            db.session.flush()
+            db.session.add_all([
+                ProjectUser(project_id=project.id, user_id=alice_id, role='admin'),
+                ProjectUser(project_id=project.id, user_id=user.id, role='member'),
+                *(Task(title=f'Task {j}', project_id=project.id, assignee_id=user.id) for j in range(3)),
+            ])
+        db.session.commit()
+
+    def list_projects(query_string):
+        db.session.remove()
+        with count_queries() as statements:
+            response = client.get('/api/projects', headers=headers, query_string=query_string)
+        return response.json['projects'], len(statements)
+
+    add_projects(2)
+    list_projects({})  # warm the per-process caches
+
+    projects, default_queries = list_projects({})
+    assert len(projects) == 2
+    assert all('tasks' not in project and 'members' not in project for project in projects)
+    expanded, expanded_queries = list_projects({'expand': 'tasks,members'})
+    assert [(len(project['tasks']), len(project['members'])) for project in expanded] == [(3, 2)] * 2
+    assert set(expanded[0]['tasks'][0]) == set(TaskSchema().fields)
+    assert list_projects({'expand': 'members'})[0][0].keys() == {*projects[0], 'members'}
+
+    # Tasks and members are loaded for the whole page at once
+    assert expanded_queries == default_queries + 2
+    add_projects(8)
+    projects, queries = list_projects({})
+    assert (len(projects), queries) == (10, default_queries)
+    expanded, queries = list_projects({'expand': 'tasks,members'})
+    assert [(len(project['tasks']), len(project['members'])) for project in expanded] == [(3, 2)] * 10
+    assert queries == expanded_queries
+
+def test_project_roles_are_loaded_once_per_request(app, client, auth_headers, count_queries):
+    membership_cache.configure(enabled=False)
+    alice, bob = users = [
+        User(name=name, email=f'{name.lower()}@example.com', password_hash='x') for name in ('Alice', 'Bob')
+    ]
+    db.session.add_all(users)
+    db.session.flush()
+    projects = [Project(name=f'Project {i}', manager_id=alice.id) for i in range(5)]
+    db.session.add_all(projects)
+    db.session.flush()
+    db.session.add_all([ProjectUser(project_id=project.id, user_id=alice.id, role='admin') for project in projects])
+    db.session.commit()
+    headers = auth_headers(alice)
+
+    def membership_queries(statements):
+        return [statement for statement in statements if 'FROM project_users' in statement]
+
+    # The test client shares the test's app context, and so its g
+    g.pop('_project_roles', None)
+    with count_queries() as statements:
+        response = client.post('/api/tasks/bulk', headers=headers, json={'tasks': [
+            {'title': f'Task {i}', 'project_id': project.id} for i, project in enumerate(projects * 2)
+        ]})
+    assert response.status_code == 201
+    assert len(membership_queries(statements)) == 1
+
+    # Membership changes within a request rebuild the map
+    with app.test_request_context(headers=headers):
+        verify_jwt_in_request()
+        g.pop('_project_roles', None)
+        with count_queries() as statements:
+            assert get_project_roles() == {project.id: 'admin' for project in projects}
+            assert get_project_role(projects[0].id) == 'admin'
+
+            other = Project(name='Other', manager_id=bob.id)
+            db.session.add(other)
+            db.session.flush()
+            db.session.add(ProjectUser(project_id=other.id, user_id=alice.id, role='member'))
+            db.session.query(ProjectUser).filter_by(project_id=projects[0].id).update({'role': 'member'})
+            db.session.commit()
+            invalidate_membership(other.id, alice.id)
+            invalidate_membership(projects[0].id, alice.id)
+
+            assert get_project_role(other.id) == 'member'
+            assert get_project_role(projects[0].id) == 'member'
+            assert len(get_project_roles()) == 6
+        assert len(membership_queries(statements)) == 2
+
+def test_project_stats(client, auth_headers):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    bob = User(name='Bob', email='bob@example.com', password_hash='x')
+    db.session.add_all([alice, bob])
+    db.session.flush()
+    launch = Project(name='Launch', manager_id=alice.id)
+    empty = Project(name='Empty', manager_id=alice.id)
+    theirs = Project(name='Theirs', manager_id=bob.id)
+    db.session.add_all([launch, empty, theirs])
+    db.session.flush()
+    db.session.add_all([
+        ProjectUser(project_id=launch.id, user_id=alice.id, role='admin'),
+        ProjectUser(project_id=empty.id, user_id=alice.id, role='admin'),
+        ProjectUser(project_id=theirs.id, user_id=bob.id, role='admin'),
+        Task(title='Late', project_id=launch.id, priority='high', due_date=datetime(2020, 1, 1)),
+        Task(title='Late but done', project_id=launch.id, status='done', due_date=datetime(2020, 1, 1)),
+        Task(title='Later', project_id=launch.id, due_date=datetime(2999, 1, 1)),
+        Task(title='Hidden', project_id=theirs.id),
+    ])
+    db.session.commit()
+
+    response = client.get(f'/api/projects/{launch.id}/stats', headers=auth_headers(alice))
+    assert response.json == {
+        'project_id': launch.id,
+        'total': 3,
+        'overdue': 1,
+        'by_status': {'todo': 2, 'done': 1},
+        'by_priority': {'high': 1, 'medium': 2}
+    }
+
+    response = client.get('/api/projects/stats', headers=auth_headers(alice))
+    assert [(project['project_id'], project['total']) for project in response.json['projects']] == [
+        (launch.id, 3), (empty.id, 0)
+    ]
+
+    response = client.get('/api/projects/stats', headers=auth_headers(alice), query_string={'ids': theirs.id})
+    assert response.status_code == 403
+    assert client.get(f'/api/projects/{theirs.id}/stats', headers=auth_headers(alice)).status_code == 403
+
+
+@pytest.mark.parametrize('cache_enabled', [True, False], ids=['cached', 'uncached'])
+def test_membership_changes_apply_immediately(client, auth_headers, cache_enabled):
+    membership_cache.configure(enabled=cache_enabled)
+    alice, bob, carol = users = [
+        User(name=name, email=f'{name.lower()}@example.com', password_hash='x')
+        for name in ('Alice', 'Bob', 'Carol')
+    ]
+    db.session.add_all(users)
+    db.session.flush()
+    project = Project(name='Launch', manager_id=alice.id)
+    db.session.add(project)
+    db.session.flush()
+    db.session.add_all([
+        ProjectUser(project_id=project.id, user_id=alice.id, role='admin'),
+        ProjectUser(project_id=project.id, user_id=bob.id, role='member'),
+    ])
+    db.session.commit()
+    url = f'/api/projects/{project.id}'
+
+    def can_read(user):
+        return client.get(url, headers=auth_headers(user)).status_code == 200
+
+    def can_update(user):
+        return client.put(url, headers=auth_headers(user), json={'name': 'Launch'}).status_code == 200
+
+    def set_role(user, role):
+        response = client.post(f'{url}/members/bulk', headers=auth_headers(alice), json={
+            'update': [{'user_id': user.id, 'role': role}]
+        })
+        assert response.status_code == 200
+
+    # Cached roles, including "not a member", follow every change
+    assert (can_read(bob), can_update(bob), can_read(carol)) == (True, False, False)
+    set_role(bob, 'admin')
+    assert can_update(bob)
+    set_role(bob, 'member')
+    assert not can_update(bob)
+
+    client.post(f'{url}/members', headers=auth_headers(alice), json={'user_id': carol.id, 'role': 'member'})
+    assert can_read(carol)
+    client.delete(f'{url}/members/{bob.id}', headers=auth_headers(alice))
+    assert not can_read(bob)
+
+    if cache_enabled:
+        assert membership_cache.stats()['hits'] > 0
+    else:
+        assert membership_cache.get((alice.id, project.id)) is MISSING
+        stats = membership_cache.stats()
+        assert (stats['size'], stats['hits'], stats['misses']) == (0, 0, 0)
+
+
+def test_deleting_a_project_forgets_its_cached_roles(client, auth_headers):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    db.session.add(alice)
+    db.session.flush()
+    projects = [Project(name=name, manager_id=alice.id) for name in ('Launch', 'Other')]
+    db.session.add_all(projects)
+    db.session.flush()
+    db.session.add_all([ProjectUser(project_id=project.id, user_id=alice.id, role='admin') for project in projects])
+    db.session.commit()
+    launch, other = projects
+
+    client.get(f'/api/projects/{launch.id}', headers=auth_headers(alice))
+    client.get(f'/api/projects/{other.id}', headers=auth_headers(alice))
+    assert membership_cache.get((alice.id, launch.id)) == 'admin'
+
+    assert client.delete(f'/api/projects/{launch.id}', headers=auth_headers(alice)).status_code == 200
+    assert membership_cache.get((alice.id, launch.id)) is MISSING
+    assert membership_cache.get((alice.id, other.id)) == 'admin'
+    assert client.get(f'/api/projects/{launch.id}', headers=auth_headers(alice)).status_code == 403
+
+def test_bulk_member_changes(client, auth_headers):
+    alice, bob, carol, dave = users = [
+        User(name=name, email=f'{name.lower()}@example.com', password_hash='x')
+        for name in ('Alice', 'Bob', 'Carol', 'Dave')
+    ]
+    db.session.add_all(users)
+    db.session.flush()
+    project = Project(name='Launch', manager_id=alice.id)
+    db.session.add(project)
+    db.session.flush()
+    db.session.add_all([
+        ProjectUser(project_id=project.id, user_id=alice.id, role='admin'),
+        ProjectUser(project_id=project.id, user_id=bob.id, role='member'),
+    ])
+    db.session.commit()
+    url = f'/api/projects/{project.id}/members/bulk'
+
+    response = client.post(url, headers=auth_headers(alice), json={
+        'add': [{'user_id': carol.id, 'role': 'member'}, {'user_id': 999, 'role': 'member'}],
+        'update': [{'user_id': bob.id, 'role': 'admin'}],
+        'remove': [dave.id, carol.id],
+    })
+
+    assert response.status_code == 207
+    assert response.json['results'] == {
+        'add': [{'index': 0, 'user_id': carol.id}, {'index': 1, 'error': 'User not found'}],
+        'update': [{'index': 0, 'user_id': bob.id}],
+        'remove': [{'index': 0, 'error': 'User is not a member of this project'},
+                   {'index': 1, 'error': 'User appears more than once in this request'}],
+    }
+    roles = dict(db.session.query(ProjectUser.user_id, ProjectUser.role).filter_by(project_id=project.id))
+    assert roles == {alice.id: 'admin', bob.id: 'admin', carol.id: 'member'}
+
+    # The constraint reports existing members; removing every admin is refused
+    response = client.post(url, headers=auth_headers(alice), json={'add': [{'user_id': carol.id, 'role': 'admin'}]})
+    assert response.json['results']['add'] == [{'index': 0, 'error': 'User is already a member of this project'}]
+    response = client.post(url, headers=auth_headers(alice), json={'remove': [alice.id, bob.id]})
+    assert response.status_code == 403
+    assert ProjectUser.query.filter_by(project_id=project.id).count() == 3
+
+
+def test_project_event_stream(client, auth_headers):
+    events.configure(heartbeat=0.01)
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    bob = User(name='Bob', email='bob@example.com', password_hash='x')
+    db.session.add_all([alice, bob])
+    db.session.flush()
+    project = Project(name='Launch', manager_id=alice.id)
+    db.session.add(project)
+    db.session.flush()
+    db.session.add_all([
+        ProjectUser(project_id=project.id, user_id=alice.id, role='admin'),
+        ProjectUser(project_id=project.id, user_id=bob.id, role='member'),
+    ])
+    db.session.commit()
+    url = f'/api/projects/{project.id}/events'
+
+    def read(response):
+        return next(response.response).decode()
+
+    alice_stream = client.get(url, headers=auth_headers(alice), buffered=False)
+    bob_stream = client.get(url, headers=auth_headers(bob), buffered=False)
+    assert alice_stream.mimetype == 'text/event-stream'
+    assert read(alice_stream) == read(bob_stream) == 'retry: 3000\n\n'
+
+    task_id = client.post('/api/tasks', headers=auth_headers(alice), json={
+        'title': 'Write docs', 'project_id': project.id
+    }).json['task']['id']
+    created = read(alice_stream)
+    assert created.startswith('id: ') and 'event: task.created\n' in created and '"title":"Write docs"' in created
+    assert read(bob_stream) == created
+    assert read(alice_stream) == ': heartbeat\n\n'
+
+    # Removing Bob ends his stream after telling him
+    client.delete(f'/api/projects/{project.id}/members/{bob.id}', headers=auth_headers(alice))
+    assert 'event: member.removed\n' in read(bob_stream)
+    assert list(bob_stream.response) == []
+
+    # Resuming after the first event replays the rest; unknown ids get a reset
+    client.patch(f'/api/tasks/{task_id}/status', headers=auth_headers(alice), json={'status': 'done'})
+    last_event_id = created.split('\n')[0][len('id: '):]
+    resumed = client.get(url, headers={**auth_headers(alice), 'Last-Event-ID': last_event_id}, buffered=False)
+    assert read(resumed) == 'retry: 3000\n\n'
+    assert 'event: member.removed\n' in read(resumed)
+    assert 'event: task.updated\n' in read(resumed)
+    stale = client.get(url, headers={**auth_headers(alice), 'Last-Event-ID': 'old-1'}, buffered=False)
+    read(stale)
+    assert 'event: reset\n' in read(stale)
+
+    # EventSource cannot send headers, so the token may be in the query string
+    token = auth_headers(alice)['Authorization'].split()[1]
+    browser = client.get(url, query_string={'jwt': token}, buffered=False)
+    assert read(browser) == 'retry: 3000\n\n'
+    assert client.get(url, query_string={'jwt': 'garbage'}).status_code == 422
+    assert client.get(f'/api/projects/{project.id}', query_string={'jwt': token}).status_code == 401
+
+    for response in (alice_stream, resumed, stale, browser):
+        response.close()
+    assert events.stats()['subscribers'] == 0
+
+
+def test_sqlite_connections_enforce_foreign_keys(app):
+    assert db.session.execute(text('PRAGMA foreign_keys')).scalar() == 1
+    assert db.session.execute(text('PRAGMA busy_timeout')).scalar() == app.config['SQLITE_PRAGMAS']['busy_timeout']
+
+    # Tasks of a project that does not exist are refused
+    db.session.add(Task(title='Orphan', project_id=404))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+    # Config cannot inject statements into the pragmas
+    with pytest.raises(ValueError):
+        pragma_statements({'journal_mode': 'WAL; DROP TABLE tasks'})
+    with pytest.raises(ValueError):
+        pragma_statements({'writable_schema': 'ON'})
+
+
+def test_pool_metrics_track_checkouts_and_waits(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "pool.db"}', pool_size=1, max_overflow=0, pool_timeout=0.05)
+    metrics = PoolMetrics()
+    metrics.watch(engine)
+
+    with engine.connect():
+        assert metrics.stats()['in_use'] == 1
+        # The only connection is taken, so the next checkout waits and times out
+        with pytest.raises(PoolTimeoutError):
+            engine.connect()
+    with engine.connect():
+        pass
+
+    stats = metrics.stats()
+    assert stats['pool'] == 'QueuePool'
+    assert (stats['checkouts'], stats['connects'], stats['timeouts']) == (2, 1, 1)
+    assert (stats['in_use'], stats['peak_in_use'], stats['idle']) == (0, 1, 1)
+
+    # Checkouts are still timed once dispose() has replaced the pool
+    engine.dispose()
+    with engine.connect():
+        pass
+    assert metrics.stats()['checkouts'] == 3
+    assert sum(metrics.stats()['wait']['histogram'].values()) == 3
@@ -0,0 +1,853 @@
+import base64
+import gzip
+import json
+import zlib
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from sqlalchemy import and_, event, func, or_, tuple_
+from sqlalchemy.dialects import postgresql
+
+from extensions import events, mail, notifier
+from models import Task, TaskCounter, TaskTombstone, Project, ProjectUser, User, db
+from serializers import TaskSchema, tasks_schema, task_row_serializer
+from utils import compression
+from utils.compression import init_compression
+from utils.json_provider import OrjsonProvider, StdJSONProvider
+from utils.permissions import get_member_roles
+
+
+def member_tasks(user_id=1):
+    """Base query shared by the task routes."""
+    return Task.query.join(Project).join(ProjectUser).filter(ProjectUser.user_id == user_id)
+
+
+def newest_first(query, limit=21):
+    return query.order_by(Task.created_at.desc(), Task.id.desc()).limit(limit)
+
+
+@pytest.mark.parametrize('build_query', [
+    # GET /api/tasks with every filter combination and a cursor
+    lambda: newest_first(member_tasks()),
+    lambda: newest_first(member_tasks().filter(Task.project_id == 1)),
+    lambda: newest_first(member_tasks().filter(Task.project_id == 1, Task.status == 'todo')),
+    lambda: newest_first(member_tasks().filter(Task.status == 'todo')),
+    lambda: newest_first(member_tasks().filter(Task.assignee_id == 2)),
+    lambda: newest_first(member_tasks().filter(Task.assignee_id == 2, Task.status == 'todo')),
+    lambda: newest_first(member_tasks().filter(
+        tuple_(Task.created_at, Task.id) < tuple_(datetime(2024, 1, 1), 10)
+    )),
+    # GET/PUT/DELETE /api/tasks/<id>, /status and /assign
+    lambda: member_tasks().filter(Task.id == 1),
+    lambda: member_tasks().filter(Task.id == 1, ProjectUser.role.in_(['admin', 'manager'])),
+    # GET /api/tasks/changes
+    lambda: member_tasks().filter(Task.updated_at >= datetime(2024, 1, 1)).order_by(
+        Task.updated_at, Task.id
+    ).limit(21),
+    lambda: db.session.query(TaskTombstone).join(
+        ProjectUser, ProjectUser.project_id == TaskTombstone.project_id
+    ).filter(ProjectUser.user_id == 1, TaskTombstone.created_at >= datetime(2024, 1, 1)),
+    # GET /api/projects/stats
+    lambda: db.session.query(Task.project_id, Task.status, Task.priority, func.count()).filter(
+        Task.project_id.in_([1, 2])
+    ).group_by(Task.project_id, Task.status, Task.priority),
+    # GET /api/tasks/counts
+    lambda: TaskCounter.query.filter(or_(
+        and_(TaskCounter.scope == 'project', TaskCounter.scope_id.in_([1, 2])),
+        and_(TaskCounter.scope == 'user', TaskCounter.scope_id == 1)
+    )),
+    lambda: db.session.query(Task.project_id, func.count()).filter(
+        Task.project_id.in_([1, 2]), Task.due_date < datetime(2024, 1, 1), Task.status != 'done'
+    ).group_by(Task.project_id),
+    lambda: db.session.query(Task.assignee_id, func.count()).filter(
+        Task.assignee_id == 1, Task.due_date < datetime(2024, 1, 1), Task.status != 'done'
+    ).group_by(Task.assignee_id),
+    # Due date lookups
+    lambda: Task.query.filter(Task.due_date < datetime(2024, 1, 1)),
+], ids=[
+    'list', 'list-project', 'list-project-status', 'list-status', 'list-assignee',
+    'list-assignee-status', 'list-cursor', 'detail', 'delete', 'changes', 'tombstones', 'stats',
+    'counters', 'overdue-projects', 'overdue-assignee', 'due-date',
+])
+def test_task_queries_use_indexes(full_table_scans, build_query):
+    assert full_table_scans(build_query()) == []
+
+
+def test_full_table_scan_is_detected(full_table_scans):
+    assert full_table_scans(Task.query.filter(Task.title == 'x')) == ['SCAN tasks']
+
+
+def test_task_row_serializer_matches_task_schema(app):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    bob = User(name='Bøb "the builder"', email='bob@example.com', password_hash='x')
+    db.session.add_all([alice, bob])
+    db.session.flush()
+    project = Project(name='Launch', manager_id=alice.id)
+    db.session.add(project)
+    db.session.flush()
+    db.session.add_all([
+        Task(title='Plain', project_id=project.id),
+        Task(title='Assigned', description='Needs <review> & sign-off\n', status='done',
+             priority='high', due_date=datetime(2024, 5, 1, 9, 30), project_id=project.id,
+             assignee_id=bob.id, created_at=datetime(2024, 1, 1), updated_at=datetime(2024, 1, 2, 3, 4, 5, 6)),
+        Task(title='Mine', description='', project_id=project.id, assignee_id=alice.id),
+    ])
+    db.session.commit()
+
+    query = Task.query.order_by(Task.id)
+    expected = tasks_schema.dump(query.all())
+    actual = task_row_serializer.dump(task_row_serializer.select(query).all())
+
+    assert app.json.dumps(actual) == app.json.dumps(expected)
+
+    fields = {'id', 'title', 'status', 'assignee'}
+    expected = TaskSchema(many=True, only=fields).dump(query.all())
+    actual = task_row_serializer.dump(task_row_serializer.select(query, fields).all(), fields)
+
+    assert app.json.dumps(actual) == app.json.dumps(expected)
+
+@pytest.mark.parametrize('url', ['/api/tasks', '/api/tasks/{id}'])
+def test_fields_narrow_the_select(client, auth_headers, count_queries, url):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    db.session.add(alice)
+    db.session.flush()
+    project = Project(name='Mine', manager_id=alice.id)
+    db.session.add(project)
+    db.session.flush()
+    db.session.add(ProjectUser(project_id=project.id, user_id=alice.id, role='admin'))
+    task = Task(title='Write docs', description='A long description', project_id=project.id)
+    db.session.add(task)
+    db.session.commit()
+    url, task_id, headers = url.format(id=task.id), task.id, auth_headers(alice)
+
+    def get(**args):
+        # Load the task from the database rather than the session
+        db.session.expunge_all()
+        with count_queries() as statements:
+            response = client.get(url, headers=headers, query_string=args)
+        assert response.status_code == 200
+        body = response.json['tasks'][0] if 'tasks' in response.json else response.json
+        return body, ' '.join(statements)
+
+    body, sql = get()
+    assert body['description'] == 'A long description'
+    assert 'tasks.description' in sql
+
+    body, sql = get(fields='id,title')
+    assert body == {'id': task_id, 'title': 'Write docs'}
+    assert 'tasks.description' not in sql
+
+
+@pytest.mark.parametrize('url', ['/api/tasks', '/api/tasks/{task}', '/api/projects', '/api/projects/{project}'])
+def test_unknown_fields_are_refused(client, auth_headers, url):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    db.session.add(alice)
+    db.session.flush()
+    project = Project(name='Mine', manager_id=alice.id)
+    db.session.add(project)
+    db.session.flush()
+    db.session.add(ProjectUser(project_id=project.id, user_id=alice.id, role='admin'))
+    task = Task(title='Write docs', project_id=project.id)
+    db.session.add(task)
+    db.session.commit()
+
+    response = client.get(url.format(task=task.id, project=project.id), headers=auth_headers(alice),
+                          query_string={'fields': 'id,bogus'})
+    assert response.status_code == 400
+    assert response.json['error'] == 'Invalid fields value(s): bogus'
+
+
+@pytest.mark.parametrize('payload', [
+    {'tasks': [{'id': 1, 'title': 'Ship <it> & "go"\n', 'assignee': None, 'done': False,
+                'created_at': datetime(2024, 1, 2, 3, 4, 5, 6), 'due_date': date(2024, 5, 1)}],
+     'pagination': {'limit': 20, 'next_cursor': None, 'has_more': False}},
+    {'name': 'Zoë’s project ✓'},
+    {'stats': {1: 3, 2: 4}},
+    {'big': 2 ** 70, 'ratio': 0.1, 'amount': Decimal('1.50')},
+], ids=['tasks', 'non-ascii', 'int-keys', 'numbers'])
+def test_orjson_provider_matches_stdlib(app, payload):
+    pytest.importorskip('orjson')
+    fast, std = OrjsonProvider(app), StdJSONProvider(app)
+
+    assert fast.dumps(payload) == std.dumps(payload)
+    assert fast.response(payload).get_data() == std.response(payload).get_data()
+    assert fast.loads(std.dumps(payload)) == std.loads(std.dumps(payload))
+
+
+@dataclass
+class Reading:
+    value: float
+
+
+@pytest.mark.parametrize('payload', [
+    {'small': 1e-05, 'large': 1e16, 'plain': 0.1, 'zero': 0.0, 'negative': -2.5e-7},
+    {'stats': [{'rate': float('nan')}, {'rate': float('inf')}, {'rate': -float('inf')}]},
+    {'readings': [Reading(1e-9), Reading(0.5)]},
+], ids=['exponents', 'non-finite', 'dataclass'])
+def test_orjson_provider_writes_floats_like_stdlib(app, payload):
+    pytest.importorskip('orjson')
+    fast = OrjsonProvider(app)
+
+    expected = json.dumps(payload, default=fast.default, sort_keys=True, separators=(',', ':')) + '\n'
+    assert fast.response(payload).get_data(as_text=True) == expected
+    assert fast.dumps(fast.loads(expected), separators=(',', ':')) + '\n' == expected
+
+
+def test_orjson_provider_sorts_keys_like_stdlib(app):
+    pytest.importorskip('orjson')
+    fast, std = OrjsonProvider(app), StdJSONProvider(app)
+
+    # Keys are sorted by code point, also where orjson encodes non-ASCII text
+    fast.ensure_ascii = std.ensure_ascii = False
+    keys = {'b': 1, 'a': 2, 'é': 3, 'Z': 4, '😀': 5}
+    assert fast.response(keys).get_data() == std.response(keys).get_data()
+
+
+def test_bulk_create_reports_each_item(client, auth_headers):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    bob = User(name='Bob', email='bob@example.com', password_hash='x')
+    db.session.add_all([alice, bob])
+    db.session.flush()
+    mine = Project(name='Mine', manager_id=alice.id)
+    theirs = Project(name='Theirs', manager_id=bob.id)
+    db.session.add_all([mine, theirs])
+    db.session.flush()
+    db.session.add(ProjectUser(project_id=mine.id, user_id=alice.id, role='admin'))
+    db.session.commit()
+
+    response = client.post('/api/tasks/bulk', headers=auth_headers(alice), json={'tasks': [
+        {'title': 'First', 'project_id': mine.id, 'assignee_id': alice.id, 'due_date': '2024-05-01'},
+        {'title': 'Elsewhere', 'project_id': theirs.id},
+        {'title': 'Outsider', 'project_id': mine.id, 'assignee_id': bob.id},
+        {'title': 'Bad date', 'project_id': mine.id, 'due_date': 'soon'},
+        {'title': 'Second', 'project_id': mine.id},
+    ]})
+
+    assert response.status_code == 207
+    results = response.json['results']
+    assert [result.get('error') for result in results] == [
+        None,
+        'You do not have access to this project',
+        'Assignee must be a project member',
+        'Invalid date format. Use ISO format (YYYY-MM-DD)',
+        None,
+    ]
+    assert [db.session.get(Task, results[i]['id']).title for i in (0, 4)] == ['First', 'Second']
+    assert Task.query.count() == 2
+
+
+def test_bulk_create_pairs_each_result_with_its_item(client, auth_headers):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    db.session.add(alice)
+    db.session.flush()
+    project = Project(name='Mine', manager_id=alice.id)
+    db.session.add(project)
+    db.session.flush()
+    db.session.add(ProjectUser(project_id=project.id, user_id=alice.id, role='admin'))
+    db.session.commit()
+
+    # Items with and without optional values, in no particular title order
+    items = [
+        {'title': f'Task {n}', 'project_id': project.id,
+         **({'assignee_id': alice.id} if n % 3 == 0 else {}),
+         **({'due_date': '2024-05-01'} if n % 2 else {})}
+        for n in (7, 2, 9, 4, 1, 8, 3, 6, 5, 0)
+    ]
+    response = client.post('/api/tasks/bulk', headers=auth_headers(alice), json={'tasks': items})
+
+    assert response.status_code == 201
+    for item, result in zip(items, response.json['results']):
+        task = db.session.get(Task, result['id'])
+        assert (task.title, task.assignee_id) == (item['title'], item.get('assignee_id'))
+
+
+def test_bulk_update_skips_inaccessible_tasks(client, auth_headers):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    bob = User(name='Bob', email='bob@example.com', password_hash='x')
+    db.session.add_all([alice, bob])
+    db.session.flush()
+    mine = Project(name='Mine', manager_id=alice.id)
+    theirs = Project(name='Theirs', manager_id=bob.id)
+    db.session.add_all([mine, theirs])
+    db.session.flush()
+    db.session.add(ProjectUser(project_id=mine.id, user_id=alice.id, role='admin'))
+    tasks = [
+        Task(title='First', project_id=mine.id, updated_at=datetime(2024, 1, 1)),
+        Task(title='Second', project_id=mine.id, updated_at=datetime(2024, 1, 1)),
+        Task(title='Theirs', project_id=theirs.id, updated_at=datetime(2024, 1, 1)),
+    ]
+    db.session.add_all(tasks)
+    db.session.commit()
+    ids = [task.id for task in tasks]
+
+    response = client.patch('/api/tasks/bulk', headers=auth_headers(alice), json={
+        'ids': ids, 'changes': {'status': 'done', 'assignee_id': alice.id}
+    })
+
+    assert response.status_code == 207
+    assert response.json['results'] == [
+        {'id': ids[0]}, {'id': ids[1]}, {'id': ids[2], 'error': 'Task not found or access denied'}
+    ]
+    db.session.expire_all()
+    assert [(task.status, task.assignee_id) for task in tasks] == [
+        ('done', alice.id), ('done', alice.id), ('todo', None)
+    ]
+    assert [task.updated_at > datetime(2024, 1, 1) for task in tasks] == [True, True, False]
+
+def test_task_writes_lock_the_rows_they_count_from(client, auth_headers):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    db.session.add(alice)
+    db.session.flush()
+    project = Project(name='Mine', manager_id=alice.id)
+    db.session.add(project)
+    db.session.flush()
+    db.session.add(ProjectUser(project_id=project.id, user_id=alice.id, role='admin'))
+    tasks = [Task(title=title, project_id=project.id) for title in ('First', 'Second')]
+    db.session.add_all(tasks)
+    db.session.commit()
+    first, second = [task.id for task in tasks]
+    headers = auth_headers(alice)
+
+    # SQLite has no FOR UPDATE, so look at the task queries as PostgreSQL runs them
+    locked = []
+
+    def record(state):
+        if state.is_select and Task in [column['entity'] for column in state.statement.column_descriptions]:
+            locked.append('FOR UPDATE' in str(state.statement.compile(dialect=postgresql.dialect())))
+
+    event.listen(db.session, 'do_orm_execute', record)
+    try:
+        def writes(method, url, **kwargs):
+            locked.clear()
+            db.session.expunge_all()
+            assert getattr(client, method)(url, headers=headers, **kwargs).status_code == 200
+            return locked[0]
+
+        assert writes('patch', f'/api/tasks/{first}', json={'title': 'Renamed'})
+        assert writes('patch', f'/api/tasks/{first}/status', json={'status': 'done'})
+        assert writes('patch', f'/api/tasks/{first}/assign', json={'assignee_id': alice.id})
+        assert writes('patch', '/api/tasks/bulk', json={'ids': [first, second], 'changes': {'status': 'todo'}})
+        assert writes('delete', f'/api/tasks/{second}')
+        assert not writes('get', f'/api/tasks/{first}')
+    finally:
+        event.remove(db.session, 'do_orm_execute', record)
+
+    assert [task.status for task in Task.query.order_by(Task.id)] == ['todo']
+
+
+@pytest.mark.parametrize('changes', [
+    {'assignee_id': 'abc'},
+    {'assignee_id': True},
+    {'status': None},
+    {'status': ''},
+    {'status': 'x' * 51},
+    {'priority': 123},
+    {'title': 'Renamed'},
+    {},
+])
+def test_bulk_update_rejects_invalid_changes(client, auth_headers, changes):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    db.session.add(alice)
+    db.session.flush()
+    project = Project(name='Mine', manager_id=alice.id)
+    db.session.add(project)
+    db.session.flush()
+    db.session.add(ProjectUser(project_id=project.id, user_id=alice.id, role='admin'))
+    task = Task(title='First', project_id=project.id)
+    db.session.add(task)
+    db.session.commit()
+
+    response = client.patch('/api/tasks/bulk', headers=auth_headers(alice), json={
+        'ids': [task.id], 'changes': changes
+    })
+
+    assert response.status_code == 400
+    db.session.expire_all()
+    assert (task.status, task.priority, task.assignee_id) == ('todo', 'medium', None)
+
+
+def test_member_roles_of_malformed_ids_are_none(app):
+    with app.test_request_context():
+        assert get_member_roles({(1, 'abc'), ('x', 2)}) == {(1, 'abc'): None, ('x', 2): None}
+
+
+def test_changes_feed_returns_updates_and_deletions(client, auth_headers):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    db.session.add(alice)
+    db.session.flush()
+    project = Project(name='Mine', manager_id=alice.id)
+    db.session.add(project)
+    db.session.flush()
+    db.session.add(ProjectUser(project_id=project.id, user_id=alice.id, role='admin', created_at=datetime(2024, 1, 1)))
+    tasks = [
+        Task(title=title, project_id=project.id, updated_at=datetime(2024, 1, 1))
+        for title in ('First', 'Second', 'Third')
+    ]
+    db.session.add_all(tasks)
+    db.session.commit()
+    first, second, third = [task.id for task in tasks]
+
+    # The initial sync pages through every task
+    token, synced = None, []
+    while True:
+        response = client.get('/api/tasks/changes', headers=auth_headers(alice),
+                              query_string={'since': token, 'limit': 2} if token else {'limit': 2})
+        assert response.status_code == 200
+        synced += [task['id'] for task in response.json['tasks']]
+        token = response.json['next_token']
+        if not response.json['has_more']:
+            break
+    assert synced == [first, second, third]
+    assert response.json['projects'] == [project.id]
+
+    client.patch(f'/api/tasks/{second}', headers=auth_headers(alice), json={'status': 'done'})
+    client.delete(f'/api/tasks/{third}', headers=auth_headers(alice))
+
+    response = client.get('/api/tasks/changes', headers=auth_headers(alice), query_string={'since': token})
+    assert [(task['id'], task['status']) for task in response.json['tasks']] == [(second, 'done')]
+    assert [(row['id'], row['project_id']) for row in response.json['deleted']] == [(third, project.id)]
+
+    assert client.get('/api/tasks/changes', headers=auth_headers(alice),
+                      query_string={'since': 'garbage'}).status_code == 400
+
+
+def test_changes_feed_sends_every_task_of_projects_joined_since(client, auth_headers):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    bob = User(name='Bob', email='bob@example.com', password_hash='x')
+    db.session.add_all([alice, bob])
+    db.session.flush()
+    mine = Project(name='Mine', manager_id=alice.id)
+    theirs = Project(name='Theirs', manager_id=bob.id)
+    db.session.add_all([mine, theirs])
+    db.session.flush()
+    db.session.add_all([
+        ProjectUser(project_id=mine.id, user_id=alice.id, role='admin', created_at=datetime(2024, 1, 1)),
+        ProjectUser(project_id=theirs.id, user_id=bob.id, role='admin', created_at=datetime(2024, 1, 1)),
+    ])
+    old = [
+        Task(title=title, project_id=project.id, updated_at=datetime(2024, 1, 1))
+        for title, project in (('Mine', mine), ('Theirs 1', theirs), ('Theirs 2', theirs))
+    ]
+    db.session.add_all(old)
+    db.session.commit()
+    _, first, second = [task.id for task in old]
+    theirs_id = theirs.id
+
+    token = client.get('/api/tasks/changes', headers=auth_headers(alice)).json['next_token']
+    response = client.post(f'/api/projects/{theirs_id}/members', headers=auth_headers(bob),
+                           json={'user_id': alice.id, 'role': 'member'})
+    assert response.status_code == 201
+
+    # The unchanged tasks of the joined project page in, the others do not
+    synced = []
+    while True:
+        response = client.get('/api/tasks/changes', headers=auth_headers(alice),
+                              query_string={'since': token, 'limit': 1})
+        synced += [task['id'] for task in response.json['tasks']]
+        token = response.json['next_token']
+        if not response.json['has_more']:
+            break
+    assert synced == [first, second]
+    assert theirs_id in response.json['projects']
+
+
+def test_search_ranks_member_tasks_and_follows_edits(client, auth_headers):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    bob = User(name='Bob', email='bob@example.com', password_hash='x')
+    db.session.add_all([alice, bob])
+    db.session.flush()
+    mine = Project(name='Mine', manager_id=alice.id)
+    theirs = Project(name='Theirs', manager_id=bob.id)
+    db.session.add_all([mine, theirs])
+    db.session.flush()
+    db.session.add(ProjectUser(project_id=mine.id, user_id=alice.id, role='admin'))
+    tasks = [
+        Task(title='Write docs', description='Mention the invoice export', project_id=mine.id),
+        Task(title='Invoice export', description='CSV and PDF', project_id=mine.id),
+        Task(title='Invoice export', description='Not visible to Alice', project_id=theirs.id),
+        Task(title='Fix login', description=None, project_id=mine.id),
+    ]
+    db.session.add_all(tasks)
+    db.session.commit()
+    docs, export, _, login = [task.id for task in tasks]
+
+    def search(q, **args):
+        response = client.get('/api/tasks/search', headers=auth_headers(alice), query_string={'q': q, **args})
+        assert response.status_code == 200
+        return response
+
+    # Title matches rank first, the last word matches as a prefix
+    assert [task['id'] for task in search('invoice exp').json['tasks']] == [export, docs]
+    page = search('invoice', limit=1, offset=1).json
+    assert ([task['id'] for task in page['tasks']], page['has_more']) == ([docs], False)
+    # FTS5 syntax is searched for as plain words
+    assert search('title: "invoice" OR').json['tasks'] == []
+
+    client.patch(f'/api/tasks/{login}', headers=auth_headers(alice), json={'title': 'Fix invoice login'})
+    client.delete(f'/api/tasks/{docs}', headers=auth_headers(alice))
+    assert sorted(task['id'] for task in search('invoice').json['tasks']) == [export, login]
+
+    assert client.get('/api/tasks/search', headers=auth_headers(alice),
+                      query_string={'q': ' ?! '}).status_code == 400
+
+
+def test_task_counters_follow_every_write(app, client, auth_headers):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    bob = User(name='Bob', email='bob@example.com', password_hash='x')
+    db.session.add_all([alice, bob])
+    db.session.flush()
+    launch = Project(name='Launch', manager_id=alice.id)
+    other = Project(name='Other', manager_id=alice.id)
+    db.session.add_all([launch, other])
+    db.session.flush()
+    db.session.add_all([
+        ProjectUser(project_id=launch.id, user_id=alice.id, role='admin'),
+        ProjectUser(project_id=launch.id, user_id=bob.id, role='member'),
+        ProjectUser(project_id=other.id, user_id=alice.id, role='admin'),
+        ProjectUser(project_id=other.id, user_id=bob.id, role='member'),
+    ])
+    db.session.commit()
+    headers = auth_headers(alice)
+
+    created = client.post('/api/tasks', headers=headers, json={
+        'title': 'Late', 'project_id': launch.id, 'assignee_id': bob.id, 'due_date': '2020-01-01'
+    }).json['task']['id']
+    ids = [result['id'] for result in client.post('/api/tasks/bulk', headers=headers, json={'tasks': [
+        {'title': 'One', 'project_id': launch.id},
+        {'title': 'Two', 'project_id': launch.id, 'assignee_id': alice.id},
+        {'title': 'Three', 'project_id': other.id, 'assignee_id': bob.id, 'status': 'done'},
+    ]}).json['results']]
+    client.patch('/api/tasks/bulk', headers=headers, json={'ids': ids[:2], 'changes': {'assignee_id': bob.id}})
+    client.patch(f'/api/tasks/{ids[0]}/status', headers=headers, json={'status': 'done'})
+    client.patch(f'/api/tasks/{ids[1]}/assign', headers=headers, json={'assignee_id': alice.id})
+    client.put(f'/api/tasks/{ids[1]}', headers=headers, json={'status': 'done', 'assignee_id': None})
+    client.delete(f'/api/tasks/{created}', headers=headers)
+
+    response = client.get('/api/tasks/counts', headers=auth_headers(bob))
+    assert response.json == {
+        'assigned': {'open': 0, 'done': 2, 'overdue': 0},
+        'projects': [
+            {'project_id': launch.id, 'open': 0, 'done': 2, 'overdue': 0},
+            {'project_id': other.id, 'open': 0, 'done': 1, 'overdue': 0},
+        ]
+    }
+
+    client.delete(f'/api/projects/{other.id}', headers=headers)
+    result = app.test_cli_runner().invoke(args=['rebuild-task-counters', '--check'])
+    assert (result.exit_code, result.output) == (0, 'Task counters are correct\n')
+
+    # Drift is reported and repaired
+    TaskCounter.query.filter_by(scope='user', scope_id=bob.id).update({'open_count': 5})
+    db.session.commit()
+    result = app.test_cli_runner().invoke(args=['rebuild-task-counters'])
+    assert result.output.splitlines() == [
+        f'user {bob.id}: open/done 5/1, actually 0/1', 'Rebuilt the task counters, 1 were wrong'
+    ]
+
+
+def test_assignment_notifications_are_sent_in_the_background(app, client, auth_headers, smtp_server):
+    app.config.update(
+        NOTIFICATIONS_ENABLED=True, NOTIFICATION_WORKERS=1, NOTIFICATION_RETRY_BACKOFF=0.01,
+        MAIL_SERVER='127.0.0.1', MAIL_PORT=smtp_server.server_address[1], MAIL_USE_TLS=False,
+        MAIL_SUPPRESS_SEND=False, MAIL_DEFAULT_SENDER='tasks@example.com'
+    )
+    mail.init_app(app)
+    notifier.configure(app)
+
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    bob = User(name='Bob', email='bob@example.com', password_hash='x')
+    db.session.add_all([alice, bob])
+    db.session.flush()
+    project = Project(name='Launch', manager_id=alice.id)
+    db.session.add(project)
+    db.session.flush()
+    db.session.add_all([
+        ProjectUser(project_id=project.id, user_id=alice.id, role='admin'),
+        ProjectUser(project_id=project.id, user_id=bob.id, role='member'),
+    ])
+    db.session.commit()
+
+    # The first delivery fails temporarily and is retried on a new connection
+    smtp_server.fail_next = 1
+    client.post('/api/tasks/bulk', headers=auth_headers(alice), json={'tasks': [
+        {'title': f'Task {i}', 'project_id': project.id, 'assignee_id': bob.id} for i in range(3)
+    ] + [{'title': 'Self-assigned', 'project_id': project.id, 'assignee_id': alice.id}]})
+    notifier.join()
+    notifier.shutdown()
+
+    assert sorted(message['to'] for message in smtp_server.messages) == [['<bob@example.com>']] * 3
+    assert all('You have been assigned' in message['data'] for message in smtp_server.messages)
+    assert smtp_server.connections == 2
+    assert notifier.stats() == {'queued': 3, 'sent': 3, 'failed': 0, 'dropped': 0, 'retried': 1, 'pending': 0}
+
+
+def test_a_bad_notification_does_not_fail_its_batch(app, client, auth_headers, smtp_server):
+    app.config.update(
+        NOTIFICATIONS_ENABLED=True, NOTIFICATION_WORKERS=1, NOTIFICATION_BATCH_SIZE=10,
+        MAIL_SERVER='127.0.0.1', MAIL_PORT=smtp_server.server_address[1], MAIL_USE_TLS=False,
+        MAIL_SUPPRESS_SEND=False, MAIL_DEFAULT_SENDER='tasks@example.com'
+    )
+    mail.init_app(app)
+    notifier.configure(app)
+
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    bob = User(name='Bob', email='bob@example.com', password_hash='x')
+    # Newlines are refused in recipient headers
+    mallory = User(name='Mallory', email='mallory@example.com\nBcc: all@example.com', password_hash='x')
+    db.session.add_all([alice, bob, mallory])
+    db.session.flush()
+    project = Project(name='Launch', manager_id=alice.id)
+    db.session.add(project)
+    db.session.flush()
+    db.session.add_all([
+        ProjectUser(project_id=project.id, user_id=user.id, role='member') for user in (alice, bob, mallory)
+    ])
+    db.session.commit()
+
+    client.post('/api/tasks/bulk', headers=auth_headers(alice), json={'tasks': [
+        {'title': 'Line one\r\nline two', 'project_id': project.id, 'assignee_id': bob.id},
+        {'title': 'Bad address', 'project_id': project.id, 'assignee_id': mallory.id},
+        {'title': 'Plain', 'project_id': project.id, 'assignee_id': bob.id},
+    ]})
+    notifier.join()
+    notifier.shutdown()
+
+    subjects = sorted(line for message in smtp_server.messages
+                      for line in message['data'].splitlines() if line.startswith('Subject:'))
+    assert subjects == ['Subject: You have been assigned "Line one line two"',
+                        'Subject: You have been assigned "Plain"']
+    assert notifier.stats() == {'queued': 3, 'sent': 2, 'failed': 1, 'dropped': 0, 'retried': 0, 'pending': 0}
+
+
+def test_bulk_writes_publish_tasks_like_single_writes(app, client, auth_headers, monkeypatch):
+    published = []
+    monkeypatch.setattr(events, 'publish', lambda project_id, event_type, data: published.append(
+        (project_id, event_type, app.json.loads(app.json.dumps(data)))
+    ))
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    db.session.add(alice)
+    db.session.flush()
+    project = Project(name='Launch', manager_id=alice.id)
+    db.session.add(project)
+    db.session.flush()
+    db.session.add(ProjectUser(project_id=project.id, user_id=alice.id, role='admin'))
+    db.session.commit()
+    headers = auth_headers(alice)
+
+    single = client.post('/api/tasks', headers=headers, json={
+        'title': 'Single', 'project_id': project.id, 'assignee_id': alice.id
+    }).json['task']
+    ids = [result['id'] for result in client.post('/api/tasks/bulk', headers=headers, json={'tasks': [
+        {'title': 'First', 'project_id': project.id, 'assignee_id': alice.id},
+        {'title': 'Second', 'project_id': project.id, 'due_date': '2024-05-01'},
+    ]}).json['results']]
+    client.patch(f'/api/tasks/{single["id"]}/status', headers=headers, json={'status': 'review'})
+    client.patch('/api/tasks/bulk', headers=headers, json={'ids': ids, 'changes': {'status': 'done'}})
+
+    assert [(project_id, event_type, data['id']) for project_id, event_type, data in published] == [
+        (project.id, 'task.created', single['id']),
+        (project.id, 'task.created', ids[0]),
+        (project.id, 'task.created', ids[1]),
+        (project.id, 'task.updated', single['id']),
+        (project.id, 'task.updated', ids[0]),
+        (project.id, 'task.updated', ids[1]),
+    ]
+    payloads = [data for _, _, data in published]
+    assert payloads[0] == single
+    assert all(data.keys() == single.keys() for data in payloads)
+    assert payloads[1]['assignee'] == {'id': alice.id, 'name': 'Alice'}
+    assert [data['status'] for data in payloads[3:]] == ['review', 'done', 'done']
+    # Timestamps are formatted alike whichever route wrote the task
+    assert all(datetime.fromisoformat(data['updated_at']) for data in payloads)
+
+
+@pytest.mark.parametrize('resource', ['task', 'tasks', 'project'])
+def test_polls_are_answered_with_not_modified(client, auth_headers, resource):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    bob = User(name='Bob', email='bob@example.com', password_hash='x')
+    db.session.add_all([alice, bob])
+    db.session.flush()
+    project = Project(name='Launch', manager_id=alice.id)
+    db.session.add(project)
+    db.session.flush()
+    db.session.add_all([
+        ProjectUser(project_id=project.id, user_id=alice.id, role='admin'),
+        ProjectUser(project_id=project.id, user_id=bob.id, role='member'),
+    ])
+    task = Task(title='Write docs', project_id=project.id)
+    db.session.add(task)
+    db.session.commit()
+    url = {
+        'task': f'/api/tasks/{task.id}',
+        'tasks': f'/api/tasks?project_id={project.id}',
+        'project': f'/api/projects/{project.id}',
+    }[resource]
+
+    def get(user=alice, etag=None, query=''):
+        headers = {**auth_headers(user), **({'If-None-Match': etag} if etag else {})}
+        return client.get(url + query, headers=headers)
+
+    first = get()
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and etag.startswith('W/')
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    repeated = get(etag=etag)
+    assert repeated.status_code == 304
+    assert repeated.get_data() == b''
+    assert repeated.headers['ETag'] == etag
+
+    # Other users and other representations get their own validators
+    fields = {'task': '?fields=id,title', 'tasks': '&fields=id,title', 'project': '?fields=id,name'}[resource]
+    assert get(bob, etag).status_code == 200
+    assert get(bob).headers['ETag'] != etag
+    assert get(etag=etag, query=fields).status_code == 200
+    assert get(etag=get(query=fields).headers['ETag']).status_code == 200
+
+    # Changing the task, or the project itself, makes the old ETag stale
+    changes = [lambda: client.patch(f'/api/tasks/{task.id}/status', headers=auth_headers(alice), json={'status': 'done'})]
+    if resource == 'project':
+        changes.append(lambda: client.put(url, headers=auth_headers(alice), json={'name': 'Relaunch'}))
+    for change in changes:
+        change()
+        changed = get(etag=etag)
+        assert changed.status_code == 200
+        assert changed.headers['ETag'] != etag
+        etag = changed.headers['ETag']
+        assert get(etag=etag).status_code == 304
+
+
+class FakeBrotli:
+    """Stands in for the optional brotli package, compressing with zlib."""
+
+    class Compressor:
+        def __init__(self, quality):
+            self._compressor = zlib.compressobj()
+
+        def process(self, data):
+            return self._compressor.compress(data)
+
+        def flush(self):
+            return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+        def finish(self):
+            return self._compressor.flush()
+
+
+@pytest.fixture
+def compressed_app(app, monkeypatch):
+    """Build an app with routes of every kind of response, with or without brotli."""
+    def build(brotli=None):
+        monkeypatch.setattr(compression, 'brotli', brotli)
+        test_app = Flask(__name__)
+        test_app.config.update(app.config)
+        init_compression(test_app)
+        test_app.add_url_rule('/big', 'big', lambda: {'tasks': ['Write docs'] * 200})
+        test_app.add_url_rule('/small', 'small', lambda: {'tasks': ['Write docs']})
+        test_app.add_url_rule('/text', 'text', lambda: 'Write docs ' * 200)
+        test_app.add_url_rule('/encoded', 'encoded', lambda: (
+            gzip.compress(b'{}' * 1000), {'Content-Encoding': 'gzip', 'Content-Type': 'application/json'}
+        ))
+        test_app.add_url_rule('/cached', 'cached', lambda: ('', 304, {'Content-Type': 'application/json'}))
+        return test_app.test_client()
+    return build
+
+
+def test_responses_are_compressed_when_accepted_and_worth_it(compressed_app):
+    client = compressed_app()
+
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(gzip.decompress(response.get_data())) == {'tasks': ['Write docs'] * 200}
+
+    for headers in ({}, {'Accept-Encoding': 'identity'}, {'Accept-Encoding': 'gzip;q=0'}):
+        response = client.get('/big', headers=headers)
+        assert 'Content-Encoding' not in response.headers
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert response.json == {'tasks': ['Write docs'] * 200}
+
+    # Small bodies still vary by encoding, as a larger body of the same URL would not
+    response = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+    # Other types, already encoded bodies and 304s are left alone
+    for url in ('/text', '/encoded', '/cached'):
+        response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        assert response.headers.get('Content-Encoding') == ('gzip' if url == '/encoded' else None)
+        assert 'Vary' not in response.headers
+    assert gzip.decompress(client.get('/encoded').get_data()) == b'{}' * 1000
+    assert client.get('/cached', headers={'Accept-Encoding': 'gzip'}).status_code == 304
+
+
+def test_brotli_is_used_only_when_installed(compressed_app):
+    headers = {'Accept-Encoding': 'br, gzip'}
+    assert compressed_app(brotli=None).get('/big', headers=headers).headers['Content-Encoding'] == 'gzip'
+
+    client = compressed_app(brotli=FakeBrotli)
+    response = client.get('/big', headers=headers)
+    assert response.headers['Content-Encoding'] == 'br'
+    assert json.loads(zlib.decompress(response.get_data())) == {'tasks': ['Write docs'] * 200}
+    # The client's preferences come first
+    response = client.get('/big', headers={'Accept-Encoding': 'br;q=0.5, gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+
+@pytest.mark.parametrize('resource', ['tasks', 'projects'])
+def test_cursor_pages_cover_every_row_once(client, auth_headers, resource):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    db.session.add(alice)
+    db.session.flush()
+    # Five rows share every timestamp, so pages must break ties by id
+    stamps = [datetime(2024, 1, day) for day in range(1, 6)]
+    projects = [Project(name=f'Project {i}', manager_id=alice.id, created_at=stamps[i % 5]) for i in range(25)]
+    db.session.add_all(projects)
+    db.session.flush()
+    db.session.add_all([ProjectUser(project_id=project.id, user_id=alice.id, role='admin') for project in projects])
+    tasks = [Task(title=f'Task {i}', project_id=projects[0].id, created_at=stamps[i % 5]) for i in range(25)]
+    db.session.add_all(tasks)
+    db.session.commit()
+    rows = tasks if resource == 'tasks' else projects
+    expected = [row.id for row in sorted(rows, key=lambda row: (row.created_at, row.id), reverse=True)]
+
+    seen, cursor = [], None
+    while True:
+        query = {'limit': 7, **({'cursor': cursor} if cursor else {})}
+        page = client.get(f'/api/{resource}', headers=auth_headers(alice), query_string=query).json
+        assert len(page[resource]) == (7 if page['has_more'] else 4)
+        seen += [row['id'] for row in page[resource]]
+        if not page['has_more']:
+            assert page['next_cursor'] is None
+            break
+        cursor = page['next_cursor']
+    assert seen == expected
+
+
+@pytest.mark.parametrize('resource', ['tasks', 'projects'])
+def test_page_arguments_are_validated(client, auth_headers, resource):
+    alice = User(name='Alice', email='alice@example.com', password_hash='x')
+    db.session.add(alice)
+    db.session.commit()
+
+    def get(**query):
+        return client.get(f'/api/{resource}', headers=auth_headers(alice), query_string=query)
+
+    assert get(limit=500).json['limit'] == 100
+    assert get().json['limit'] == 20
+    for limit in (0, -1, 'ten'):
+        assert get(limit=limit).status_code == 400
+
+    malformed = ['not a cursor', 'é', *(
+        base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+        for payload in ('x', 7, [1], [None, 1], ['2024-01-01', None], ['yesterday', 1], {'a': 1, 'b': 2})
+    )]
+    for cursor in malformed:
+        response = get(cursor=cursor)
+        assert response.status_code == 400, cursor
+        assert response.json['error'] == 'Invalid cursor'
+    # An empty cursor means the first page
+    assert get(cursor='').status_code == 200
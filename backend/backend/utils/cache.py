@@ -0,0 +1,92 @@
+"""
+Small in-process caches.
+
+``TTLCache`` is a thread-safe LRU cache whose entries expire after a fixed
+number of seconds. It counts hits and misses so the effect of a cache can be
+measured in production.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# Returned by TTLCache.get() on a miss, so that None can be cached
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache with a per-entry time to live."""
+
+    def __init__(self, maxsize=1024, ttl=60, enabled=True):
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self.configure(maxsize=maxsize, ttl=ttl, enabled=enabled)
+
+    def configure(self, maxsize=None, ttl=None, enabled=None):
+        """Change the cache settings. Drops all entries and resets the counters."""
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = int(maxsize)
+            if ttl is not None:
+                self.ttl = float(ttl)
+            if enabled is not None:
+                self.enabled = bool(enabled)
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get(self, key, default=MISSING):
+        """Return the cached value for ``key``, or ``default`` on a miss."""
+        if not self.enabled:
+            return default
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """Cache ``value`` under ``key``, evicting the least recently used entry if full."""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """Drop ``key`` from the cache if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        """Drop every entry whose key matches ``predicate``."""
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self):
+        """Drop all entries, keeping the counters."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Return the cache settings and hit/miss counters."""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses
+            }
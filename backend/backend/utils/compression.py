@@ -0,0 +1,118 @@
+"""
+Negotiated response compression.
+
+``init_compression(app)`` registers an ``after_request`` hook that compresses
+responses with brotli or gzip, whichever the client's ``Accept-Encoding``
+prefers. Brotli is used only if the ``brotli`` package is installed.
+
+Buffered responses below ``COMPRESS_MIN_SIZE`` bytes are sent as they are.
+Streamed responses are compressed chunk by chunk and flushed after every
+chunk, so clients still receive each chunk as soon as it is produced.
+"""
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from flask import request
+
+
+class GzipEncoder:
+    name = 'gzip'
+
+    def __init__(self, level=6):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    name = 'br'
+
+    def __init__(self, level=4):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def get_encoders(app):
+    """Return ``{encoding: encoder factory}`` in server preference order."""
+    factories = {
+        'br': lambda: BrotliEncoder(app.config.get('COMPRESS_BR_LEVEL', 4)),
+        'gzip': lambda: GzipEncoder(app.config.get('COMPRESS_LEVEL', 6))
+    }
+    return {
+        name: factories[name]
+        for name in app.config.get('COMPRESS_ALGORITHMS', ['br', 'gzip'])
+        if name in factories and (name != 'br' or brotli is not None)
+    }
+
+
+def compress(encoder, data):
+    """Compress a whole body with a fresh encoder."""
+    return encoder.compress(data) + encoder.finish()
+
+
+def _compress_stream(encoder, chunks):
+    for chunk in chunks:
+        data = encoder.compress(chunk) + encoder.flush()
+        if data:
+            yield data
+    yield encoder.finish()
+
+
+def init_compression(app):
+    """Compress eligible responses of the given app."""
+    if not app.config.get('COMPRESS_ENABLED', True):
+        return
+
+    encoders = get_encoders(app)
+    mimetypes = set(app.config.get('COMPRESS_MIMETYPES', ['application/json']))
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            not encoders
+            or response.status_code < 200
+            or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in mimetypes
+        ):
+            return response
+
+        response.vary.add('Accept-Encoding')
+
+        encoding = request.accept_encodings.best_match(list(encoders))
+        if encoding is None:
+            return response
+
+        encoder = encoders[encoding]()
+        if response.is_streamed:
+            response.response = _compress_stream(encoder, response.iter_encoded())
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            response.set_data(compress(encoder, data))
+
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,178 @@
+"""
+Denormalized task counters.
+
+``task_counters`` holds the number of open and done tasks of every project
+and of every assignee, so project cards and "my tasks" read their counts
+from one row instead of counting tasks.
+
+Every route that creates, deletes or changes the project, assignee or status
+of tasks records the tasks' states before and after the change in a
+``TaskCounterChanges`` and applies it in the same transaction. The changes
+are added to the counters with one UPSERT, so concurrent writers never
+overwrite each other's counts. The routes read the previous states with
+SELECT ... FOR UPDATE, so that two requests changing the same task do not
+both count from the same state. SQLite has no row locks, so concurrent
+changes of one task may still make its counters drift there.
+
+Overdue counts depend on the clock rather than on writes, so they are
+counted from the tasks when read.
+
+``flask rebuild-task-counters`` recounts everything from the tasks table and
+reports counters that had drifted.
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import and_, case, func, literal, or_, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import Task, TaskCounter, db
+
+
+def task_state(task):
+    """The fields of a task the counters depend on."""
+    return task.project_id, task.assignee_id, task.status
+
+
+class TaskCounterChanges:
+    """Counter deltas of the tasks changed by one transaction."""
+
+    def __init__(self):
+        self.deltas = defaultdict(lambda: [0, 0])
+
+    def add(self, project_id, assignee_id, status, n=1):
+        """Count ``n`` tasks entering a state."""
+        column = 1 if status == 'done' else 0
+        self.deltas['project', int(project_id)][column] += n
+        if assignee_id:
+            self.deltas['user', int(assignee_id)][column] += n
+
+    def remove(self, project_id, assignee_id, status, n=1):
+        """Count ``n`` tasks leaving a state."""
+        self.add(project_id, assignee_id, status, -n)
+
+    def apply(self):
+        """Add the deltas to the counters. The caller commits."""
+        rows = [
+            {'scope': scope, 'scope_id': scope_id, 'open_count': open_count, 'done_count': done_count}
+            for (scope, scope_id), (open_count, done_count) in sorted(self.deltas.items())
+            if open_count or done_count
+        ]
+        self.deltas.clear()
+        if not rows:
+            return
+
+        dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+        statement = dialect.insert(TaskCounter).values(rows)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['scope', 'scope_id'],
+            set_={
+                'open_count': TaskCounter.open_count + statement.excluded.open_count,
+                'done_count': TaskCounter.done_count + statement.excluded.done_count,
+                'updated_at': datetime.utcnow()
+            }
+        ))
+
+
+def count_task_change(before=None, after=None):
+    """Apply the counter changes of one task moving from ``before`` to ``after``."""
+    changes = TaskCounterChanges()
+    if before is not None:
+        changes.remove(*before)
+    if after is not None:
+        changes.add(*after)
+    changes.apply()
+
+
+def count_project_deletion(project_id):
+    """Take the tasks of a project about to be deleted off the counters."""
+    changes = TaskCounterChanges()
+    rows = db.session.query(Task.assignee_id, Task.status, func.count()).filter(
+        Task.project_id == project_id
+    ).group_by(Task.assignee_id, Task.status)
+    for assignee_id, status, count in rows:
+        changes.remove(project_id, assignee_id, status, count)
+    changes.apply()
+    TaskCounter.query.filter_by(scope='project', scope_id=project_id).delete(synchronize_session=False)
+
+
+def read_task_counts(project_ids, user_id):
+    """
+    Return the ``{'open', 'done', 'overdue'}`` counts of the given projects
+    and of the tasks assigned to ``user_id``, as ``(projects, assigned)``.
+    """
+    counts = {('project', int(project_id)): [0, 0, 0] for project_id in project_ids}
+    counts['user', int(user_id)] = [0, 0, 0]
+
+    rows = db.session.query(
+        TaskCounter.scope, TaskCounter.scope_id, TaskCounter.open_count, TaskCounter.done_count
+    ).filter(or_(
+        and_(TaskCounter.scope == 'project', TaskCounter.scope_id.in_(project_ids)),
+        and_(TaskCounter.scope == 'user', TaskCounter.scope_id == user_id)
+    ))
+    for scope, scope_id, open_count, done_count in rows:
+        counts[scope, scope_id][:2] = open_count, done_count
+
+    # Overdue tasks are a subset of the open ones, seek them by due date
+    overdue = [Task.due_date < datetime.utcnow(), Task.status != 'done']
+    overdue_rows = db.session.execute(union_all(
+        select(literal('project'), Task.project_id, func.count()).where(
+            Task.project_id.in_(project_ids), *overdue
+        ).group_by(Task.project_id),
+        select(literal('user'), Task.assignee_id, func.count()).where(
+            Task.assignee_id == user_id, *overdue
+        ).group_by(Task.assignee_id)
+    )).all()
+    for scope, scope_id, count in overdue_rows:
+        counts[scope, scope_id][2] = count
+
+    def as_dict(key):
+        return dict(zip(('open', 'done', 'overdue'), counts[key]))
+
+    return (
+        {project_id: as_dict(('project', int(project_id))) for project_id in project_ids},
+        as_dict(('user', int(user_id)))
+    )
+
+
+def count_task_states():
+    """Recount ``{(scope, scope_id): (open_count, done_count)}`` from the tasks."""
+    done = case((Task.status == 'done', 1), else_=0)
+    counts = {}
+    for scope, column in (('project', Task.project_id), ('user', Task.assignee_id)):
+        rows = db.session.query(column, func.count() - func.sum(done), func.sum(done)).filter(
+            column.isnot(None)
+        ).group_by(column)
+        for scope_id, open_count, done_count in rows:
+            counts[scope, scope_id] = (open_count, done_count)
+    return counts
+
+
+def rebuild_task_counters():
+    """
+    Replace the counters with a fresh count and return the ones that were
+    wrong, as ``{(scope, scope_id): (stored, actual)}``. The caller commits.
+    """
+    actual = count_task_states()
+    stored = {
+        (scope, scope_id): (open_count, done_count)
+        for scope, scope_id, open_count, done_count in db.session.query(
+            TaskCounter.scope, TaskCounter.scope_id, TaskCounter.open_count, TaskCounter.done_count
+        )
+    }
+    # Missing rows and rows of deleted projects or users count as zero
+    drifted = {
+        key: (stored.get(key, (0, 0)), actual.get(key, (0, 0)))
+        for key in stored.keys() | actual.keys()
+        if stored.get(key, (0, 0)) != actual.get(key, (0, 0))
+    }
+
+    TaskCounter.query.delete(synchronize_session=False)
+    if actual:
+        now = datetime.utcnow()
+        db.session.execute(TaskCounter.__table__.insert(), [
+            {'scope': scope, 'scope_id': scope_id, 'open_count': open_count, 'done_count': done_count,
+             'created_at': now, 'updated_at': now}
+            for (scope, scope_id), (open_count, done_count) in actual.items()
+        ])
+    return drifted
@@ -1,3 +1,5 @@
+import math
+
 from flask import jsonify
 
 class APIError(Exception):
@@ -21,10 +23,27 @@ class ForbiddenError(APIError):
     def __init__(self, message="Forbidden"):
         super().__init__(message, 403)
 
+class GoneError(APIError):
+    def __init__(self, message="Gone"):
+        super().__init__(message, 410)
+
+class ServiceUnavailableError(APIError):
+    def __init__(self, message="Service temporarily unavailable"):
+        super().__init__(message, 503)
+
+class TooManyRequestsError(APIError):
+    def __init__(self, message="Too many requests, try again later", retry_after=None):
+        super().__init__(message, 429)
+        self.retry_after = retry_after
+
 def register_error_handlers(app):
     @app.errorhandler(APIError)
     def handle_api_error(error):
-        return jsonify({'error': error.message}), error.status_code
+        response = jsonify({'error': error.message})
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after:
+            response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response, error.status_code
     
     @app.errorhandler(404)
     def handle_not_found(error):
@@ -0,0 +1,56 @@
+"""
+Conditional GET support.
+
+Routes compute a cheap validator for a resource, usually the row count, the
+latest ``updated_at`` and the sum of ids of the rows it is built from, and
+hand it to ``conditional_response()``. If the client already holds that
+version, it gets ``304 Not Modified`` and the body is never built.
+
+The ETags are weak: they track the rows a response is made of, not related
+rows such as the name of a nested assignee. Validators include the caller and
+the query string, so no two users or representations share an ETag.
+"""
+import hashlib
+
+from flask import current_app, jsonify, request
+from sqlalchemy import func, select
+
+
+def make_etag(*parts):
+    """Hash the parts of a validator into an ETag value."""
+    return hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def version_columns(model, *criteria):
+    """
+    Scalar subqueries over the rows of ``model`` matching ``criteria`` whose
+    values change whenever such a row is added, removed or updated.
+    """
+    return [
+        select(func.count(model.id)).where(*criteria).scalar_subquery(),
+        select(func.max(model.updated_at)).where(*criteria).scalar_subquery(),
+        select(func.sum(model.id)).where(*criteria).scalar_subquery()
+    ]
+
+
+def query_version(query, model):
+    """Count, latest ``updated_at`` and sum of ids of an ORM query's rows."""
+    return tuple(query.with_entities(
+        func.count(model.id), func.max(model.updated_at), func.sum(model.id)
+    ).order_by(None).one())
+
+
+def conditional_response(etag, build_body):
+    """
+    Answer ``304 Not Modified`` if the request's If-None-Match matches
+    ``etag``, otherwise jsonify the result of ``build_body()``.
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build_body())
+
+    response.set_etag(etag, weak=True)
+    # Let clients cache, but always revalidate
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
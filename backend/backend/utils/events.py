@@ -0,0 +1,163 @@
+"""
+In-process pub/sub of project changes, streamed as Server-Sent Events.
+
+Write routes call ``events.publish()`` after committing. Each event gets an
+id of the form ``<boot>-<sequence>``, is kept in a ring buffer of the last
+``EVENTS_BUFFER_SIZE`` events and is pushed to the bounded queue of every
+subscriber of its project.
+
+``GET /api/projects/<id>/events`` subscribes and streams. A reconnecting
+client sends the id of the last event it saw as ``Last-Event-ID`` and is sent
+the buffered events after it. If that id is no longer in the buffer, or was
+issued by another process or before a restart, the client gets a ``reset``
+event and should refetch the project. A subscriber that falls behind by more
+than ``EVENTS_QUEUE_SIZE`` events is disconnected and resumes the same way.
+
+Only writes handled by the same process reach its subscribers.
+"""
+import itertools
+import queue
+import threading
+import uuid
+from collections import deque
+
+# Ends a subscription
+_CLOSE = object()
+
+
+class Subscription:
+    """One client's queue of encoded events for a project."""
+
+    def __init__(self, project_id, user_id, maxsize):
+        self.project_id = project_id
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, message):
+        """Queue a message; return False if the subscriber has fallen behind."""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except queue.Full:
+            return False
+
+    def close(self):
+        try:
+            self.queue.put_nowait(_CLOSE)
+        except queue.Full:
+            # The stream ends anyway once it has drained the queue
+            pass
+
+
+class EventBroker:
+    """Per-process fan-out of project events to SSE subscribers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.configure()
+
+    def configure(self, buffer_size=1000, queue_size=100, heartbeat=15):
+        """Change the settings and forget every event and subscriber."""
+        with self._lock:
+            self.queue_size = queue_size
+            self.heartbeat = heartbeat
+            self._boot = uuid.uuid4().hex[:8]
+            self._sequence = itertools.count(1)
+            self._buffer = deque(maxlen=buffer_size)
+            self._subscribers = {}
+
+    def publish(self, project_id, event_type, data):
+        """Send an event to the subscribers of a project."""
+        from flask import current_app
+
+        payload = current_app.json.dumps(data, separators=(',', ':'))
+        project_id = int(project_id)
+        with self._lock:
+            sequence = next(self._sequence)
+            message = format_event(f'{self._boot}-{sequence}', event_type, payload)
+            self._buffer.append((project_id, sequence, message))
+            subscribers = list(self._subscribers.get(project_id, ()))
+
+        for subscription in subscribers:
+            if not subscription.put(message):
+                self.unsubscribe(subscription)
+                subscription.close()
+
+    def disconnect(self, project_id, user_id=None):
+        """
+        End the streams of a user who left a project, or without ``user_id``
+        every stream of a deleted project.
+        """
+        with self._lock:
+            subscribers = self._subscribers.get(int(project_id), set())
+            closed = {
+                subscription for subscription in subscribers
+                if user_id is None or str(subscription.user_id) == str(user_id)
+            }
+            subscribers -= closed
+            if not subscribers:
+                self._subscribers.pop(int(project_id), None)
+        for subscription in closed:
+            subscription.close()
+
+    def subscribe(self, project_id, user_id, last_event_id=None):
+        """
+        Return a user's Subscription to a project's events, with the buffered
+        events after ``last_event_id`` already queued.
+        """
+        subscription = Subscription(int(project_id), user_id, self.queue_size)
+        with self._lock:
+            if last_event_id:
+                for message in self._replay(subscription.project_id, last_event_id):
+                    subscription.put(message)
+            self._subscribers.setdefault(subscription.project_id, set()).add(subscription)
+        return subscription
+
+    def _replay(self, project_id, last_event_id):
+        boot, _, sequence = last_event_id.partition('-')
+        oldest, latest = (self._buffer[0][1], self._buffer[-1][1]) if self._buffer else (1, 0)
+        if boot == self._boot and sequence.isdigit() and int(sequence) >= oldest - 1:
+            messages = [
+                message for event_project_id, event_sequence, message in self._buffer
+                if event_project_id == project_id and event_sequence > int(sequence)
+            ]
+            if len(messages) < self.queue_size:
+                return messages
+        
+        # Events were missed; carry on from the latest one after refetching
+        return [format_event(f'{self._boot}-{latest}', 'reset', '{}')]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.project_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.project_id]
+
+    def stream(self, subscription):
+        """Yield a subscription's events, with a comment line as heartbeat."""
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    message = subscription.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ': heartbeat\n\n'
+                    continue
+                if message is _CLOSE:
+                    return
+                yield message
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'buffered': len(self._buffer),
+                'subscribers': sum(len(subscribers) for subscribers in self._subscribers.values())
+            }
+
+
+def format_event(event_id, event_type, payload):
+    return f'id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n'
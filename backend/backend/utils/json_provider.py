@@ -0,0 +1,158 @@
+"""
+JSON providers for request and response bodies.
+
+``init_json(app)`` installs the provider named by ``JSON_PROVIDER``:
+
+- ``json``: the stdlib encoder, like Flask's default provider.
+- ``orjson``: the much faster ``orjson`` encoder. Anything it would encode
+  differently from the stdlib provider goes through the stdlib encoder
+  instead, so the output is byte for byte the same: non-string keys,
+  integers beyond 64 bits, non-ASCII text while ``ensure_ascii`` is on, and
+  floats the stdlib writes with an exponent (orjson writes ``0.00001`` for
+  ``1e-05``) or as ``NaN`` and ``Infinity`` (orjson writes ``null``).
+- ``auto`` (default): ``orjson`` if the package is installed, else ``json``.
+
+Both providers serialize dates and datetimes natively as ISO 8601 strings,
+the same strings ``.isoformat()`` and marshmallow produce.
+"""
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date, datetime, time
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(o):
+    if isinstance(o, (date, time)):
+        return o.isoformat()
+
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+
+    if dataclasses.is_dataclass(o):
+        return dataclasses.asdict(o)
+
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+# Values without floats that the walk below need not look into
+_SCALARS = frozenset({str, int, bool, type(None), date, datetime, time, decimal.Decimal, uuid.UUID})
+
+
+def _has_odd_floats(obj):
+    """
+    Whether ``obj`` holds a float that orjson writes differently from the
+    stdlib: NaN, infinities, and the floats whose repr has an exponent.
+    """
+    kind = type(obj)
+    if kind is dict:
+        values = obj.values()
+    elif kind is list or kind is tuple:
+        values = obj
+    elif isinstance(obj, float):
+        return not (1e-4 <= abs(obj) < 1e16 or obj == 0.0)
+    elif isinstance(obj, dict):
+        values = obj.values()
+    elif isinstance(obj, (list, tuple)):
+        values = obj
+    else:
+        # Other objects go through default(), which checks what it returns
+        return False
+
+    for value in values:
+        if type(value) not in _SCALARS and _has_odd_floats(value):
+            return True
+    return False
+
+
+class StdJSONProvider(DefaultJSONProvider):
+    """Flask's default provider, with ISO 8601 instead of HTTP dates."""
+    default = staticmethod(_default)
+
+
+class OrjsonProvider(StdJSONProvider):
+    """orjson-backed provider with the same output as StdJSONProvider."""
+
+    def dumps(self, obj, **kwargs):
+        return self._dumps_bytes(obj, **kwargs).decode('utf-8')
+
+    def _dumps_bytes(self, obj, **kwargs):
+        # orjson only writes the compact and 2-space indented forms that
+        # response() asks for, not json.dumps' default ", " and ": "
+        option = orjson.OPT_PASSTHROUGH_DATACLASS
+        if kwargs == {'indent': 2}:
+            option |= orjson.OPT_INDENT_2
+        elif kwargs != {'separators': (',', ':')}:
+            return super().dumps(obj, **kwargs).encode('utf-8')
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if _has_odd_floats(obj):
+            return super().dumps(obj, **kwargs).encode('utf-8')
+
+        try:
+            data = orjson.dumps(obj, default=self._checked_default, option=option)
+        except TypeError:
+            # Non-string keys, huge integers, odd floats of converted objects
+            # and the like
+            return super().dumps(obj, **kwargs).encode('utf-8')
+
+        if self.ensure_ascii and not data.isascii():
+            return super().dumps(obj, **kwargs).encode('utf-8')
+        return data
+
+    def _checked_default(self, o):
+        # orjson encodes what default() returns itself, so check it too
+        value = self.default(o)
+        if _has_odd_floats(value):
+            raise TypeError('Float orjson writes differently')
+        return value
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            # Let the stdlib accept what it accepts (NaN, huge integers) and
+            # raise its usual error for the rest
+            return super().loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            data = self._dumps_bytes(obj, indent=2)
+        else:
+            data = self._dumps_bytes(obj, separators=(',', ':'))
+        return self._app.response_class(data + b'\n', mimetype=self.mimetype)
+
+
+PROVIDERS = {
+    'json': StdJSONProvider,
+    'orjson': OrjsonProvider
+}
+
+
+def get_json_provider_class(name):
+    """Resolve a ``JSON_PROVIDER`` setting to a provider class."""
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'json'
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown JSON_PROVIDER {name!r}, expected one of: auto, {', '.join(PROVIDERS)}")
+    if name == 'orjson' and orjson is None:
+        raise RuntimeError("JSON_PROVIDER is 'orjson' but the orjson package is not installed")
+    return PROVIDERS[name]
+
+
+def init_json(app):
+    """Install the configured JSON provider on the given app."""
+    app.json = get_json_provider_class(app.config.get('JSON_PROVIDER', 'auto'))(app)
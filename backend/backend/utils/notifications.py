@@ -0,0 +1,215 @@
+"""
+Asynchronous assignment notifications.
+
+Routes call ``notifier.notify_assignments()`` after committing. That only puts
+``(task_id, assignee_id)`` pairs on a bounded queue, so a request never waits
+on SMTP; when the queue is full the notification is dropped and counted.
+
+A small pool of worker threads drains the queue in batches. Each batch loads
+its tasks and assignees with one query, skips tasks that have been
+reassigned since, and sends the emails through an SMTP connection the worker
+keeps open until it has been idle for ``NOTIFICATION_IDLE_TIMEOUT`` seconds.
+Failed sends are retried on a fresh connection with exponential backoff;
+permanent (5xx) rejections are not retried. A message that cannot be built or
+sent fails on its own, without affecting the rest of its batch.
+"""
+import queue
+import smtplib
+import threading
+import time
+from contextlib import ExitStack
+
+# Tells a worker to exit
+_STOP = object()
+
+
+class NotificationDispatcher:
+    """Per-process queue and worker pool for assignment emails."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = None
+        self._workers = []
+        self._app = None
+        self.enabled = False
+
+    def configure(self, app):
+        """Read the settings of the given app, stopping any running workers."""
+        self.shutdown()
+        with self._lock:
+            self._app = app
+            self._counts = {'queued': 0, 'sent': 0, 'failed': 0, 'dropped': 0, 'retried': 0}
+            self.enabled = app.config.get('NOTIFICATIONS_ENABLED', True)
+            if self.enabled and not app.config.get('MAIL_DEFAULT_SENDER'):
+                app.logger.warning('MAIL_DEFAULT_SENDER is not set, assignment notifications are disabled')
+                self.enabled = False
+            self.worker_count = app.config.get('NOTIFICATION_WORKERS', 2)
+            self.batch_size = app.config.get('NOTIFICATION_BATCH_SIZE', 50)
+            self.retries = app.config.get('NOTIFICATION_RETRIES', 3)
+            self.retry_backoff = app.config.get('NOTIFICATION_RETRY_BACKOFF', 1.0)
+            self.idle_timeout = app.config.get('NOTIFICATION_IDLE_TIMEOUT', 30)
+            self._queue = queue.Queue(maxsize=app.config.get('NOTIFICATION_QUEUE_SIZE', 1000))
+
+    def notify_assignments(self, assignments, actor_id=None):
+        """
+        Queue an email for each ``(task_id, assignee_id)`` pair. Unassigned
+        tasks and tasks the actor assigned to themselves are skipped.
+        """
+        if not self.enabled:
+            return
+        self._start()
+
+        for task_id, assignee_id in assignments:
+            if assignee_id is None or str(assignee_id) == str(actor_id):
+                continue
+            try:
+                self._queue.put_nowait((task_id, assignee_id))
+                self._count('queued')
+            except queue.Full:
+                self._count('dropped')
+                self._app.logger.warning(f'Notification queue full, dropped notification for task {task_id}')
+
+    def join(self):
+        """Block until every queued notification has been handled."""
+        if self._queue is not None:
+            self._queue.join()
+
+    def shutdown(self):
+        """Stop the workers once they have drained the queue."""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._queue.put(_STOP)
+        for worker in workers:
+            worker.join()
+
+    def stats(self):
+        with self._lock:
+            return {**self._counts, 'pending': self._queue.qsize() if self._queue else 0}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    def _start(self):
+        # Started lazily so that no threads exist before a server forks
+        if self._workers:
+            return
+        with self._lock:
+            if self._workers:
+                return
+            for index in range(self.worker_count):
+                worker = threading.Thread(target=self._run, name=f'notifications-{index}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _run(self):
+        connection = _SMTPConnection()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                connection.close()
+                continue
+
+            batch = [item]
+            while item is not _STOP and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            try:
+                assignments = [item for item in batch if item is not _STOP]
+                if assignments:
+                    with self._app.app_context():
+                        self._send_batch(connection, assignments)
+            except Exception:
+                # Messages fail one by one, so only loading the batch gets here
+                self._count('failed', len(assignments))
+                self._app.logger.exception('Failed to send assignment notifications')
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if _STOP in batch:
+                connection.close()
+                return
+
+    def _send_batch(self, connection, assignments):
+        from flask_mail import Message
+        from models import Project, Task, User, db
+
+        rows = db.session.query(
+            Task.id, Task.title, Task.due_date, Task.assignee_id, Project.name, User.name, User.email
+        ).join(Project, Project.id == Task.project_id).join(User, User.id == Task.assignee_id).filter(
+            Task.id.in_({task_id for task_id, _ in assignments})
+        ).all()
+        # Return the database connection before talking to SMTP
+        db.session.remove()
+
+        # Only notify assignees who still hold the task
+        wanted = {(int(task_id), int(assignee_id)) for task_id, assignee_id in assignments}
+        for task_id, title, due_date, assignee_id, project_name, name, email in rows:
+            if (task_id, assignee_id) not in wanted:
+                continue
+            due = f"\nDue: {due_date.strftime('%Y-%m-%d')}" if due_date else ''
+            try:
+                message = Message(
+                    # Line breaks would make the subject an invalid header
+                    subject=f'You have been assigned "{" ".join(title.split())}"',
+                    recipients=[email],
+                    body=f'Hi {name},\n\nYou have been assigned "{title}" in {project_name}.{due}\n'
+                )
+                self._send(connection, message)
+            except Exception:
+                self._count('failed')
+                self._app.logger.exception(f'Failed to send notification for task {task_id}')
+
+    def _send(self, connection, message):
+        for attempt in range(self.retries + 1):
+            try:
+                connection.send(message)
+                self._count('sent')
+                return
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused) as e:
+                error = e
+                break
+            except smtplib.SMTPResponseException as e:
+                error = e
+                if e.smtp_code >= 500:
+                    break
+            except (smtplib.SMTPException, OSError) as e:
+                error = e
+
+            connection.close()
+            if attempt < self.retries:
+                self._count('retried')
+                time.sleep(self.retry_backoff * 2 ** attempt)
+
+        self._count('failed')
+        self._app.logger.error(f'Failed to send notification to {message.recipients}: {error}')
+
+
+class _SMTPConnection:
+    """A Flask-Mail connection that stays open between batches."""
+
+    def __init__(self):
+        self._stack = ExitStack()
+        self._connection = None
+
+    def send(self, message):
+        if self._connection is None:
+            from extensions import mail
+            self._connection = self._stack.enter_context(mail.connect())
+        self._connection.send(message)
+
+    def close(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                self._stack.close()
+            except (smtplib.SMTPException, OSError):
+                # The server already dropped the connection
+                pass
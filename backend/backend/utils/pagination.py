@@ -0,0 +1,93 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Pages are ordered newest first by ``(created_at, id)``. The cursor is an
+opaque, URL-safe token holding the sort key of the last row of the previous
+page, so fetching page N costs the same as fetching page 1.
+"""
+import base64
+import json
+from datetime import datetime
+
+from flask import current_app, request
+from sqlalchemy import tuple_
+
+from utils.errors import ValidationError
+
+
+def encode_cursor(created_at, row_id):
+    """Encode the sort key of a row into an opaque cursor string."""
+    payload = json.dumps([created_at.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor back into a ``(created_at, id)`` tuple."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError, UnicodeError):
+        raise ValidationError('Invalid cursor')
+
+
+def get_page_limit():
+    """Read ``?limit=`` from the request, bounded by the configured page sizes."""
+    default = current_app.config.get('ITEMS_PER_PAGE', 20)
+    maximum = current_app.config.get('MAX_ITEMS_PER_PAGE', 100)
+
+    limit = request.args.get('limit', default)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValidationError('Limit must be an integer')
+
+    if limit < 1:
+        raise ValidationError('Limit must be a positive integer')
+    return min(limit, maximum)
+
+
+def get_page_offset():
+    """Read ``?offset=`` from the request, for pages that have no stable sort key."""
+    offset = request.args.get('offset', 0)
+    try:
+        offset = int(offset)
+    except (TypeError, ValueError):
+        raise ValidationError('Offset must be an integer')
+
+    if offset < 0:
+        raise ValidationError('Offset must not be negative')
+    return offset
+
+
+def keyset_paginate(query, model):
+    """
+    Apply keyset pagination to ``query`` using the request's ``limit`` and
+    ``cursor`` arguments.
+
+    Returns the rows of the current page and a dict with ``limit``,
+    ``next_cursor`` and ``has_more`` to merge into the response body.
+    """
+    limit = get_page_limit()
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(model.created_at, model.id) < tuple_(created_at, row_id)
+        )
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return rows, {
+        'limit': limit,
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }
@@ -0,0 +1,33 @@
+"""
+Helpers for common query string parameters.
+"""
+from flask import request
+
+from utils.errors import ValidationError
+
+
+def _get_names(param, allowed):
+    """Parse ``?param=a,b`` into a set of names, which must all be in ``allowed``."""
+    value = request.args.get(param, '')
+    names = {name.strip() for name in value.split(',') if name.strip()}
+
+    invalid = names - set(allowed)
+    if invalid:
+        raise ValidationError(f"Invalid {param} value(s): {', '.join(sorted(invalid))}")
+    return names
+
+
+def get_expand(allowed):
+    """
+    Parse ``?expand=a,b`` into a set of names. Nested collections are only
+    included when expanded.
+    """
+    return _get_names('expand', allowed)
+
+
+def get_fields(allowed):
+    """
+    Parse ``?fields=a,b`` into a set of field names to return, or None when
+    all fields were asked for.
+    """
+    return _get_names('fields', allowed) or None
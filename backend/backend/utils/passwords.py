@@ -0,0 +1,162 @@
+"""
+Password hashing off the request threads.
+
+Hashing and checking passwords is deliberately slow CPU work that holds the
+GIL, so running it inline lets a burst of logins stall every other request
+of the process. ``PasswordHasher`` runs it in a small process pool instead.
+
+Workers are spawned processes, which import the script the server was
+started with again (as ``__mp_main__``) and run what it does on import.
+Scripts must therefore create the app under ``if __name__ == '__main__'``,
+as ``app.py`` does, or every worker builds an app of its own. Servers that
+import the app, like gunicorn, are not affected. The jobs themselves are
+werkzeug's hashing functions, whose modules do nothing on import.
+
+The pool is bounded: at most ``PASSWORD_HASH_QUEUE_SIZE`` jobs may be pending
+at once, and further requests fail fast with 503 rather than queueing
+without limit. ``PASSWORD_HASH_WORKERS = 0`` hashes inline, e.g. for tests.
+
+A request gives up on its job after ``PASSWORD_HASH_TIMEOUT``, but a job that
+already runs cannot be stopped: it keeps its worker busy until it finishes.
+Such orphaned jobs stay counted as pending until then, so that the limit
+reflects the work the pool really has.
+
+New hashes use ``PASSWORD_HASH_METHOD`` in werkzeug's notation, which
+carries the cost parameters (``scrypt:32768:8:1``,
+``pbkdf2:sha256:600000``). Hashes made with other parameters keep working and
+are replaced on the next successful login.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from utils.errors import ServiceUnavailableError
+
+
+class PasswordHasher:
+    """Per-process bounded pool for password hashing."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self.configure()
+
+    def configure(self, method='scrypt', workers=2, queue_size=64, timeout=10):
+        """Change the settings, stopping the running pool."""
+        self.shutdown()
+        with self._lock:
+            self.method = method
+            self.workers = workers
+            self.queue_size = queue_size
+            self.timeout = timeout
+            self._slots = threading.BoundedSemaphore(queue_size)
+            self._prefix = None
+            self._counts = {'hashed': 0, 'checked': 0, 'rehashed': 0, 'rejected': 0, 'timed_out': 0}
+            self._pending = 0
+            self._orphaned = 0
+
+    def hash(self, password):
+        """Return a new hash of ``password`` with the configured method."""
+        result = self._run(generate_password_hash, password, self.method)
+        self._count('hashed')
+        return result
+
+    def check(self, password_hash, password):
+        """Return whether ``password`` matches ``password_hash``."""
+        result = self._run(check_password_hash, password_hash, password)
+        self._count('checked')
+        return result
+
+    def needs_rehash(self, password_hash):
+        """Whether a hash was made with other parameters than the configured ones."""
+        if self._prefix is None:
+            # Expand shorthands like "scrypt" to their full parameters once
+            self._prefix = self._run(generate_password_hash, '', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._prefix
+
+    def check_and_upgrade(self, user, password):
+        """
+        Check a user's password and, if it matches a hash made with old
+        parameters, replace the hash. The caller commits.
+        """
+        if not self.check(user.password_hash, password):
+            return False
+        if self.needs_rehash(user.password_hash):
+            user.password_hash = self.hash(password)
+            self._count('rehashed')
+        return True
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counts,
+                'method': self.method,
+                'workers': self.workers,
+                'pending': self._pending,
+                'orphaned': self._orphaned,
+                'queue_size': self.queue_size
+            }
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+
+        # Shed load instead of queueing behind a burst
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            self._count('rejected')
+            raise ServiceUnavailableError('Too many sign-ins in progress, try again shortly')
+        orphaned = False
+        try:
+            with self._lock:
+                self._pending += 1
+            future = self._start().submit(fn, *args)
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                self._count('timed_out')
+                # A running job cannot be cancelled, so it keeps its slot
+                # until it is done
+                if not future.cancel():
+                    orphaned = True
+                    with self._lock:
+                        self._orphaned += 1
+                    future.add_done_callback(lambda future: self._release(slots, orphaned=True))
+                raise ServiceUnavailableError('Too many sign-ins in progress, try again shortly')
+        finally:
+            if not orphaned:
+                self._release(slots)
+
+    def _release(self, slots, orphaned=False):
+        with self._lock:
+            # Jobs of a previous configuration no longer count
+            if slots is self._slots:
+                self._pending -= 1
+                if orphaned:
+                    self._orphaned -= 1
+        slots.release()
+
+    def _start(self):
+        # Started lazily so that no processes exist before a server forks
+        with self._lock:
+            if self._executor is None:
+                # Spawned rather than forked, as forking a threaded server
+                # can copy held locks into the children
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
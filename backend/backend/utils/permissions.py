@@ -0,0 +1,146 @@
+"""
+Project authorization.
+
+Roles are resolved in three layers:
+
+1. ``flask.g`` holds the caller's ``{project_id: role}`` map for the rest of
+   the request once it has been loaded.
+2. ``membership_cache`` is a process-wide LRU cache of
+   ``(user_id, project_id) -> role`` with a short TTL. ``None`` is cached
+   too, so repeated checks for non-members stay off the database.
+3. On a miss the caller's memberships are loaded with a single query and
+   used to fill both layers.
+
+Routes that change memberships must call ``invalidate_membership()`` after
+committing. Other processes catch up when their entries expire.
+"""
+from functools import wraps
+
+from flask import g
+from flask_jwt_extended import get_jwt_identity
+
+from extensions import membership_cache
+from models import ProjectUser, db
+from utils.cache import MISSING
+from utils.errors import ForbiddenError
+
+
+def _cache_key(user_id, project_id):
+    """Normalize ids from JWTs, route arguments and JSON bodies."""
+    return int(user_id), int(project_id)
+
+
+def get_project_roles():
+    """Return ``{project_id: role}`` for the current user."""
+    user_id = get_jwt_identity()
+    cached = g.get('_project_roles')
+    if cached is None or cached[0] != user_id:
+        rows = db.session.query(ProjectUser.project_id, ProjectUser.role).filter(
+            ProjectUser.user_id == user_id
+        ).all()
+        cached = g._project_roles = (user_id, dict(rows))
+        for project_id, role in rows:
+            membership_cache.set(_cache_key(user_id, project_id), role)
+    return cached[1]
+
+
+def get_project_role(project_id):
+    """Return the current user's role in a project, or None if not a member."""
+    user_id = get_jwt_identity()
+    try:
+        key = _cache_key(user_id, project_id)
+    except (TypeError, ValueError):
+        return None
+
+    cached = g.get('_project_roles')
+    if cached is not None and cached[0] == user_id:
+        return cached[1].get(key[1])
+
+    role = membership_cache.get(key)
+    if role is MISSING:
+        role = get_project_roles().get(key[1])
+        membership_cache.set(key, role)
+    return role
+
+
+def get_member_role(project_id, user_id):
+    """Return any user's role in a project, or None if not a member."""
+    try:
+        key = _cache_key(user_id, project_id)
+    except (TypeError, ValueError):
+        return None
+
+    if str(user_id) == str(get_jwt_identity()):
+        return get_project_role(project_id)
+
+    role = membership_cache.get(key)
+    if role is MISSING:
+        member = db.session.query(ProjectUser.role).filter_by(
+            project_id=key[1],
+            user_id=key[0]
+        ).first()
+        role = member.role if member else None
+        membership_cache.set(key, role)
+    return role
+
+
+def get_member_roles(pairs):
+    """
+    Return ``{(project_id, user_id): role}`` for many memberships at once,
+    with None for non-members and for ids that are not integers. Memberships
+    that are not cached are loaded with a single query.
+    """
+    roles = {}
+    missing = set()
+    for project_id, user_id in pairs:
+        try:
+            user_id, project_id = _cache_key(user_id, project_id)
+        except (TypeError, ValueError):
+            roles[project_id, user_id] = None
+            continue
+        role = membership_cache.get((user_id, project_id))
+        if role is MISSING:
+            missing.add((project_id, user_id))
+        else:
+            roles[project_id, user_id] = role
+
+    if missing:
+        rows = db.session.query(ProjectUser.project_id, ProjectUser.user_id, ProjectUser.role).filter(
+            ProjectUser.project_id.in_({project_id for project_id, _ in missing}),
+            ProjectUser.user_id.in_({user_id for _, user_id in missing})
+        ).all()
+        found = {(project_id, user_id): role for project_id, user_id, role in rows}
+        for project_id, user_id in missing:
+            role = roles[project_id, user_id] = found.get((project_id, user_id))
+            membership_cache.set((user_id, project_id), role)
+    return roles
+
+
+def invalidate_membership(project_id, user_id=None):
+    """
+    Forget cached roles after a membership change. Without ``user_id`` every
+    member of the project is forgotten.
+    """
+    if user_id is None:
+        project_id = int(project_id)
+        membership_cache.delete_where(lambda key: key[1] == project_id)
+    else:
+        membership_cache.delete(_cache_key(user_id, project_id))
+    g.pop('_project_roles', None)
+
+
+def require_project_role(*roles, message='You do not have access to this project'):
+    """
+    Reject the request unless the current user is a member of the project in
+    the ``project_id`` route argument. If ``roles`` are given, the member must
+    also hold one of them.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            role = get_project_role(kwargs['project_id'])
+            if role is None or (roles and role not in roles):
+                raise ForbiddenError(message)
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,119 @@
+"""
+Database connection pool metrics.
+
+``PoolMetrics.watch(engine)`` follows the engine's pool through its events:
+how many connections are checked out now and at most, how many were opened,
+invalidated or timed out, and how long requests waited for a connection.
+The numbers are per process and reported by ``/api/health/metrics``.
+
+To size a pool, compare ``peak_in_use`` with ``pool_size + max_overflow``
+and watch ``wait``: if requests regularly wait for a connection, a worker
+has more concurrent requests than connections. The database must allow
+``workers * (pool_size + max_overflow)`` connections in total.
+"""
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+# Upper bounds in seconds of the checkout wait histogram; the last bucket is open
+WAIT_BUCKETS = (0.001, 0.01, 0.1, 1.0)
+
+
+class PoolMetrics:
+    """Per-process counters of one engine's connection pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engine = None
+        self._reset()
+
+    def watch(self, engine):
+        """Follow ``engine``'s pool from now on, forgetting the previous engine."""
+        with self._lock:
+            self._engine = engine
+            self._reset()
+
+        event.listen(engine.pool, 'connect', lambda *args: self._count(engine, 'connects'))
+        event.listen(engine.pool, 'invalidate', lambda *args: self._count(engine, 'invalidated'))
+        event.listen(engine.pool, 'checkout', lambda *args: self._move(engine, 1))
+        event.listen(engine.pool, 'checkin', lambda *args: self._move(engine, -1))
+        # Detached connections are no longer the pool's, nor checked in again
+        event.listen(engine.pool, 'detach', lambda *args: self._move(engine, -1))
+
+        # No pool event fires before a checkout waits, so time pool.connect()
+        # itself. dispose() replaces the pool (keeping its event listeners).
+        self._time_checkouts(engine)
+        event.listen(engine, 'engine_disposed', lambda *args: self._time_checkouts(engine))
+
+    def stats(self):
+        with self._lock:
+            checkouts = self._counts['checkouts']
+            stats = {
+                **self._counts,
+                'in_use': self._in_use,
+                'peak_in_use': self._peak_in_use,
+                'wait': {
+                    'average_ms': round(self._wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+                    'max_ms': round(self._wait_max * 1000, 3),
+                    'histogram': dict(zip(
+                        [f'<{bound * 1000:g}ms' for bound in WAIT_BUCKETS] + [f'>={WAIT_BUCKETS[-1] * 1000:g}ms'],
+                        self._wait_histogram
+                    ))
+                }
+            }
+            engine = self._engine
+
+        pool = engine.pool if engine is not None else None
+        stats['pool'] = type(pool).__name__ if pool is not None else None
+        # Only queue pools have a size and an overflow
+        if hasattr(pool, 'overflow'):
+            stats.update(pool_size=pool.size(), overflow=max(pool.overflow(), 0), idle=pool.checkedin())
+        return stats
+
+    def _reset(self):
+        self._counts = {'checkouts': 0, 'connects': 0, 'invalidated': 0, 'timeouts': 0}
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_histogram = [0] * (len(WAIT_BUCKETS) + 1)
+
+    def _time_checkouts(self, engine):
+        pool = engine.pool
+        connect = pool.connect
+
+        def timed_connect():
+            started = time.perf_counter()
+            try:
+                connection = connect()
+            except PoolTimeoutError:
+                self._count(engine, 'timeouts')
+                raise
+            self._record_wait(engine, time.perf_counter() - started)
+            return connection
+
+        pool.connect = timed_connect
+
+    def _record_wait(self, engine, wait):
+        with self._lock:
+            if engine is not self._engine:
+                return
+            self._counts['checkouts'] += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            bucket = next((i for i, bound in enumerate(WAIT_BUCKETS) if wait < bound), len(WAIT_BUCKETS))
+            self._wait_histogram[bucket] += 1
+
+    def _move(self, engine, n):
+        with self._lock:
+            if engine is not self._engine:
+                return
+            self._in_use += n
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+
+    def _count(self, engine, name):
+        with self._lock:
+            if engine is self._engine:
+                self._counts[name] += 1
@@ -0,0 +1,205 @@
+"""
+Rate limiting and admission control.
+
+``limiter.limit(blueprint, setting, key)`` adds a ``before_request`` check to
+a blueprint. The limit is read from ``app.config[setting]`` as
+``"<count>/<second|minute|hour|day>"`` and enforced per value of ``key(request)``
+with a token bucket: up to ``count`` requests at once, refilled evenly over
+the period. Requests over the limit get ``429`` with ``Retry-After`` before
+the view runs, so they cost no queries and no password hashing.
+
+Buckets live in process memory by default, so every worker process has its
+own. Set ``RATELIMIT_STORAGE_URL`` to a Redis URL (needs ``pip install redis``)
+to share them across workers. If Redis cannot be reached, requests are let
+through rather than failing.
+"""
+import re
+import threading
+import time
+
+from flask import current_app, request
+from flask_jwt_extended import decode_token
+
+from utils.errors import TooManyRequestsError
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+_LIMIT = re.compile(r'^\s*(\d+)\s*/\s*(second|minute|hour|day)\s*$')
+
+
+def parse_limit(value):
+    """Parse ``"10/minute"`` into ``(capacity, tokens per second)``."""
+    match = _LIMIT.match(value or '')
+    if not match or int(match.group(1)) < 1:
+        raise ValueError(f'Invalid rate limit {value!r}, expected e.g. "10/minute"')
+    capacity = int(match.group(1))
+    return capacity, capacity / PERIODS[match.group(2)]
+
+
+class MemoryBackend:
+    """Token buckets in a dict, shared by the threads of one process."""
+
+    name = 'memory'
+
+    def __init__(self, max_keys=100000):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self.max_keys = max_keys
+
+    def take(self, key, capacity, rate):
+        """Take a token; return 0 if one was available, else seconds to wait."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _, _ = self._buckets.get(key, (capacity, now, capacity, rate))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens, wait = tokens - 1, 0.0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now, capacity, rate)
+
+            if len(self._buckets) > self.max_keys:
+                self._evict(now)
+            return wait
+
+    def _evict(self, now):
+        # Buckets that have refilled hold no state. If dropping those is not
+        # enough, drop the least recently used half.
+        for key, (tokens, updated, capacity, rate) in list(self._buckets.items()):
+            if tokens + (now - updated) * rate >= capacity:
+                del self._buckets[key]
+        if len(self._buckets) > self.max_keys:
+            oldest = sorted(self._buckets, key=lambda key: self._buckets[key][1])
+            for key in oldest[:len(oldest) // 2]:
+                del self._buckets[key]
+
+    def size(self):
+        return len(self._buckets)
+
+
+class RedisBackend:
+    """Token buckets in Redis, shared by every worker using the same server."""
+
+    name = 'redis'
+
+    # Refill, take and store a bucket atomically; returns the wait in seconds
+    SCRIPT = """
+        local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(state[1]) or capacity
+        local updated = tonumber(state[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+        local wait = 0
+        if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+        redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+        return tostring(wait)
+    """
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError('RATELIMIT_STORAGE_URL is a Redis URL but the redis package is not installed')
+        self._client = redis.Redis.from_url(url, socket_timeout=0.1, socket_connect_timeout=0.1)
+        self._take = self._client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity, rate):
+        return float(self._take(keys=[f'ratelimit:{key}'], args=[capacity, rate, time.time()]))
+
+    def size(self):
+        return None
+
+
+class RateLimiter:
+    """Per-blueprint request limits, checked before the view runs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.configure()
+
+    def configure(self, enabled=True, storage_url='memory', max_keys=100000):
+        """Change the settings and forget every bucket."""
+        with self._lock:
+            self.enabled = enabled
+            if storage_url == 'memory':
+                self.backend = MemoryBackend(max_keys)
+            else:
+                self.backend = RedisBackend(storage_url)
+            self._counts = {'allowed': 0, 'rejected': 0, 'errors': 0}
+
+    def limit(self, blueprint, setting, key, methods=None, endpoints=None):
+        """
+        Limit the requests of a blueprint to ``app.config[setting]`` per value
+        of ``key(request)``. Requests for which ``key`` returns None, or that
+        do not match ``methods`` and ``endpoints``, are not counted.
+        """
+        @blueprint.before_request
+        def check_rate_limit():
+            if not self.enabled:
+                return
+            if methods and request.method not in methods:
+                return
+            if endpoints and request.endpoint not in endpoints:
+                return
+
+            value = key(request)
+            if value is not None:
+                self.hit(setting, f'{setting}:{value}')
+
+        return check_rate_limit
+
+    def hit(self, setting, bucket):
+        """Count a request against a bucket, raising TooManyRequestsError if over the limit."""
+        capacity, rate = parse_limit(current_app.config[setting])
+        try:
+            wait = self.backend.take(bucket, capacity, rate)
+        except Exception:
+            # Fail open: an unreachable store must not lock everybody out
+            self._count('errors')
+            current_app.logger.exception('Rate limit check failed')
+            return
+
+        if wait:
+            self._count('rejected')
+            raise TooManyRequestsError(retry_after=wait)
+        self._count('allowed')
+
+    def stats(self):
+        with self._lock:
+            return {**self._counts, 'enabled': self.enabled, 'backend': self.backend.name,
+                    'keys': self.backend.size()}
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+
+def client_ip(request):
+    """The client's address, as seen by the server (configure ProxyFix behind a proxy)."""
+    return request.remote_addr
+
+
+def login_email(request):
+    """The email a sign-in is for, so guessing is limited whatever the source address."""
+    data = request.get_json(silent=True)
+    email = data.get('email') if isinstance(data, dict) else None
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+def token_subject(request):
+    """
+    The user id of a validly signed access token, else the client address.
+    Only the signature and expiry are checked; no user or revocation lookups.
+    """
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        try:
+            return f"user:{decode_token(header[len('Bearer '):])['sub']}"
+        except Exception:
+            # Invalid tokens are rejected by the view; count them by address
+            pass
+    return f'ip:{request.remote_addr}'
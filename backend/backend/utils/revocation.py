@@ -0,0 +1,98 @@
+"""
+In-memory JWT revocation filter.
+
+Every process keeps the jtis of revoked, not yet expired tokens in a set,
+so checking a token never touches the database. The set is refreshed from
+``TokenBlocklist`` at most once every ``JWT_REVOCATION_SYNC_INTERVAL``
+seconds, which is how a logout in one worker reaches the others. Set the
+interval to 0 to check the table on every request instead.
+
+Expired jtis are dropped from the set on every sync and from the table by
+``prune_expired_tokens()``. That function runs from the ``flask prune-tokens``
+command and opportunistically on logout.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Re-read rows created slightly before the last sync, so that rows committed
+# late by a concurrent transaction are not missed
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+class RevocationFilter:
+    """Per-process set of revoked token jtis, synced from TokenBlocklist."""
+
+    def __init__(self, sync_interval=5, prune_interval=3600):
+        self._lock = threading.Lock()
+        self.configure(sync_interval=sync_interval, prune_interval=prune_interval)
+
+    def configure(self, sync_interval=None, prune_interval=None):
+        """Change the intervals and forget everything loaded so far."""
+        with self._lock:
+            if sync_interval is not None:
+                self.sync_interval = float(sync_interval)
+            if prune_interval is not None:
+                self.prune_interval = float(prune_interval)
+            self._revoked = {}
+            self._synced_until = None
+            self._next_sync = 0.0
+            self._next_prune = 0.0
+
+    def is_revoked(self, jti):
+        """Return True if the token with this jti has been revoked."""
+        self._maybe_sync()
+        return jti in self._revoked
+
+    def revoke(self, jti, expires_at):
+        """Record a revocation made by this process."""
+        with self._lock:
+            self._revoked[jti] = expires_at
+
+    def _maybe_sync(self):
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+
+        with self._lock:
+            if now < self._next_sync:
+                return
+            self._next_sync = now + self.sync_interval
+            synced_until = self._synced_until
+
+        from models import TokenBlocklist, db
+
+        started_at = datetime.utcnow()
+        query = db.session.query(TokenBlocklist.jti, TokenBlocklist.expires_at).filter(
+            TokenBlocklist.expires_at > started_at
+        )
+        if synced_until is not None:
+            query = query.filter(TokenBlocklist.created_at >= synced_until - SYNC_OVERLAP)
+        rows = query.all()
+
+        with self._lock:
+            self._revoked.update(rows)
+            for jti in [jti for jti, expires_at in self._revoked.items() if expires_at <= started_at]:
+                del self._revoked[jti]
+            self._synced_until = started_at
+
+    def prune_due(self):
+        """Return True at most once per prune interval."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_prune:
+                return False
+            self._next_prune = now + self.prune_interval
+            return True
+
+    def __len__(self):
+        return len(self._revoked)
+
+
+def prune_expired_tokens():
+    """Delete expired rows from TokenBlocklist. The caller commits."""
+    from models import TokenBlocklist
+
+    return TokenBlocklist.query.filter(
+        TokenBlocklist.expires_at <= datetime.utcnow()
+    ).delete(synchronize_session=False)
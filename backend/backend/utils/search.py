@@ -0,0 +1,80 @@
+"""
+Full-text task search.
+
+On SQLite, tasks are matched against the ``tasks_fts`` FTS5 index (see
+``TASK_SEARCH_DDL`` in models.py) and ranked with bm25, a title match
+counting ``TITLE_WEIGHT`` times as much as a description match. Every word of
+the query has to match, the last one as a prefix so that results show up
+while the user is still typing.
+
+Other databases have no such index and fall back to a case-insensitive
+substring match on both columns, most recently updated first.
+"""
+import re
+
+from sqlalchemy import and_, column, func, literal_column, or_, table, text
+
+from models import TASK_SEARCH_DDL, Task, db
+from utils.errors import ValidationError
+
+TITLE_WEIGHT = 10.0
+MAX_SEARCH_WORDS = 16
+
+_WORD = re.compile(r'\w+')
+
+tasks_fts = table('tasks_fts', column('rowid'))
+
+
+def parse_search_words(q):
+    """Split a ``?q=`` string into the words to search for."""
+    words = _WORD.findall(q or '')
+    if not words:
+        raise ValidationError('Search query must contain at least one word')
+    return words[:MAX_SEARCH_WORDS]
+
+
+def match_expression(words):
+    """
+    Build an FTS5 query from plain words. Each word is quoted, so FTS5
+    operators and column filters typed by users are searched for as text.
+    """
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def filter_by_search(query, words):
+    """Narrow a Task query to the tasks matching ``words``, best match first."""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return match_tasks(query, words)
+    return like_tasks(query, words)
+
+
+def match_tasks(query, words):
+    """Search with the FTS5 index, ranked by bm25."""
+    fts = literal_column('tasks_fts')
+    return query.join(tasks_fts, tasks_fts.c.rowid == Task.id).filter(
+        fts.op('MATCH')(match_expression(words))
+    ).order_by(func.bm25(fts, TITLE_WEIGHT, 1.0), Task.id)
+
+
+def like_tasks(query, words):
+    """Search without an index, most recently updated first."""
+    def contains(word):
+        pattern = '%' + re.sub(r'([\\%_])', r'\\\1', word) + '%'
+        return or_(Task.title.ilike(pattern, escape='\\'), Task.description.ilike(pattern, escape='\\'))
+
+    return query.filter(and_(*map(contains, words))).order_by(Task.updated_at.desc(), Task.id.desc())
+
+
+def rebuild_search_index():
+    """
+    Create the search index if it is missing and reindex every task. The
+    caller commits.
+    """
+    if db.session.get_bind().dialect.name != 'sqlite':
+        return False
+    for statement in TASK_SEARCH_DDL:
+        db.session.execute(text(statement))
+    db.session.execute(text("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')"))
+    return True
@@ -0,0 +1,58 @@
+"""
+SQLite connection tuning.
+
+SQLite's defaults suit a single process: a rollback journal that blocks
+readers while a transaction commits, a full fsync on every commit and a
+2 MB page cache. ``set_sqlite_pragmas()`` applies the ``SQLITE_PRAGMAS``
+profile to every new connection instead. The default profile:
+
+- ``journal_mode=WAL`` lets readers run while a write commits.
+- ``synchronous=NORMAL`` syncs the WAL at checkpoints rather than on every
+  commit. That is still safe against corruption, but a power loss may lose
+  the last commits.
+- ``busy_timeout`` makes a writer wait for the lock instead of failing with
+  "database is locked".
+- ``mmap_size`` and ``cache_size`` keep hot pages in memory.
+- ``foreign_keys=ON`` enforces the foreign keys declared by the models.
+
+Other databases are left alone.
+"""
+import re
+
+from sqlalchemy import event
+
+# Pragmas that may be set from config, so that config cannot smuggle in SQL
+PRAGMA_NAMES = {
+    'journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size',
+    'foreign_keys', 'temp_store', 'wal_autocheckpoint', 'journal_size_limit',
+}
+
+_VALUE = re.compile(r'^-?\w+$')
+
+
+def pragma_statements(pragmas):
+    """Validate a ``{name: value}`` profile and return its PRAGMA statements."""
+    statements = []
+    for name, value in pragmas.items():
+        if name not in PRAGMA_NAMES:
+            raise ValueError(f"Unsupported SQLite pragma {name!r}, expected one of: {', '.join(sorted(PRAGMA_NAMES))}")
+        if not _VALUE.match(str(value)):
+            raise ValueError(f'Invalid value {value!r} for SQLite pragma {name!r}')
+        statements.append(f'PRAGMA {name}={value}')
+    return statements
+
+
+def set_sqlite_pragmas(engine, pragmas):
+    """Apply ``pragmas`` to every connection ``engine`` opens from now on."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+    statements = pragma_statements(pragmas)
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
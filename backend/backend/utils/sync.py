@@ -0,0 +1,96 @@
+"""
+Incremental task sync.
+
+``GET /api/tasks/changes`` returns the tasks changed since a sync token and
+tombstones for the tasks deleted since, so clients can keep a local copy up
+to date without refetching whole lists.
+
+A sync round starts from a token's ``since`` time (or from scratch without a
+token) and pages through the changed tasks in ``(updated_at, id)`` order. The
+token of a page in the middle of a round holds the position of its last row;
+the token of the last page starts the next round a little before the current
+one started, so that rows committed late by concurrent requests are not
+missed. Clients may therefore see a task or tombstone twice. A round also
+returns every task of the projects the user joined since it started from,
+as the client has never seen them.
+
+Tombstones are kept for ``TASK_TOMBSTONE_RETENTION``. Older tokens are
+refused, and the client has to sync from scratch.
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import insert, literal, select
+
+from models import Task, TaskTombstone, db
+from utils.errors import GoneError, ValidationError
+
+# Re-read changes made slightly before the previous round started
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def _fromisoformat(value):
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def encode_sync_token(since, started_at, after=None):
+    """Encode a round's start and the position within it into a token."""
+    payload = json.dumps([
+        _isoformat(since),
+        _isoformat(started_at),
+        [after[0].isoformat(), after[1]] if after else None
+    ], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_sync_token(token):
+    """
+    Decode a token into ``(since, started_at, after)``, all None without a
+    token. ``after`` is the ``(updated_at, id)`` of the last row returned.
+    """
+    if not token:
+        return None, None, None
+
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        since, started_at, after = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        since, started_at = _fromisoformat(since), _fromisoformat(started_at)
+        if after is not None:
+            after = (datetime.fromisoformat(after[0]), int(after[1]))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValidationError('Invalid sync token')
+
+    retention = current_app.config.get('TASK_TOMBSTONE_RETENTION', timedelta(days=30))
+    if since is not None and since < datetime.utcnow() - retention:
+        raise GoneError('Sync token expired, sync all tasks again')
+    return since, started_at, after
+
+
+def next_round_start(started_at):
+    return started_at - SYNC_OVERLAP
+
+
+def record_deleted_tasks(*criteria):
+    """
+    Add tombstones for the tasks matching ``criteria`` with one
+    INSERT ... SELECT. Call it before deleting them; the caller commits.
+    """
+    now = datetime.utcnow()
+    db.session.execute(insert(TaskTombstone).from_select(
+        ['task_id', 'project_id', 'created_at', 'updated_at'],
+        select(Task.id, Task.project_id, literal(now), literal(now)).where(*criteria)
+    ))
+
+
+def prune_tombstones():
+    """Delete tombstones past the retention window. The caller commits."""
+    retention = current_app.config.get('TASK_TOMBSTONE_RETENTION', timedelta(days=30))
+    return TaskTombstone.query.filter(
+        TaskTombstone.created_at < datetime.utcnow() - retention
+    ).delete(synchronize_session=False)
@@ -0,0 +1,60 @@
+"""
+Cached user lookup for JWT-authenticated requests.
+
+flask_jwt_extended loads the user for every ``@jwt_required`` request. The
+column values of recently loaded users are kept in ``user_cache`` for a few
+seconds. On a hit the row is rebuilt as a persistent instance in the
+request's session without a SELECT. The session's identity map then serves
+every further lookup of that user in the same request.
+
+Updating or deleting a user, e.g. a password, role or ``is_active`` change,
+drops the cached row at flush time and again after the commit.
+"""
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached, object_session
+
+from extensions import user_cache
+from models import User, db
+from utils.cache import MISSING
+
+USER_COLUMNS = tuple(column.key for column in User.__table__.columns)
+
+
+def load_user(user_id):
+    """Return the User for a JWT identity, or None if it does not exist."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    row = user_cache.get(user_id)
+    if row is MISSING:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            user_cache.set(user_id, {key: getattr(user, key) for key in USER_COLUMNS})
+        return user
+
+    # Rebuild the row as a clean, detached instance and attach it to the
+    # session, reusing the instance already in the identity map if there is one
+    user = User(**row)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def invalidate_user(user_id):
+    """Drop a user's cached row."""
+    user_cache.delete(int(user_id))
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_changed_user(mapper, connection, target):
+    invalidate_user(target.id)
+    object_session(target).info.setdefault('changed_user_ids', set()).add(target.id)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_committed_users(session):
+    # Another request may have re-cached the old row between flush and commit
+    for user_id in session.info.pop('changed_user_ids', ()):
+        invalidate_user(user_id)